@@ -92,7 +92,7 @@ def create_app():
     init_limiter(app)
 
     # Database initialization
-    from .models import db
+    from .models import db, upgrade_schema
     db.init_app(app)
 
     with app.app_context():
@@ -103,6 +103,7 @@ def create_app():
             print(f"Warning: Could not create upload folder: {e}")
 
         db.create_all()
+        upgrade_schema()
         
         # Initialize Chroma Vector Store (Cloud atau Local)
         try:
@@ -189,7 +190,7 @@ def create_app():
         from .drive_sync import setup_scheduler
         scheduler = setup_scheduler()
         scheduler.start()
-        print("✅ Google Drive Auto-Sync: SCHEDULED (setiap Minggu pukul 02:00)")
+        print("✅ Google Drive Auto-Sync: SCHEDULED (setiap Minggu pukul 02:00, reconcile 04:00)")
     except Exception as e:
         print(f"⚠️  Could not setup scheduler: {e}")
 
@@ -6,9 +6,16 @@ Supports both Chroma Cloud dan Local instances
 
 import os
 import json
-from typing import List, Dict, Optional, Tuple
+import time
+import hashlib
+import threading
+from collections import Counter
+from itertools import islice
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator, Callable
 from datetime import datetime
 
+import numpy as np
+
 try:
     import chromadb
     from chromadb.config import Settings
@@ -24,6 +31,129 @@ except ImportError:
     EMBEDDINGS_AVAILABLE = False
     print("⚠️  sentence-transformers not available")
 
+from .embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from .embedding_service import EmbeddingServiceClient
+from .onnx_embeddings import OnnxEmbeddingModel, ONNX_EMBEDDING_KEY_SUFFIX
+from .numpy_vector_store import NumpyVectorClient
+
+
+# Chroma clients di-reuse per konfigurasi (per proses), supaya HTTP session
+# (connection pool) ke Chroma Cloud tidak dibuat ulang setiap create_app()
+_client_pool = {}
+_client_pool_lock = threading.Lock()
+
+
+def _iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Potong iterable menjadi list dengan ukuran maksimal batch_size"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def chunk_id(file_id: str, text: str, chunk_metadata: Dict = None, occurrence: int = 0) -> str:
+    """
+    Content-addressed chunk ID: hash dari text chunk plus halaman dan page_hash
+    
+    Chunk yang isi dan halamannya tidak berubah mendapat ID yang sama di setiap
+    re-index, sehingga update cukup meng-upsert ID baru dan menghapus ID yang hilang.
+    occurrence membedakan chunk identik (mis. header berulang) di halaman yang sama.
+    """
+    chunk_metadata = chunk_metadata or {}
+    digest = hashlib.sha256(
+        f"{chunk_metadata.get('page_start')}:{chunk_metadata.get('page_hash', '')}\n{text}".encode('utf-8')
+    ).hexdigest()[:16]
+    return f"{file_id}_{digest}_{occurrence}" if occurrence else f"{file_id}_{digest}"
+
+
+def _chunk_ids(file_id: str, texts: List[str], chunk_metadatas: List[Dict], occurrences: Dict) -> List[str]:
+    """chunk_id untuk satu batch; occurrences dibawa antar batch dokumen yang sama"""
+    ids = []
+    for text, chunk_metadata in zip(texts, chunk_metadatas):
+        base_id = chunk_id(file_id, text, chunk_metadata)
+        occurrence = occurrences.get(base_id, 0)
+        occurrences[base_id] = occurrence + 1
+        ids.append(f"{base_id}_{occurrence}" if occurrence else base_id)
+    return ids
+
+
+def select_diverse(candidates: List[Dict],
+                   k: int,
+                   lambda_mult: float = None,
+                   max_per_document: int = 0,
+                   relevance_key: str = 'similarity') -> List[Dict]:
+    """
+    Pilih k kandidat dengan Maximal Marginal Relevance dan batas chunk per dokumen
+    
+    Kandidat harus sudah terurut by relevance. Skor MMR = lambda * relevance
+    - (1 - lambda) * cosine similarity tertinggi ke kandidat yang sudah
+    terpilih. relevance_key 'similarity' (cosine) dipakai apa adanya, supaya
+    lambda punya arti yang sama untuk setiap query. Skor lain (logit
+    cross-encoder yang bisa negatif, RRF yang sangat kecil) tidak sebanding
+    dengan cosine dan dinormalisasi min-max ke [0, 1]. Kandidat tanpa
+    'embedding' dianggap tidak mirip dengan kandidat lain.
+    
+    Args:
+        candidates: Dict dengan 'file_id' (atau metadata['file_id']), relevance_key
+            dan 'embedding' opsional
+        k: Jumlah kandidat yang dipilih
+        lambda_mult: Trade-off relevance vs diversity (None atau >= 1: urutan
+            relevance dipertahankan, hanya batas per dokumen)
+        max_per_document: Maksimum chunk per dokumen (0 = tanpa batas)
+    
+    Returns:
+        Kandidat terpilih dalam urutan pemilihan
+    """
+    def document_of(candidate):
+        return candidate.get('file_id') or (candidate.get('metadata') or {}).get('file_id')
+    
+    per_document = Counter()
+    selected = []
+    
+    def try_select(candidate) -> bool:
+        file_id = document_of(candidate)
+        if max_per_document and per_document[file_id] >= max_per_document:
+            return False
+        per_document[file_id] += 1
+        selected.append(candidate)
+        return True
+    
+    with_embeddings = [c.get('embedding') is not None for c in candidates]
+    if lambda_mult is None or lambda_mult >= 1 or not any(with_embeddings):
+        for candidate in candidates:
+            if len(selected) >= k:
+                break
+            try_select(candidate)
+        return selected
+    
+    relevance = np.array([c.get(relevance_key) or 0.0 for c in candidates], dtype=np.float32)
+    if relevance_key != 'similarity':
+        spread = relevance.max() - relevance.min()
+        if spread > 0:
+            relevance = (relevance - relevance.min()) / spread
+        else:
+            relevance = np.ones_like(relevance)
+    
+    dimension = len(candidates[with_embeddings.index(True)]['embedding'])
+    vectors = np.zeros((len(candidates), dimension), dtype=np.float32)
+    for i, candidate in enumerate(candidates):
+        if with_embeddings[i]:
+            vectors[i] = candidate['embedding']
+    vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    
+    max_similarity = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        available[best] = False
+        if try_select(candidates[best]):
+            max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+    return selected
+
 
 class ChromaVectorStore:
     """
@@ -38,7 +168,8 @@ class ChromaVectorStore:
                  cloud_tenant: str = None,
                  cloud_database: str = None,
                  persist_dir: str = None,
-                 model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
+                 model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+                 backend: str = None):
         """
         Initialize Chroma Vector Store (Cloud atau Local)
         
@@ -50,7 +181,12 @@ class ChromaVectorStore:
             cloud_database: Chroma Cloud database name
             persist_dir: Directory untuk local persistence (jika use_cloud=False)
             model_name: Sentence transformer model untuk embeddings
+            backend: 'chroma' (default) atau 'numpy' untuk local NumPy index
+                     (default dari env VECTOR_STORE_BACKEND)
         """
+        self.backend = (backend or os.getenv('VECTOR_STORE_BACKEND', 'chroma')).lower()
+        if self.backend == 'numpy':
+            use_cloud = False
         self.use_cloud = use_cloud
         self.cloud_host = cloud_host
         self.cloud_api_key = cloud_api_key
@@ -58,6 +194,23 @@ class ChromaVectorStore:
         self.cloud_database = cloud_database
         self.client = None
         self.embedding_model = None
+        self._collections = {}
+        self._collection_lock = threading.Lock()
+        self.model_name = model_name
+        self.embedding_backend = os.getenv('EMBEDDING_BACKEND', 'sentence-transformers').lower()
+        # Cache key model: embeddings int8 ONNX sedikit berbeda dari PyTorch
+        self.embedding_key = model_name
+        self.embedding_cache = EmbeddingCache.from_env()
+        self.query_cache = QueryEmbeddingCache.from_env()
+        self.ingest_batch_size = int(os.getenv('CHROMA_INGEST_BATCH_SIZE', '64'))
+        
+        # Diversifikasi hasil search: batas chunk per dokumen dan MMR opsional
+        self.max_chunks_per_document = int(os.getenv('SEARCH_MAX_CHUNKS_PER_DOC', '3'))
+        self.mmr_lambda = (
+            float(os.getenv('SEARCH_MMR_LAMBDA', '0.7'))
+            if os.getenv('SEARCH_MMR_ENABLED', 'false').lower() == 'true' else None
+        )
+        self.search_fetch_multiplier = max(int(os.getenv('SEARCH_FETCH_MULTIPLIER', '3')), 1)
         
         # Load dari environment variables jika tidak disediakan
         if use_cloud:
@@ -67,6 +220,9 @@ class ChromaVectorStore:
             self.cloud_database = cloud_database or os.getenv('CHROMA_DATABASE', 'default')
             
             self._initialize_cloud_client()
+        elif self.backend == 'numpy':
+            index_dir = os.getenv('NUMPY_INDEX_DIR') or os.path.join(os.path.dirname(__file__), '..', 'numpy_index')
+            self._initialize_numpy_client(index_dir)
         else:
             persist_dir = persist_dir or os.path.join(os.path.dirname(__file__), '..', 'chroma_data')
             os.makedirs(persist_dir, exist_ok=True)
@@ -87,18 +243,25 @@ class ChromaVectorStore:
             return
         
         try:
-            # Initialize Chroma Cloud client
-            self.client = chromadb.CloudClient(
-                api_key=self.cloud_api_key
-            )
+            pool_key = ('cloud', self.cloud_api_key, self.cloud_tenant, self.cloud_database)
+            with _client_pool_lock:
+                self.client = _client_pool.get(pool_key)
+                if self.client is not None:
+                    print("✅ Chroma Cloud client reused")
+                else:
+                    # Initialize Chroma Cloud client (HTTP session di-pool oleh client)
+                    self.client = chromadb.CloudClient(
+                        api_key=self.cloud_api_key
+                    )
+                    _client_pool[pool_key] = self.client
+                    
+                    print(f"✅ Chroma Cloud connected")
+                    print(f"   API Key: {self.cloud_api_key[:20]}...")
+                    print(f"   Database: {self.cloud_database}")
             
             # In newer chromadb versions, use client directly
             # The database context is handled by the client
             self.db = self.client
-            
-            print(f"✅ Chroma Cloud connected")
-            print(f"   API Key: {self.cloud_api_key[:20]}...")
-            print(f"   Database: {self.cloud_database}")
         
         except Exception as e:
             print(f"❌ Error connecting to Chroma Cloud: {e}")
@@ -116,8 +279,13 @@ class ChromaVectorStore:
             # Create persist directory if it doesn't exist
             os.makedirs(persist_dir, exist_ok=True)
             
-            # Use new Persistent Client API
-            self.client = chromadb.PersistentClient(path=persist_dir)
+            pool_key = ('local', os.path.abspath(persist_dir))
+            with _client_pool_lock:
+                self.client = _client_pool.get(pool_key)
+                if self.client is None:
+                    # Use new Persistent Client API
+                    self.client = chromadb.PersistentClient(path=persist_dir)
+                    _client_pool[pool_key] = self.client
             self.db = None
             
             print(f"✅ Local Chroma initialized")
@@ -127,8 +295,55 @@ class ChromaVectorStore:
             print(f"❌ Error initializing local Chroma: {e}")
             self.client = None
     
+    def _initialize_numpy_client(self, index_dir: str):
+        """Initialize local NumPy vector index (tanpa dependency ke Chroma)"""
+        try:
+            pool_key = ('numpy', os.path.abspath(index_dir))
+            with _client_pool_lock:
+                self.client = _client_pool.get(pool_key)
+                if self.client is None:
+                    self.client = NumpyVectorClient(index_dir)
+                    _client_pool[pool_key] = self.client
+            self.db = None
+            
+            print(f"✅ Local NumPy vector index initialized")
+            print(f"   Index dir: {self.client.path}")
+        
+        except Exception as e:
+            print(f"❌ Error initializing NumPy vector index: {e}")
+            self.client = None
+    
     def _initialize_embedding_model(self, model_name: str):
-        """Initialize embedding model"""
+        """
+        Initialize embedding model
+        
+        Urutan: shared embedding service (EMBEDDING_SERVICE_SOCKET), lalu
+        backend lokal sesuai EMBEDDING_BACKEND ('sentence-transformers' atau 'onnx')
+        """
+        socket_path = os.getenv('EMBEDDING_SERVICE_SOCKET')
+        if socket_path:
+            client = EmbeddingServiceClient(socket_path)
+            if client.ping():
+                if client.model_name != model_name:
+                    print(f"⚠️  Embedding service model '{client.model_name}' != '{model_name}'")
+                self.embedding_model = client
+                self.embedding_backend = client.backend or self.embedding_backend
+                if self.embedding_backend == 'onnx':
+                    self.embedding_key = f"{model_name}{ONNX_EMBEDDING_KEY_SUFFIX}"
+                print(f"✅ Using shared embedding service: {socket_path} ({self.embedding_backend})")
+                return
+            print(f"⚠️  Embedding service not reachable at {socket_path}, loading model locally")
+        
+        if self.embedding_backend == 'onnx':
+            try:
+                self.embedding_model = OnnxEmbeddingModel()
+                self.embedding_key = f"{model_name}{ONNX_EMBEDDING_KEY_SUFFIX}"
+                print(f"✅ ONNX int8 embedding model loaded: {self.embedding_model.model_dir}")
+                return
+            except Exception as e:
+                print(f"⚠️  Could not load ONNX embedding model ({e}), using sentence-transformers")
+                self.embedding_backend = 'sentence-transformers'
+        
         if not EMBEDDINGS_AVAILABLE:
             print("❌ sentence-transformers not available")
             return
@@ -141,51 +356,107 @@ class ChromaVectorStore:
             self.embedding_model = None
     
     def get_or_create_collection(self, collection_name: str = "documents"):
-        """Get atau create Chroma collection"""
+        """
+        Get atau create Chroma collection
+        
+        Handle collection di-resolve sekali lalu disimpan; panggil
+        _invalidate_collection() setelah error supaya di-resolve ulang
+        """
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
+        
         if not self.client:
             print("❌ Chroma client not available")
             return None
         
-        try:
-            if self.use_cloud:
-                # Cloud: use client directly
-                try:
-                    collection = self.client.get_collection(name=collection_name)
-                except:
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"hnsw:space": "cosine"}
-                    )
-            else:
-                # Local: use client directly with new API
+        with self._collection_lock:
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                return collection
+            
+            try:
                 try:
                     collection = self.client.get_collection(name=collection_name)
-                except:
+                except Exception:
                     collection = self.client.create_collection(
                         name=collection_name,
                         metadata={"hnsw:space": "cosine"}
                     )
+                
+                self._collections[collection_name] = collection
+                print(f"✅ Collection '{collection_name}' ready")
+                return collection
             
-            print(f"✅ Collection '{collection_name}' ready")
-            return collection
+            except Exception as e:
+                print(f"❌ Error creating collection: {e}")
+                return None
+    
+    def _invalidate_collection(self, collection_name: str = "documents"):
+        """Buang cached collection handle (dipanggil setelah operasi gagal)"""
+        with self._collection_lock:
+            self._collections.pop(collection_name, None)
+    
+    def _encode_chunks(self, chunks: List[str]) -> List[List[float]]:
+        """Encode chunks, ambil dari embedding cache jika chunk text sudah pernah di-encode"""
+        if not self.embedding_cache:
+            return self.embedding_model.encode(chunks).tolist()
         
-        except Exception as e:
-            print(f"❌ Error creating collection: {e}")
-            return None
+        embeddings = self.embedding_cache.get_many(self.embedding_key, chunks)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            missing_chunks = [chunks[i] for i in missing]
+            encoded = self.embedding_model.encode(missing_chunks).tolist()
+            self.embedding_cache.put_many(self.embedding_key, missing_chunks, encoded)
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+        
+        return embeddings
+    
+    def encode_chunks(self, chunks: List[str]) -> List[List[float]]:
+        """Encode chunks dari beberapa dokumen sekaligus (batched bulk ingest)"""
+        return self._encode_chunks(chunks)
+    
+    def _encode_query(self, query: str) -> List[float]:
+        """Encode query, pakai query cache untuk pertanyaan yang berulang"""
+        if self.query_cache:
+            cached = self.query_cache.get(self.embedding_key, query)
+            if cached is not None:
+                return cached
+        
+        query_embedding = self.embedding_model.encode([query]).tolist()[0]
+        
+        if self.query_cache:
+            self.query_cache.put(self.embedding_key, query, query_embedding)
+        
+        return query_embedding
     
     def add_document_chunks(self, 
                            file_id: str, 
                            file_name: str,
-                           chunks: List[str],
-                           metadata: Dict = None) -> bool:
+                           chunks: Iterable,
+                           metadata: Dict = None,
+                           batch_size: int = None,
+                           embeddings: Iterable[List[float]] = None,
+                           ids: Iterable[str] = None,
+                           on_batch: Callable[[List[Tuple[str, Dict]]], None] = None) -> bool:
         """
         Add document chunks to vector store
         
+        Chunks di-encode dan di-upsert per micro-batch, jadi peak memory tidak
+        bergantung pada ukuran dokumen (chunks boleh berupa generator)
+        
         Args:
             file_id: Unique Google Drive file ID
             file_name: Name of the document
-            chunks: List of text chunks to add
+            chunks: Iterable of text chunks, atau (text, metadata_chunk) misalnya page_start/page_end
             metadata: Additional metadata
+            batch_size: Chunks per micro-batch (default: CHROMA_INGEST_BATCH_SIZE)
+            embeddings: Embeddings yang sudah dihitung (urutan sama dengan chunks)
+            ids: Chunk ID yang sudah dihitung (default: content-addressed chunk_id)
+            on_batch: Dipanggil setelah setiap micro-batch ter-upsert dengan list
+                (text, metadata_chunk + chunk_index), mis. untuk update BM25 per batch
         
         Returns:
             Success status
@@ -195,115 +466,215 @@ class ChromaVectorStore:
             if not collection or not self.embedding_model:
                 return False
             
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(chunks, convert_to_tensor=True).cpu().tolist()
-            
-            # Create unique IDs
-            ids = [f"{file_id}_{i}" for i in range(len(chunks))]
+            batch_size = batch_size or self.ingest_batch_size
             
             # Prepare metadata
             base_metadata = {
                 "file_id": file_id,
                 "file_name": file_name,
                 "indexed_at": datetime.utcnow().isoformat(),
-                "model": "paraphrase-multilingual-MiniLM-L12-v2"
+                "model": self.model_name,
+                "embedding_key": self.embedding_key
             }
             
             if metadata:
                 base_metadata.update(metadata)
             
-            # Add to collection
-            metadatas = [
-                {
-                    **base_metadata,
-                    "chunk_index": i,
-                    "chunk_size": len(chunk)
-                }
-                for i, chunk in enumerate(chunks)
-            ]
+            total_chunks = 0
+            ingest_start = time.time()
+            precomputed = iter(embeddings) if embeddings is not None else None
+            precomputed_ids = iter(ids) if ids is not None else None
+            occurrences = {}
             
-            collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=chunks,
-                metadatas=metadatas
-            )
+            for batch_number, items in enumerate(_iter_batches(chunks, batch_size), 1):
+                batch_start = time.time()
+                batch = [item if isinstance(item, str) else item[0] for item in items]
+                chunk_metadatas = [{} if isinstance(item, str) else item[1] for item in items]
+                
+                # Generate embeddings (chunk yang sudah ada di cache tidak di-encode ulang)
+                if precomputed is not None:
+                    batch_embeddings = list(islice(precomputed, len(batch)))
+                else:
+                    batch_embeddings = self._encode_chunks(batch)
+                
+                # chunk_index dari metadata chunk (partial update) atau urutan chunk
+                chunk_indexes = [
+                    chunk_metadatas[i].get('chunk_index', total_chunks + i) for i in range(len(batch))
+                ]
+                
+                # Content-addressed IDs (stabil antar re-index, lihat chunk_id)
+                if precomputed_ids is not None:
+                    batch_ids = list(islice(precomputed_ids, len(batch)))
+                else:
+                    batch_ids = _chunk_ids(file_id, batch, chunk_metadatas, occurrences)
+                
+                metadatas = [
+                    {
+                        **base_metadata,
+                        # Chroma menolak nilai None di metadata
+                        **{key: value for key, value in chunk_metadatas[i].items() if value is not None},
+                        "chunk_index": chunk_indexes[i],
+                        "chunk_size": len(chunk)
+                    }
+                    for i, chunk in enumerate(batch)
+                ]
+                
+                collection.upsert(
+                    ids=batch_ids,
+                    embeddings=batch_embeddings,
+                    documents=batch,
+                    metadatas=metadatas
+                )
+                
+                if on_batch is not None:
+                    on_batch([
+                        (chunk, {**chunk_metadatas[i], "chunk_index": chunk_indexes[i]})
+                        for i, chunk in enumerate(batch)
+                    ])
+                
+                total_chunks += len(batch)
+                batch_elapsed = max(time.time() - batch_start, 1e-6)
+                print(f"   Batch {batch_number}: {len(batch)} chunks in {batch_elapsed:.2f}s "
+                      f"({len(batch) / batch_elapsed:.1f} chunks/s)")
+            
+            if not total_chunks:
+                print(f"⚠️  No chunks to add for '{file_name}' (ID: {file_id})")
+                return False
             
-            print(f"✅ Added {len(chunks)} chunks for '{file_name}' (ID: {file_id})")
+            elapsed = max(time.time() - ingest_start, 1e-6)
+            print(f"✅ Added {total_chunks} chunks for '{file_name}' (ID: {file_id}) "
+                  f"in {elapsed:.2f}s ({total_chunks / elapsed:.1f} chunks/s)")
             return True
         
         except Exception as e:
             print(f"❌ Error adding document chunks: {e}")
+            self._invalidate_collection()
             return False
     
+    def query_chunks(self, query: str, n_results: int = 10, include_embeddings: bool = False) -> List[Dict]:
+        """
+        Vector query tanpa grouping (urutan nearest-neighbour)
+        
+        Returns:
+            List of {'id', 'text', 'metadata', 'similarity'} (+ 'embedding' jika include_embeddings)
+        """
+        collection = self.get_or_create_collection()
+        if not collection or not self.embedding_model:
+            return []
+        
+        # Generate query embedding (cached untuk query yang sama)
+        query_embedding = self._encode_query(query)
+        
+        # Search
+        include = ['documents', 'metadatas', 'distances']
+        if include_embeddings:
+            include.append('embeddings')
+        try:
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                include=include
+            )
+        except Exception:
+            # Handle basi (collection dihapus/dibuat ulang): resolve ulang di panggilan berikutnya
+            self._invalidate_collection()
+            raise
+        
+        hits = []
+        if results['documents'] and len(results['documents']) > 0:
+            embeddings = results.get('embeddings') if include_embeddings else None
+            for i, doc in enumerate(results['documents'][0]):
+                metadata = results['metadatas'][0][i] if results['metadatas'] else {}
+                distance = results['distances'][0][i] if results['distances'] else 1.0
+                
+                # Convert distance to similarity (1 - distance for cosine)
+                similarity = 1 - (distance / 2)
+                similarity = max(0, min(1, similarity))
+                
+                hit = {
+                    'id': results['ids'][0][i],
+                    'text': doc,
+                    'metadata': metadata or {},
+                    'similarity': similarity
+                }
+                if embeddings is not None and len(embeddings) > 0:
+                    hit['embedding'] = embeddings[0][i]
+                hits.append(hit)
+        
+        return hits
+    
+    def diversify(self, candidates: List[Dict], k: int, relevance_key: str = 'similarity',
+                  mmr_lambda: float = None, max_per_document: int = None) -> List[Dict]:
+        """select_diverse dengan konfigurasi SEARCH_MMR_* / SEARCH_MAX_CHUNKS_PER_DOC"""
+        return select_diverse(
+            candidates, k,
+            lambda_mult=self.mmr_lambda if mmr_lambda is None else mmr_lambda,
+            max_per_document=self.max_chunks_per_document if max_per_document is None else max_per_document,
+            relevance_key=relevance_key
+        )
+    
+    def fetch_size(self, results_limit: int, mmr_lambda: float = None, max_per_document: int = None) -> int:
+        """Jumlah kandidat yang di-query: over-fetch jika MMR atau batas per dokumen aktif"""
+        mmr_lambda = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        max_per_document = self.max_chunks_per_document if max_per_document is None else max_per_document
+        if (mmr_lambda is not None and mmr_lambda < 1) or max_per_document:
+            return results_limit * self.search_fetch_multiplier
+        return results_limit
+    
     def search_documents(self, 
                         query: str, 
                         search_limit: int = 5,
-                        results_limit: int = 10) -> Dict:
+                        results_limit: int = 10,
+                        mmr_lambda: float = None,
+                        max_per_document: int = None) -> Dict:
         """
         Search untuk dokumen relevan menggunakan vector similarity
         
+        Kandidat di-over-fetch lalu dipilih dengan batas chunk per dokumen dan
+        (opsional) MMR, supaya satu manual panjang tidak mengisi semua slot.
+        
         Args:
             query: Search query (pertanyaan user)
             search_limit: Max documents to return
-            results_limit: Max chunks per document
+            results_limit: Max chunks (total) yang dipilih
+            mmr_lambda: MMR trade-off 0..1 (default: SEARCH_MMR_LAMBDA jika SEARCH_MMR_ENABLED)
+            max_per_document: Max chunks per dokumen (default: SEARCH_MAX_CHUNKS_PER_DOC, 0 = tanpa batas)
         
         Returns:
             Search results dengan chunks dan similarity scores
         """
         try:
-            collection = self.get_or_create_collection()
-            if not collection or not self.embedding_model:
-                return {'query': query, 'results': [], 'total_results': 0}
-            
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode([query], convert_to_tensor=True).cpu().tolist()[0]
-            
-            # Search
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=results_limit,
-                include=['documents', 'metadatas', 'distances']
+            use_mmr = (self.mmr_lambda if mmr_lambda is None else mmr_lambda) is not None
+            hits = self.query_chunks(
+                query,
+                self.fetch_size(results_limit, mmr_lambda, max_per_document),
+                include_embeddings=use_mmr
             )
+            hits = self.diversify(hits, results_limit, mmr_lambda=mmr_lambda, max_per_document=max_per_document)
             
-            # Process results
-            processed_results = []
-            seen_files = set()
-            
-            if results['documents'] and len(results['documents']) > 0:
-                for i, doc in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    distance = results['distances'][0][i] if results['distances'] else 1.0
-                    
-                    # Convert distance to similarity (1 - distance for cosine)
-                    similarity = 1 - (distance / 2)
-                    similarity = max(0, min(1, similarity))
-                    
-                    file_id = metadata.get('file_id', 'unknown')
-                    file_name = metadata.get('file_name', 'Unknown Document')
-                    chunk_index = metadata.get('chunk_index', 0)
-                    
-                    # Group by file
-                    if file_id not in seen_files:
-                        processed_results.append({
-                            'file_id': file_id,
-                            'file_name': file_name,
-                            'chunks': []
-                        })
-                        seen_files.add(file_id)
-                    
-                    # Find file result and add chunk
-                    file_result = next((r for r in processed_results if r['file_id'] == file_id), None)
-                    if file_result:
-                        file_result['chunks'].append({
-                            'text': doc,
-                            'similarity': round(similarity, 3),
-                            'chunk_index': chunk_index
-                        })
-            
-            # Limit results
-            processed_results = processed_results[:search_limit]
+            # Group by file (dict, urutan file mengikuti chunk pertama yang terpilih)
+            grouped = {}
+            for hit in hits:
+                metadata = hit['metadata']
+                file_id = metadata.get('file_id', 'unknown')
+                file_result = grouped.get(file_id)
+                if file_result is None:
+                    if len(grouped) >= search_limit:
+                        continue
+                    file_result = grouped[file_id] = {
+                        'file_id': file_id,
+                        'file_name': metadata.get('file_name', 'Unknown Document'),
+                        'chunks': []
+                    }
+                file_result['chunks'].append({
+                    'text': hit['text'],
+                    'similarity': round(hit['similarity'], 3),
+                    'chunk_index': metadata.get('chunk_index', 0),
+                    'page_start': metadata.get('page_start'),
+                    'page_end': metadata.get('page_end')
+                })
             
+            processed_results = list(grouped.values())
             return {
                 'query': query,
                 'results': processed_results,
@@ -312,67 +683,287 @@ class ChromaVectorStore:
         
         except Exception as e:
             print(f"❌ Error searching documents: {e}")
+            self._invalidate_collection()
             return {'query': query, 'results': [], 'total_results': 0}
     
     def delete_document(self, file_id: str) -> bool:
-        """Delete semua chunks untuk dokumen"""
+        """Delete semua chunks untuk dokumen (False jika dokumen tidak punya chunks)"""
+        try:
+            if not self.count_document_chunks(file_id):
+                return False
+        except Exception as e:
+            print(f"❌ Error deleting document: {e}")
+            return False
+        return self.delete_many([file_id])
+    
+    def delete_many(self, file_ids: Iterable[str], batch_size: int = 100) -> bool:
+        """
+        Delete semua chunks untuk beberapa dokumen sekaligus
+        
+        Delete memakai filter where file_id $in (server-side), jadi documents,
+        metadata dan embeddings chunk tidak pernah di-fetch.
+        
+        Args:
+            file_ids: Google Drive file IDs
+            batch_size: file_id per delete request
+        
+        Returns:
+            Success status
+        """
+        file_ids = list(dict.fromkeys(file_ids))
+        if not file_ids:
+            return True
+        
         try:
             collection = self.get_or_create_collection()
             if not collection:
                 return False
             
-            # Find dan delete all items dengan file_id ini
-            results = collection.get(
-                where={"file_id": file_id}
-            )
-            
-            if results['ids']:
-                collection.delete(ids=results['ids'])
-                print(f"✅ Deleted {len(results['ids'])} chunks for file {file_id}")
-                return True
+            for batch in _iter_batches(file_ids, batch_size):
+                collection.delete(where={"file_id": {"$in": batch}})
             
+            print(f"✅ Deleted chunks for {len(file_ids)} document(s)")
+            return True
+        
+        except Exception as e:
+            print(f"❌ Error deleting documents: {e}")
+            self._invalidate_collection()
             return False
+    
+    def iter_file_ids(self, page_size: int = 1000) -> Iterator[str]:
+        """
+        Yield file_id unik yang punya chunks di collection
+        
+        Paging lewat get(include=['metadatas']): hanya metadata yang di-fetch,
+        tanpa documents dan embeddings.
+        """
+        collection = self.get_or_create_collection()
+        if not collection:
+            return
         
+        seen = set()
+        offset = 0
+        while True:
+            try:
+                results = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            except Exception:
+                self._invalidate_collection()
+                raise
+            metadatas = results.get('metadatas') or []
+            for metadata in metadatas:
+                file_id = (metadata or {}).get('file_id')
+                if file_id and file_id not in seen:
+                    seen.add(file_id)
+                    yield file_id
+            if len(results['ids']) < page_size:
+                return
+            offset += page_size
+    
+    def get_document_pages(self, file_id: str) -> Dict:
+        """
+        Page hash dan chunk yang tersimpan untuk dokumen (untuk partial re-index)
+        
+        Returns:
+            {
+                'pages': {page_number: {'page_hash': str, 'ids': [...], 'chunk_indexes': [...]}},
+                'next_chunk_index': int,
+                'total_chunks': int,
+                'page_aware': bool (False jika ada chunk tanpa page_hash)
+            }
+        """
+        collection = self.get_or_create_collection()
+        if not collection:
+            return {'pages': {}, 'next_chunk_index': 0, 'total_chunks': 0, 'page_aware': False}
+        
+        try:
+            results = collection.get(where={"file_id": file_id}, include=['metadatas'])
+        except Exception:
+            self._invalidate_collection()
+            raise
+        pages = {}
+        next_chunk_index = 0
+        page_aware = bool(results['ids'])
+        for chunk_id, metadata in zip(results['ids'], results['metadatas'] or []):
+            metadata = metadata or {}
+            chunk_index = metadata.get('chunk_index', 0)
+            next_chunk_index = max(next_chunk_index, chunk_index + 1)
+            if 'page_hash' not in metadata:
+                page_aware = False
+                continue
+            page = pages.setdefault(metadata.get('page_start'), {
+                'page_hash': metadata['page_hash'], 'ids': [], 'chunk_indexes': []
+            })
+            page['ids'].append(chunk_id)
+            page['chunk_indexes'].append(chunk_index)
+        
+        return {
+            'pages': pages,
+            'next_chunk_index': next_chunk_index,
+            'total_chunks': len(results['ids']),
+            'page_aware': page_aware
+        }
+    
+    def delete_chunks(self, ids: List[str]) -> bool:
+        """Delete chunks tertentu (by ID)"""
+        if not ids:
+            return True
+        try:
+            collection = self.get_or_create_collection()
+            if not collection:
+                return False
+            collection.delete(ids=ids)
+            return True
         except Exception as e:
-            print(f"❌ Error deleting document: {e}")
+            print(f"❌ Error deleting chunks: {e}")
+            self._invalidate_collection()
             return False
     
     def update_document(self, 
                        file_id: str,
                        file_name: str,
-                       chunks: List[str],
-                       metadata: Dict = None) -> bool:
-        """Update dokumen (delete old + add new)"""
-        self.delete_document(file_id)
-        return self.add_document_chunks(file_id, file_name, chunks, metadata)
-    
-    def get_collection_stats(self) -> Dict:
-        """Get statistics tentang collection"""
+                       chunks: Iterable,
+                       metadata: Dict = None,
+                       embeddings: Iterable[List[float]] = None) -> bool:
+        """
+        Update dokumen dengan diff terhadap chunk ID yang tersimpan
+        
+        Hanya chunk dengan ID baru yang di-embed dan di-upsert; chunk yang ID-nya
+        tidak ada lagi di versi baru dihapus setelahnya. Reader tidak pernah melihat
+        dokumen tanpa chunks, dan biaya update sebanding dengan perubahan.
+        
+        Chunk yang tidak berubah mempertahankan chunk_index-nya, chunk baru mendapat
+        index setelah index tertinggi. chunk_index final ditulis ke metadata_chunk
+        setiap item (text, metadata_chunk), supaya BM25 index memakai key yang sama.
+        
+        Args:
+            file_id: Unique Google Drive file ID
+            file_name: Name of the document
+            chunks: Iterable of text chunks, atau (text, metadata_chunk)
+            metadata: Additional metadata
+            embeddings: Embeddings yang sudah dihitung (urutan sama dengan chunks)
+        
+        Returns:
+            Success status
+        """
+        try:
+            collection = self.get_or_create_collection()
+            if not collection or not self.embedding_model:
+                return False
+            
+            items = [(item, {}) if isinstance(item, str) else item for item in chunks]
+            if not items:
+                print(f"⚠️  No chunks for '{file_name}' (ID: {file_id}), keeping indexed version")
+                return False
+            
+            new_ids = _chunk_ids(file_id, [text for text, _ in items], [meta for _, meta in items], {})
+            existing = collection.get(where={"file_id": file_id}, include=['metadatas'])
+            existing_metadatas = dict(zip(existing['ids'], existing['metadatas'] or [{}] * len(existing['ids'])))
+            
+            next_chunk_index = max(
+                ((meta or {}).get('chunk_index', -1) for meta in existing_metadatas.values()), default=-1
+            ) + 1
+            # Chunk yang di-embed model/backend lain (ganti EMBEDDING_MODEL atau
+            # EMBEDDING_BACKEND, mis. ONNX int8) tidak bisa dipakai ulang
+            reusable = {
+                existing_id for existing_id, meta in existing_metadatas.items()
+                if (meta or {}).get('embedding_key') == self.embedding_key
+            }
+            added = []
+            for position, (new_id, (_, chunk_metadata)) in enumerate(zip(new_ids, items)):
+                if new_id in reusable:
+                    chunk_metadata['chunk_index'] = (existing_metadatas[new_id] or {}).get('chunk_index', 0)
+                else:
+                    chunk_metadata['chunk_index'] = next_chunk_index
+                    next_chunk_index += 1
+                    added.append(position)
+            
+            # Tambah chunk baru dulu; chunk lama baru dihapus jika upsert berhasil
+            if added:
+                precomputed = list(embeddings) if embeddings is not None else None
+                success = self.add_document_chunks(
+                    file_id=file_id,
+                    file_name=file_name,
+                    chunks=[items[i] for i in added],
+                    metadata=metadata,
+                    embeddings=[precomputed[i] for i in added] if precomputed is not None else None,
+                    ids=[new_ids[i] for i in added]
+                )
+                if not success:
+                    return False
+            
+            new_id_set = set(new_ids)
+            vanished = [existing_id for existing_id in existing_metadatas if existing_id not in new_id_set]
+            if vanished:
+                collection.delete(ids=vanished)
+            
+            # Chunk yang dipertahankan: cukup refresh metadata jika file di-rename
+            renamed = [
+                existing_id for existing_id, meta in existing_metadatas.items()
+                if existing_id in reusable and existing_id in new_id_set
+                and (meta or {}).get('file_name') != file_name
+            ]
+            if renamed:
+                collection.update(
+                    ids=renamed,
+                    metadatas=[{**(existing_metadatas[i] or {}), "file_name": file_name} for i in renamed]
+                )
+            
+            print(f"✅ Updated '{file_name}' (ID: {file_id}): {len(added)} added, {len(vanished)} deleted, "
+                  f"{len(items) - len(added)} unchanged chunks")
+            return True
+        
+        except Exception as e:
+            print(f"❌ Error updating document: {e}")
+            self._invalidate_collection()
+            return False
+    
+    def count_document_chunks(self, file_id: str) -> int:
+        """Jumlah chunks dokumen (hanya IDs yang di-fetch)"""
+        collection = self.get_or_create_collection()
+        if not collection:
+            return 0
+        try:
+            return len(collection.get(where={"file_id": file_id}, include=[])['ids'])
+        except Exception:
+            self._invalidate_collection()
+            raise
+    
+    def get_collection_stats(self, totals: Dict = None) -> Dict:
+        """
+        Get statistics tentang collection
+        
+        Args:
+            totals: {'documents', 'chunks'} dari tracking ChromaDocument.totals()
+                (satu aggregate SQL). ChromaDocument hanya ada untuk file yang punya
+                baris GoogleDriveFile, jadi tanpa totals (atau totals kosong)
+                total_documents dihitung dari file_id unik di collection
+                (iter_file_ids, hanya metadata). total_chunks selalu collection.count().
+        """
         try:
             collection = self.get_or_create_collection()
             if not collection:
                 return {}
             
-            count = collection.count()
-            
-            # Get unique files
-            all_items = collection.get()
-            file_ids = set()
-            if all_items['metadatas']:
-                for metadata in all_items['metadatas']:
-                    file_ids.add(metadata.get('file_id', 'unknown'))
+            if totals and totals.get('documents'):
+                total_documents = totals['documents']
+            else:
+                total_documents = sum(1 for _ in self.iter_file_ids())
             
             return {
-                'total_chunks': count,
-                'total_documents': len(file_ids),
-                'model': 'paraphrase-multilingual-MiniLM-L12-v2',
+                'total_chunks': collection.count(),
+                'total_documents': total_documents,
+                'model': self.model_name,
+                'embedding_backend': self.embedding_backend,
                 'collection_name': collection.name,
-                'server': 'Chroma Cloud' if self.use_cloud else 'Local',
-                'host': self.cloud_host if self.use_cloud else 'localhost'
+                'server': 'Chroma Cloud' if self.use_cloud else ('Local NumPy' if self.backend == 'numpy' else 'Local'),
+                'host': self.cloud_host if self.use_cloud else 'localhost',
+                'embedding_cache': self.embedding_cache.stats() if self.embedding_cache else None,
+                'query_cache': self.query_cache.stats() if self.query_cache else None
             }
         
         except Exception as e:
             print(f"❌ Error getting stats: {e}")
+            self._invalidate_collection()
             return {}
     
     def persist(self):
@@ -381,6 +972,10 @@ class ChromaVectorStore:
             print("ℹ️ Chroma Cloud auto-persists, no action needed")
             return
         
+        if self.backend == 'numpy':
+            print("ℹ️ NumPy vector index writes through to disk, no action needed")
+            return
+        
         try:
             self.client.persist()
             print("✅ Local Chroma data persisted to disk")
@@ -391,8 +986,12 @@ class ChromaVectorStore:
         """Check jika connection sehat"""
         try:
             collection = self.get_or_create_collection()
-            return collection is not None
-        except:
+            if collection is None:
+                return False
+            collection.count()
+            return True
+        except Exception:
+            self._invalidate_collection()
             return False
 
 
@@ -0,0 +1,248 @@
+"""
+Token-aware Sentence Chunker
+Chunk diukur dengan tokenizer embedding model (bukan jumlah karakter) dan
+dipotong di batas paragraf/kalimat, sehingga tidak ada ekor chunk yang
+diam-diam dibuang oleh max_seq_length model (128 token untuk MiniLM).
+Tokenisasi dijalankan batch (fast tokenizer) dan packing memakai cumsum NumPy.
+
+Strategy dipilih lewat CHUNK_STRATEGY:
+    sentences   - token-aware, batas kalimat (default)
+    characters  - window karakter tetap (TextChunker.chunk_stream, perilaku lama)
+"""
+
+import os
+import re
+import math
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from transformers import AutoTokenizer
+    TOKENIZER_AVAILABLE = True
+except ImportError:
+    TOKENIZER_AVAILABLE = False
+
+from .onnx_embeddings import DEFAULT_MODEL_NAME, default_model_dir
+
+
+# Paragraf (baris kosong) atau akhir kalimat yang diikuti whitespace
+_PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?;])\s+")
+_WORD_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Batas paragraf atau kalimat (gabungan dua pattern di atas)
+_BOUNDARY_PATTERN = re.compile(r"\n\s*\n|(?<=[.!?;])\s+")
+
+# Jumlah kalimat yang di-tokenize per batch
+_TOKENIZE_BATCH = 256
+
+
+def split_units(text: str) -> List[str]:
+    """Pecah text menjadi paragraf lalu kalimat (whitespace di dalam kalimat dirapikan)"""
+    units = []
+    for paragraph in _PARAGRAPH_PATTERN.split(text):
+        for sentence in _SENTENCE_PATTERN.split(paragraph):
+            sentence = " ".join(sentence.split())
+            if sentence:
+                units.append(sentence)
+    return units
+
+
+class TokenCounter:
+    """
+    Hitung jumlah token per text dengan tokenizer embedding model
+    Tanpa transformers/tokenizer files: estimasi dari jumlah kata dan tanda baca
+    """
+
+    # Rata-rata subword per kata untuk tokenizer multilingual (estimasi fallback)
+    APPROX_TOKENS_PER_PIECE = 1.3
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+        self.special_tokens = tokenizer.num_special_tokens_to_add() if tokenizer is not None else 2
+
+    @classmethod
+    def from_env(cls) -> 'TokenCounter':
+        """
+        Load tokenizer dari CHUNK_TOKENIZER, export ONNX lokal, atau HuggingFace hub
+        (tokenizer yang sama dengan SentenceTransformer model)
+        """
+        if not TOKENIZER_AVAILABLE:
+            print("⚠️  transformers not available, chunker uses approximate token counts")
+            return cls()
+
+        source = os.getenv('CHUNK_TOKENIZER')
+        if not source:
+            onnx_dir = os.getenv('ONNX_MODEL_DIR') or default_model_dir()
+            source = onnx_dir if os.path.isdir(onnx_dir) else f"sentence-transformers/{DEFAULT_MODEL_NAME}"
+
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(source)
+            print(f"✅ Chunk tokenizer loaded: {source}")
+            return cls(tokenizer)
+        except Exception as e:
+            print(f"⚠️  Could not load chunk tokenizer ({e}), using approximate token counts")
+            return cls()
+
+    def lengths(self, texts: List[str]) -> np.ndarray:
+        """Jumlah token (tanpa special tokens) untuk setiap text, satu panggilan batch"""
+        if not texts:
+            return np.zeros(0, dtype=np.int64)
+        if self.tokenizer is None:
+            return np.array([
+                math.ceil(len(_WORD_PIECE_PATTERN.findall(text)) * self.APPROX_TOKENS_PER_PIECE)
+                for text in texts
+            ], dtype=np.int64)
+        encoded = self.tokenizer(texts, add_special_tokens=False, return_attention_mask=False,
+                                 return_token_type_ids=False)
+        return np.fromiter((len(ids) for ids in encoded['input_ids']), dtype=np.int64, count=len(texts))
+
+
+class SentenceChunker:
+    """Pack kalimat menjadi chunk sampai batas token, overlap dihitung dalam token"""
+
+    def __init__(self, counter: TokenCounter, max_tokens: int = 128, overlap_tokens: int = 24):
+        """
+        Args:
+            counter: TokenCounter (tokenizer embedding model)
+            max_tokens: Panjang chunk maksimum termasuk special tokens (max_seq_length model)
+            overlap_tokens: Token dari akhir chunk sebelumnya yang diulang (kalimat utuh)
+        """
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.budget = max(max_tokens - counter.special_tokens, 1)
+        self.overlap_tokens = min(overlap_tokens, self.budget // 2)
+
+    @classmethod
+    def from_env(cls) -> 'SentenceChunker':
+        return cls(
+            TokenCounter.from_env(),
+            max_tokens=int(os.getenv('CHUNK_MAX_TOKENS', '128')),
+            overlap_tokens=int(os.getenv('CHUNK_OVERLAP_TOKENS', '24'))
+        )
+
+    def _iter_units(self, segments: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[str, Tuple]]:
+        """
+        Yield (kalimat, (page_start, page_end)) dari stream segment
+
+        Text mentah setelah batas kalimat/paragraf terakhir setiap segment ditahan
+        sampai segment berikutnya, karena bisa berlanjut (blok TXT 64 KB bisa
+        terpotong di tengah kata, kalimat bisa berlanjut ke halaman berikutnya).
+        Separator hanya ditambahkan di pergantian halaman tanpa whitespace.
+        """
+        carry, carry_page, carry_end, previous_page = "", None, None, None
+        for page_number, text in segments:
+            if not text:
+                continue
+            if carry and page_number != previous_page and not carry[-1].isspace():
+                carry += " "
+            previous_page = page_number
+            combined = carry + text
+            first_page = carry_page if carry else page_number
+            cut = 0
+            for match in _BOUNDARY_PATTERN.finditer(combined):
+                cut = match.end()
+            # Kalimat pertama bisa dimulai di halaman sebelumnya (dari carry)
+            first_end = carry_end if carry and cut <= len(carry) else page_number
+            next_carry_page = carry_page if carry and cut < len(carry) else page_number
+            units = split_units(combined[:cut])
+            carry, carry_page, carry_end = combined[cut:], next_carry_page, page_number
+            for i, unit in enumerate(units):
+                yield unit, (first_page, first_end) if i == 0 else (page_number, page_number)
+        for unit in split_units(carry):
+            yield unit, (carry_page, carry_end)
+
+    def _split_long(self, unit: str, page: Tuple) -> List[Tuple[str, Tuple, int]]:
+        """Pecah kalimat yang melebihi budget di batas kata"""
+        words = unit.split()
+        word_lengths = self.counter.lengths(words)
+        pieces, current, current_length = [], [], 0
+        for word, word_length in zip(words, word_lengths.tolist()):
+            if current and current_length + word_length > self.budget:
+                pieces.append((" ".join(current), page, current_length))
+                current, current_length = [], 0
+            if word_length > self.budget:
+                # Satu "kata" sangat panjang (mis. hash, tabel tanpa spasi): potong per karakter
+                step = max(len(word) * self.budget // word_length, 1)
+                for start in range(0, len(word), step):
+                    piece = word[start:start + step]
+                    pieces.append((piece, page, int(self.counter.lengths([piece])[0])))
+                continue
+            current.append(word)
+            current_length += word_length
+        if current:
+            pieces.append((" ".join(current), page, current_length))
+        return pieces
+
+    def chunk_stream(self, segments: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Split stream (page_number, text) menjadi chunks token-aware
+
+        Yields:
+            (chunk, page_start, page_end) - page None jika format tanpa halaman
+        """
+        texts, pages, lengths = [], [], np.zeros(0, dtype=np.int64)
+        batch, batch_pages = [], []
+
+        def tokenize_batch():
+            nonlocal lengths
+            new_lengths = []
+            for unit, page, length in zip(batch, batch_pages, self.counter.lengths(batch).tolist()):
+                pieces = self._split_long(unit, page) if length > self.budget else [(unit, page, length)]
+                for piece, piece_page, piece_length in pieces:
+                    texts.append(piece)
+                    pages.append(piece_page)
+                    new_lengths.append(piece_length)
+            lengths = np.concatenate([lengths, np.array(new_lengths, dtype=np.int64)])
+            batch.clear()
+            batch_pages.clear()
+
+        def pack(final: bool):
+            """Emit chunk penuh; sisa kalimat yang belum pasti ditahan kecuali final"""
+            nonlocal texts, pages, lengths
+            cumulative = np.cumsum(lengths)
+            total = len(texts)
+            start = 0
+            while start < total:
+                base = cumulative[start - 1] if start else 0
+                end = int(np.searchsorted(cumulative, base + self.budget, side='right'))
+                if end >= total and not final:
+                    break
+                end = max(end, start + 1)
+                yield " ".join(texts[start:end]), pages[start][0], pages[end - 1][1]
+                if end >= total:
+                    start = total
+                    break
+                # Overlap: kalimat utuh terakhir yang totalnya <= overlap_tokens
+                overlap_from = int(np.searchsorted(cumulative, cumulative[end - 1] - self.overlap_tokens, side='left')) + 1
+                start = max(min(overlap_from, end), start + 1)
+            texts, pages, lengths = texts[start:], pages[start:], lengths[start:]
+
+        for unit, page in self._iter_units(segments):
+            batch.append(unit)
+            batch_pages.append(page)
+            if len(batch) >= _TOKENIZE_BATCH:
+                tokenize_batch()
+                yield from pack(final=False)
+
+        tokenize_batch()
+        yield from pack(final=True)
+
+
+_sentence_chunker = None
+_sentence_chunker_lock = threading.Lock()
+
+
+def get_sentence_chunker() -> SentenceChunker:
+    """Get global SentenceChunker (tokenizer di-load sekali per process)"""
+    global _sentence_chunker
+    with _sentence_chunker_lock:
+        if _sentence_chunker is None:
+            _sentence_chunker = SentenceChunker.from_env()
+        return _sentence_chunker
+
+
+def chunk_strategy() -> str:
+    """Strategy chunking aktif (CHUNK_STRATEGY)"""
+    return os.getenv('CHUNK_STRATEGY', 'sentences').lower()
@@ -1,11 +1,15 @@
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
-from .models import db, GoogleDriveFolder, GoogleDriveFile, DocumentSyncLog, ChromaDocument
+from .models import db, GoogleDriveFolder, GoogleDriveFile, DocumentSyncLog, ChromaDocument, DriveSyncState
 from apscheduler.schedulers.background import BackgroundScheduler
 from .documents_handler import ROOT_FOLDERS
+from .indexing_queue import enqueue_many, cancel_jobs
+from .text_cache import get_text_cache
 
 # --- Konfigurasi --- #
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
@@ -25,13 +29,55 @@ def get_drive_service():
     return build('drive', 'v3', credentials=creds)
 
 
-def index_document_to_chroma(file_id: str, file_name: str) -> bool:
+# httplib2 (dipakai googleapiclient) tidak thread-safe: satu service per thread
+_thread_local = threading.local()
+
+
+def get_thread_drive_service():
+    """Drive service milik thread ini (dibuat sekali per thread)"""
+    service = getattr(_thread_local, 'drive_service', None)
+    if service is None:
+        service = _thread_local.drive_service = get_drive_service()
+    return service
+
+
+def track_indexed_document(file_id: str, file_name: str, chunk_count: int = None):
+    """
+    Catat dokumen yang berhasil di-index di tabel ChromaDocument
+    
+    chunk_count (jumlah chunks di vector store) dipakai untuk statistik
+    lewat ChromaDocument.totals(), tanpa scan collection.
+    """
+    chroma_doc = ChromaDocument.query.filter_by(drive_id=file_id).first()
+    if not chroma_doc:
+        db_file = GoogleDriveFile.query.filter_by(drive_id=file_id).first()
+        if db_file:
+            chroma_doc = ChromaDocument(
+                file_id=db_file.id,
+                drive_id=file_id,
+                file_name=file_name,
+                status='indexed'
+            )
+            db.session.add(chroma_doc)
+    else:
+        chroma_doc.updated_at = datetime.utcnow()
+        chroma_doc.status = 'indexed'
+    
+    if chroma_doc and chunk_count is not None:
+        chroma_doc.chunk_count = chunk_count
+    
+    db.session.commit()
+
+
+def index_document_to_chroma(file_id: str, file_name: str, reindex: bool = False) -> bool:
     """
     Index dokumen ke Chroma vector database
     
     Args:
         file_id: Google Drive file ID
         file_name: File name
+        reindex: File berubah: update lewat update_document (diff per chunk ID,
+            hanya chunk baru yang di-embed, chunk yang hilang dihapus)
     
     Returns:
         Success status
@@ -41,26 +87,13 @@ def index_document_to_chroma(file_id: str, file_name: str) -> bool:
     
     try:
         search = ChromaDocumentSearch(SERVICE_ACCOUNT_FILE)
-        success = search.index_document_from_drive(file_id, file_name)
+        if reindex:
+            success = search.update_document(file_id, file_name)
+        else:
+            success = search.index_document_from_drive(file_id, file_name)
         
         if success:
-            # Track in database
-            chroma_doc = ChromaDocument.query.filter_by(drive_id=file_id).first()
-            if not chroma_doc:
-                db_file = GoogleDriveFile.query.filter_by(drive_id=file_id).first()
-                if db_file:
-                    chroma_doc = ChromaDocument(
-                        file_id=db_file.id,
-                        drive_id=file_id,
-                        file_name=file_name,
-                        status='indexed'
-                    )
-                    db.session.add(chroma_doc)
-            else:
-                chroma_doc.updated_at = datetime.utcnow()
-                chroma_doc.status = 'indexed'
-            
-            db.session.commit()
+            track_indexed_document(file_id, file_name, search.vector_store.count_document_chunks(file_id))
             return True
         else:
             return False
@@ -70,104 +103,459 @@ def index_document_to_chroma(file_id: str, file_name: str) -> bool:
         return False
 
 
-def sync_drive_files(folder_id):
-    drive_service = get_drive_service()
-    start_time = time.time()
-    docs_indexed = 0
+INDEXABLE_MIME_TYPES = [
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'text/plain'
+]
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+CHANGES_STATE_NAME = 'changes'
+FILE_FIELDS = "id, name, mimeType, parents, webViewLink, webContentLink, md5Checksum, modifiedTime, size"
+LIST_FIELDS = f"nextPageToken, files({FILE_FIELDS})"
+CHANGE_FIELDS = f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, trashed))"
+LIST_PAGE_SIZE = 1000  # Maksimum Drive API
+BATCH_MAX_REQUESTS = 100  # Maksimum request per Drive batch HTTP call
+
 
+def _parse_drive_time(value):
+    """Parse RFC 3339 timestamp dari Drive API (mis. 2024-05-01T10:20:30.123Z)"""
+    if not value:
+        return None
     try:
-        # --- Recursive sync function --- #
-        def _sync_folder(folder_id, parent_id=None, path='/'):
-            nonlocal docs_indexed
-            folder_count = 0
-            file_count = 0
-
-            # --- Get folder details --- #
-            folder = drive_service.files().get(fileId=folder_id, fields='id, name').execute()
-            folder_name = folder.get('name')
-            current_path = os.path.join(path, folder_name)
-
-            # --- Update or create folder in db --- #
-            db_folder = GoogleDriveFolder.query.filter_by(drive_id=folder_id).first()
-            if not db_folder:
-                db_folder = GoogleDriveFolder(
-                    drive_id=folder_id,
-                    name=folder_name,
-                    parent_id=parent_id,
-                    path=current_path
-                )
-                db.session.add(db_folder)
-                folder_count += 1
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+    except ValueError:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+
+
+def _file_changed(db_file, item) -> bool:
+    """
+    Cek apakah konten file berubah sejak sync terakhir
+    
+    md5Checksum (file biner) dibandingkan lebih dulu; file Google Docs tidak
+    punya md5 sehingga memakai modifiedTime. Size selalu ikut dibandingkan.
+    """
+    size = int(item['size']) if item.get('size') is not None else None
+    if size != db_file.size:
+        return True
+    if item.get('md5Checksum') or db_file.md5_checksum:
+        return item.get('md5Checksum') != db_file.md5_checksum
+    return _parse_drive_time(item.get('modifiedTime')) != db_file.modified_time
+
+
+def _change_fields(item) -> dict:
+    """Kolom change detection GoogleDriveFile dari item Drive API"""
+    return {
+        'md5_checksum': item.get('md5Checksum'),
+        'modified_time': _parse_drive_time(item.get('modifiedTime')),
+        'size': int(item['size']) if item.get('size') is not None else None,
+    }
+
+
+def _sync_files(items, folder_db_id, stats):
+    """
+    Insert/update sekumpulan GoogleDriveFile (satu folder) dan enqueue indexing
+    untuk file yang baru atau berubah
+    
+    Drive ID yang sudah dikenal di-prefetch dengan satu query, insert/update
+    memakai bulk mappings, dan semua perubahan (termasuk job indexing) di-commit
+    sekali per batch SYNC_COMMIT_BATCH_SIZE item. Embedding dijalankan oleh
+    worker (app.scheduler); job yang gagal permanen me-reset metadata change
+    detection supaya file di-enqueue ulang pada sync berikutnya.
+    """
+    batch_size = int(os.getenv('SYNC_COMMIT_BATCH_SIZE', '500'))
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        now = datetime.utcnow()
+
+        known = {
+            row.drive_id: row
+            for row in db.session.query(
+                GoogleDriveFile.id, GoogleDriveFile.drive_id, GoogleDriveFile.md5_checksum,
+                GoogleDriveFile.modified_time, GoogleDriveFile.size
+            ).filter(GoogleDriveFile.drive_id.in_([item['id'] for item in batch]))
+        }
+
+        new_rows = []
+        update_rows = []
+        to_index = []
+        for item in batch:
+            row = {
+                'name': item['name'],
+                'mime_type': item['mimeType'],
+                'folder_id': folder_db_id,
+                'web_view_link': item.get('webViewLink'),
+                'last_synced': now,
+            }
+            db_file = known.get(item['id'])
+            if db_file is None:
+                status = 'new'
+            elif _file_changed(db_file, item):
+                status = 'updated'
+            else:
+                status = 'skipped'
+            stats[{'new': 'file_baru', 'updated': 'file_update', 'skipped': 'file_skip'}[status]] += 1
+
+            if status != 'skipped':
+                row.update(_change_fields(item))
+                if item['mimeType'] in INDEXABLE_MIME_TYPES:
+                    to_index.append({'drive_id': item['id'], 'file_name': item['name'], 'reindex': status == 'updated'})
+
+            if db_file is None:
+                row.update(drive_id=item['id'], download_link=item.get('webContentLink'))
+                new_rows.append(row)
             else:
-                db_folder.name = folder_name
-                db_folder.path = current_path
-                db_folder.last_synced = datetime.utcnow()
+                row['id'] = db_file.id
+                update_rows.append(row)
+
+        if new_rows:
+            db.session.bulk_insert_mappings(GoogleDriveFile, new_rows)
+        if update_rows:
+            db.session.bulk_update_mappings(GoogleDriveFile, update_rows)
+        enqueue_many(to_index, commit=False)
+        stats['docs_queued'] += len(to_index)
+        db.session.commit()
+
+
+def remove_document_from_chroma(file_id: str) -> bool:
+    """
+    Hapus dokumen dari Chroma (dan BM25 index) beserta tracking ChromaDocument
+    dan extracted text cache
+    
+    Args:
+        file_id: Google Drive file ID
+    
+    Returns:
+        Success status
+    """
+    return remove_documents_from_chroma([file_id])
 
+
+def remove_documents_from_chroma(file_ids, search=None) -> bool:
+    """
+    Versi bulk remove_document_from_chroma: satu delete per batch di vector store
+    dan satu commit database
+    
+    Args:
+        file_ids: List of Google Drive file IDs
+        search: ChromaDocumentSearch yang sudah ada (opsional)
+    
+    Returns:
+        Success status
+    """
+    success = True
+    if CHROMA_AVAILABLE:
+        try:
+            search = search or ChromaDocumentSearch(SERVICE_ACCOUNT_FILE)
+            success = search.delete_documents(file_ids)
+        except Exception as e:
+            print(f"❌ Error deleting from Chroma: {e}")
+            success = False
+    
+    text_cache = get_text_cache()
+    if text_cache:
+        for file_id in file_ids:
+            text_cache.delete(file_id)
+    cancel_jobs(file_ids, commit=False)
+    
+    ChromaDocument.query.filter(ChromaDocument.drive_id.in_(file_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return success
+
+
+def _drive_files_gone(drive_service, drive_ids):
+    """
+    Cek ke Drive (batch HTTP request) file mana yang sudah dihapus atau di-trash
+    
+    Error selain 404 dianggap file masih ada, supaya dokumen tidak terhapus
+    karena gangguan sementara.
+    """
+    gone = set()
+
+    def _callback(request_id, response, exception):
+        if exception is not None:
+            if getattr(getattr(exception, 'resp', None), 'status', None) == 404:
+                gone.add(request_id)
+            return
+        if response.get('trashed'):
+            gone.add(request_id)
+
+    for start in range(0, len(drive_ids), BATCH_MAX_REQUESTS):
+        batch = drive_service.new_batch_http_request(callback=_callback)
+        for drive_id in drive_ids[start:start + BATCH_MAX_REQUESTS]:
+            batch.add(drive_service.files().get(fileId=drive_id, fields='id, trashed'), request_id=drive_id)
+        batch.execute()
+    return gone
+
+
+def reconcile_vector_store(drive_service=None, batch_size=None):
+    """
+    Purge chunks orphan dari vector store dan BM25 index
+    (sekaligus backfill ChromaDocument.chunk_count yang belum terisi)
+    
+    Dokumen yang ter-index (vector store, BM25, ChromaDocument) dibandingkan
+    dengan GoogleDriveFile. Kandidat yang tidak ada di database dicek ke Drive;
+    yang sudah dihapus atau di-trash di-purge per batch (RECONCILE_BATCH_SIZE).
+    File yang masih ada di Drive (mis. di-index oleh index_all_files sebelum
+    sync) dibiarkan.
+    
+    Returns:
+        dict stats, atau None jika gagal
+    """
+    batch_size = batch_size or int(os.getenv('RECONCILE_BATCH_SIZE', '100'))
+    start_time = time.time()
+
+    try:
+        search = ChromaDocumentSearch(SERVICE_ACCOUNT_FILE) if CHROMA_AVAILABLE else None
+        indexed = {drive_id for (drive_id,) in db.session.query(ChromaDocument.drive_id)}
+        if search and search.vector_store:
+            indexed.update(search.vector_store.iter_file_ids())
+        if search and search.keyword_index:
+            indexed.update(search.keyword_index.file_ids())
+
+        known = {drive_id for (drive_id,) in db.session.query(GoogleDriveFile.drive_id)}
+        candidates = sorted(indexed - known)
+        orphans = sorted(_drive_files_gone(drive_service or get_drive_service(), candidates)) if candidates else []
+
+        for start in range(0, len(orphans), batch_size):
+            remove_documents_from_chroma(orphans[start:start + batch_size], search)
+
+        # Dokumen yang di-index sebelum chunk_count dicatat: isi dari vector store
+        backfilled = 0
+        if search and search.vector_store:
+            for chroma_doc in ChromaDocument.query.filter(
+                db.or_(ChromaDocument.chunk_count.is_(None), ChromaDocument.chunk_count == 0)
+            ).all():
+                chroma_doc.chunk_count = search.vector_store.count_document_chunks(chroma_doc.drive_id)
+                backfilled += 1
             db.session.commit()
 
-            # --- Get all files and folders in the current folder --- #
-            query = f"'{folder_id}' in parents"
-            results = drive_service.files().list(q=query, fields="nextPageToken, files(id, name, mimeType, webViewLink)").execute()
-            items = results.get('files', [])
-
-            # --- Sync subfolders and files --- #
-            for item in items:
-                if item['mimeType'] == 'application/vnd.google-apps.folder':
-                    sub_folder_count, sub_file_count = _sync_folder(item['id'], db_folder.id, current_path)
-                    folder_count += sub_folder_count
-                    file_count += sub_file_count
-                else:
-                    # Check if file is indexable (PDF, DOCX, TXT)
-                    is_indexable = item['mimeType'] in [
-                        'application/pdf',
-                        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                        'text/plain'
-                    ]
-                    
-                    db_file = GoogleDriveFile.query.filter_by(drive_id=item['id']).first()
-                    if not db_file:
-                        db_file = GoogleDriveFile(
-                            drive_id=item['id'],
-                            name=item['name'],
-                            mime_type=item['mimeType'],
-                            folder_id=db_folder.id,
-                            web_view_link=item.get('webViewLink'),
-                            download_link=item.get('webContentLink')
-                        )
-                        db.session.add(db_file)
-                        db.session.commit()
-                        file_count += 1
-                        
-                        # Index new file to Chroma
-                        if is_indexable:
-                            if index_document_to_chroma(item['id'], item['name']):
-                                docs_indexed += 1
+        stats = {
+            'indexed': len(indexed),
+            'candidates': len(candidates),
+            'purged': len(orphans),
+            'kept': len(candidates) - len(orphans),
+            'chunk_counts_backfilled': backfilled
+        }
+        print(f"✅ Reconcile: {stats['indexed']} indexed documents, {stats['purged']} orphans purged, "
+              f"{stats['kept']} not synced but still in Drive, {backfilled} chunk counts backfilled "
+              f"({time.time() - start_time:.1f}s)")
+        return stats
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error reconciling vector store: {e}")
+        return None
+
+
+def _new_sync_stats():
+    return {
+        'folder_baru': 0, 'folder_update': 0, 'folder_hapus': 0,
+        'file_baru': 0, 'file_update': 0, 'file_skip': 0, 'file_hapus': 0,
+        'docs_queued': 0
+    }
+
+
+def _list_request(service, folder_id, page_token=None):
+    return service.files().list(
+        q=f"'{folder_id}' in parents and trashed = false",
+        fields=LIST_FIELDS,
+        pageSize=LIST_PAGE_SIZE,
+        pageToken=page_token
+    )
+
+
+def _list_folders(folder_ids):
+    """
+    List isi beberapa folder (dijalankan di worker thread)
+    
+    Halaman pertama semua folder diambil dengan satu Drive batch HTTP request,
+    halaman berikutnya mengikuti nextPageToken sampai habis.
+    
+    Returns:
+        dict folder_id -> list of items
+    """
+    service = get_thread_drive_service()
+    listings = {folder_id: [] for folder_id in folder_ids}
+    next_tokens = {}
+    failed = []
+
+    def _callback(request_id, response, exception):
+        if exception is not None:
+            failed.append(request_id)
+            return
+        listings[request_id].extend(response.get('files', []))
+        if response.get('nextPageToken'):
+            next_tokens[request_id] = response['nextPageToken']
+
+    if len(folder_ids) == 1:
+        _callback(folder_ids[0], _list_request(service, folder_ids[0]).execute(num_retries=3), None)
+    else:
+        batch = service.new_batch_http_request(callback=_callback)
+        for folder_id in folder_ids:
+            batch.add(_list_request(service, folder_id), request_id=folder_id)
+        batch.execute()
+
+    # Request yang gagal di dalam batch (mis. rate limit) diulang satu per satu
+    for folder_id in failed:
+        _callback(folder_id, _list_request(service, folder_id).execute(num_retries=3), None)
+
+    for folder_id, page_token in next_tokens.items():
+        while page_token:
+            response = _list_request(service, folder_id, page_token).execute(num_retries=3)
+            listings[folder_id].extend(response.get('files', []))
+            page_token = response.get('nextPageToken')
+
+    return listings
+
+
+def iter_folder_files(root_folder_ids, max_workers=None):
+    """
+    Yield semua file (bukan folder) di subtree root folders tanpa menulis database
+    
+    Traversal breadth-first yang sama dengan _sync_folder: listing paralel per
+    level dengan batch request dan paging penuh. Setiap item diberi key
+    'folder_path' (path relatif terhadap root).
+    """
+    max_workers = max_workers or int(os.getenv('DRIVE_SYNC_WORKERS', '4'))
+    level = [(folder_id, '/') for folder_id in root_folder_ids]
+    seen = set(root_folder_ids)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='drive-list') as executor:
+        while level:
+            folder_ids = [folder_id for folder_id, _ in level]
+            per_batch = min(BATCH_MAX_REQUESTS, -(-len(folder_ids) // max_workers))
+            listings = {}
+            for result in executor.map(
+                _list_folders,
+                [folder_ids[i:i + per_batch] for i in range(0, len(folder_ids), per_batch)]
+            ):
+                listings.update(result)
+
+            next_level = []
+            for folder_id, path in level:
+                for item in listings[folder_id]:
+                    if item['mimeType'] == FOLDER_MIME_TYPE:
+                        if item['id'] not in seen:
+                            seen.add(item['id'])
+                            next_level.append((item['id'], os.path.join(path, item['name'])))
                     else:
-                        db_file.name = item['name']
-                        db_file.last_synced = datetime.utcnow()
-                        db.session.commit()
-                        
-                        # Re-index if file changed
-                        if is_indexable:
-                            if index_document_to_chroma(item['id'], item['name']):
-                                docs_indexed += 1
+                        yield {**item, 'folder_path': path}
+            level = next_level
+
+
+def _upsert_folders(items, parent_id, parent_path, stats):
+    """
+    Insert/update folder (satu parent) dengan satu query prefetch
+    
+    Returns:
+        List of GoogleDriveFolder (urutan sama dengan items)
+    """
+    known = {
+        folder.drive_id: folder
+        for folder in GoogleDriveFolder.query.filter(
+            GoogleDriveFolder.drive_id.in_([item['id'] for item in items])
+        )
+    } if items else {}
+
+    folders = []
+    for item in items:
+        path = os.path.join(parent_path, item['name'])
+        db_folder = known.get(item['id'])
+        if db_folder is None:
+            db_folder = GoogleDriveFolder(
+                drive_id=item['id'],
+                name=item['name'],
+                parent_id=parent_id,
+                path=path
+            )
+            db.session.add(db_folder)
+            stats['folder_baru'] += 1
+        else:
+            db_folder.name = item['name']
+            db_folder.path = path
+            if parent_id is not None:
+                db_folder.parent_id = parent_id
+            db_folder.last_synced = datetime.utcnow()
+        folders.append(db_folder)
+
+    db.session.flush()
+    return folders
+
+
+def _sync_folder(drive_service, folder_id, parent_id=None, path='/', stats=None):
+    """
+    Sync satu folder beserta seluruh subtree ke database (breadth-first)
+    
+    Setiap level, isi semua folder sibling di-list paralel lewat thread pool
+    (DRIVE_SYNC_WORKERS) dengan Drive batch HTTP request dan paging penuh.
+    Semua penulisan database tetap di thread ini.
+    
+    Hasil (folder/file baru, update, skip) dicatat ke dict stats.
+    """
+    if stats is None:
+        stats = _new_sync_stats()
 
-            return folder_count, file_count
+    max_workers = int(os.getenv('DRIVE_SYNC_WORKERS', '4'))
+    folder = drive_service.files().get(fileId=folder_id, fields='id, name').execute()
+    level = _upsert_folders([folder], parent_id, path, stats)
+    db.session.commit()
+    seen = {folder_id}
 
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='drive-sync') as executor:
+        while level:
+            # Bagi folder di level ini ke beberapa batch supaya semua worker terpakai
+            folder_ids = [db_folder.drive_id for db_folder in level]
+            per_batch = min(BATCH_MAX_REQUESTS, -(-len(folder_ids) // max_workers))
+            listings = {}
+            for result in executor.map(
+                _list_folders,
+                [folder_ids[i:i + per_batch] for i in range(0, len(folder_ids), per_batch)]
+            ):
+                listings.update(result)
+
+            next_level = []
+            for db_folder in level:
+                items = listings[db_folder.drive_id]
+                # Folder dengan beberapa parent cukup di-walk sekali
+                subfolders = [
+                    item for item in items
+                    if item['mimeType'] == FOLDER_MIME_TYPE and item['id'] not in seen
+                ]
+                seen.update(item['id'] for item in subfolders)
+                files = [item for item in items if item['mimeType'] != FOLDER_MIME_TYPE]
+
+                _sync_files(files, db_folder.id, stats)
+                next_level.extend(_upsert_folders(subfolders, db_folder.id, db_folder.path, stats))
+                db.session.commit()
+
+            level = next_level
+
+    return stats
+
+
+def sync_drive_files(folder_id):
+    drive_service = get_drive_service()
+    start_time = time.time()
+    stats = _new_sync_stats()
+
+    try:
         # --- Start the sync --- #
-        total_folders, total_files = _sync_folder(folder_id)
+        _sync_folder(drive_service, folder_id, stats=stats)
 
         # --- Log the sync --- #
         sync_log = DocumentSyncLog(
             status='success',
-            folder_baru=total_folders,
-            file_baru=total_files,
+            folder_baru=stats['folder_baru'],
+            file_baru=stats['file_baru'],
+            file_update=stats['file_update'],
+            file_skip=stats['file_skip'],
             durasi_detik=time.time() - start_time
         )
         db.session.add(sync_log)
         db.session.commit()
         
-        print(f"✅ Sync completed: {total_folders} folders, {total_files} files, {docs_indexed} indexed to Chroma")
+        print(f"✅ Sync completed: {stats['folder_baru']} folders, {stats['file_baru']} new files, "
+              f"{stats['file_skip']} unchanged, {stats['docs_queued']} queued for indexing")
 
     except Exception as e:
         sync_log = DocumentSyncLog(
@@ -180,6 +568,184 @@ def sync_drive_files(folder_id):
         print(f"❌ Error during Google Drive sync: {e}")
 
 
+def _update_subtree_paths(db_folder):
+    """Update path semua subfolder setelah folder di-rename atau dipindah"""
+    for subfolder in db_folder.subfolders:
+        subfolder.path = os.path.join(db_folder.path, subfolder.name)
+        _update_subtree_paths(subfolder)
+
+
+def _remove_folder_tree(db_folder, removed_ids):
+    """
+    Hapus folder beserta semua subfolder dan file dari database
+    
+    Drive ID file yang dihapus ditambahkan ke removed_ids; dokumennya dihapus dari
+    Chroma sekaligus oleh caller (remove_documents_from_chroma), yang juga commit.
+    """
+    removed_files = 0
+    for subfolder in db_folder.subfolders.all():
+        removed_files += _remove_folder_tree(subfolder, removed_ids)
+    for db_file in db_folder.files.all():
+        removed_ids.add(db_file.drive_id)
+        db.session.delete(db_file)
+        removed_files += 1
+    db.session.delete(db_folder)
+    return removed_files
+
+
+def _apply_change(drive_service, change, stats, removed_ids):
+    """
+    Terapkan satu entry dari changes().list ke database
+    
+    File/folder di luar folder yang sudah ter-sync diabaikan; file yang keluar
+    dari folder ter-sync (dipindah atau di-trash) dihapus. Drive ID file yang
+    dihapus dikumpulkan di removed_ids untuk satu remove_documents_from_chroma
+    per halaman changes.
+    """
+    drive_id = change.get('fileId')
+    item = change.get('file') or {}
+    gone = change.get('removed') or item.get('trashed')
+    is_folder = item.get('mimeType') == FOLDER_MIME_TYPE
+
+    parent = None
+    if not gone:
+        parent_ids = item.get('parents') or []
+        if parent_ids:
+            parent = GoogleDriveFolder.query.filter(GoogleDriveFolder.drive_id.in_(parent_ids)).first()
+
+    db_folder = GoogleDriveFolder.query.filter_by(drive_id=drive_id).first()
+    if db_folder is not None or (is_folder and parent is not None):
+        if parent is None:
+            # Root folder tidak punya parent yang ter-sync; hanya hapus jika di-trash
+            if gone or db_folder.parent_id is not None:
+                stats['file_hapus'] += _remove_folder_tree(db_folder, removed_ids)
+                stats['folder_hapus'] += 1
+            return
+        
+        if db_folder is None:
+            # Folder baru (atau dipindah masuk): walk isinya sekali
+            _sync_folder(drive_service, drive_id, parent.id, parent.path, stats)
+            return
+        
+        db_folder.name = item['name']
+        db_folder.parent_id = parent.id
+        db_folder.path = os.path.join(parent.path, item['name'])
+        db_folder.last_synced = datetime.utcnow()
+        _update_subtree_paths(db_folder)
+        db.session.commit()
+        stats['folder_update'] += 1
+        return
+
+    db_file = GoogleDriveFile.query.filter_by(drive_id=drive_id).first()
+    if parent is None:
+        if db_file is not None:
+            removed_ids.add(drive_id)
+            db.session.delete(db_file)
+            stats['file_hapus'] += 1
+        return
+
+    # File keluar lalu masuk lagi dalam halaman yang sama: jangan dihapus dari Chroma
+    removed_ids.discard(drive_id)
+    _sync_files([item], parent.id, stats)
+
+
+def sync_drive_changes(root_folder_ids):
+    """
+    Incremental sync via Google Drive Changes API
+    
+    Run pertama (atau root folder yang belum pernah ter-sync) memakai full walk
+    untuk seed database, lalu startPageToken disimpan di DriveSyncState.
+    Run berikutnya hanya memproses delta dari changes().list.
+    
+    Args:
+        root_folder_ids: List of Google Drive root folder IDs
+    """
+    drive_service = get_drive_service()
+    start_time = time.time()
+    stats = _new_sync_stats()
+
+    try:
+        state = DriveSyncState.query.filter_by(name=CHANGES_STATE_NAME).first()
+        unsynced_roots = [
+            folder_id for folder_id in root_folder_ids
+            if not GoogleDriveFolder.query.filter_by(drive_id=folder_id).first()
+        ]
+
+        if state is None or unsynced_roots:
+            # Ambil token SEBELUM full walk supaya perubahan selama walk tidak terlewat
+            seed_token = drive_service.changes().getStartPageToken().execute()['startPageToken']
+            for folder_id in (root_folder_ids if state is None else unsynced_roots):
+                print(f"   Full walk (seed): {folder_id}")
+                _sync_folder(drive_service, folder_id, stats=stats)
+
+            if state is None:
+                state = DriveSyncState(name=CHANGES_STATE_NAME, page_token=seed_token)
+                db.session.add(state)
+                db.session.commit()
+                mode = 'full'
+            else:
+                mode = 'seed'
+        else:
+            mode = 'changes'
+
+        # --- Proses delta dari token tersimpan --- #
+        page_token = state.page_token
+        api_calls = 0
+        changes_seen = 0
+        while page_token:
+            response = drive_service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                includeRemoved=True,
+                pageSize=1000,
+                fields=CHANGE_FIELDS
+            ).execute()
+            api_calls += 1
+
+            removed_ids = set()
+            for change in response.get('changes', []):
+                changes_seen += 1
+                _apply_change(drive_service, change, stats, removed_ids)
+            if removed_ids:
+                # Satu bulk delete (vector store, BM25, job queue) untuk semua file yang hilang
+                remove_documents_from_chroma(list(removed_ids))
+            db.session.commit()
+
+            if 'newStartPageToken' in response:
+                state.page_token = response['newStartPageToken']
+                db.session.commit()
+            page_token = response.get('nextPageToken')
+
+        sync_log = DocumentSyncLog(
+            status='success',
+            folder_baru=stats['folder_baru'],
+            folder_update=stats['folder_update'],
+            file_baru=stats['file_baru'],
+            file_update=stats['file_update'],
+            file_skip=stats['file_skip'],
+            durasi_detik=time.time() - start_time
+        )
+        db.session.add(sync_log)
+        db.session.commit()
+
+        print(f"✅ Drive sync ({mode}): {changes_seen} changes in {api_calls} API calls, "
+              f"{stats['file_baru']} new / {stats['file_update']} updated / {stats['file_skip']} unchanged / {stats['file_hapus']} removed files, "
+              f"{stats['docs_queued']} queued for indexing")
+        return stats
+
+    except Exception as e:
+        db.session.rollback()
+        sync_log = DocumentSyncLog(
+            status='failed',
+            error_message=str(e),
+            durasi_detik=time.time() - start_time
+        )
+        db.session.add(sync_log)
+        db.session.commit()
+        print(f"❌ Error during Google Drive changes sync: {e}")
+        return None
+
+
 def get_folder_id(folder_name):
     drive_service = get_drive_service()
     query = f"name = '{folder_name}' and mimeType = 'application/vnd.google-apps.folder'"
@@ -193,11 +759,17 @@ def sync_all_folders():
     from . import create_app
     app = create_app()
     with app.app_context():
-        for folder_name, folder_id in ROOT_FOLDERS.items():
-            print(f"Syncing folder: {folder_name}")
-            sync_drive_files(folder_id)
+        print(f"Syncing folders: {', '.join(ROOT_FOLDERS)}")
+        sync_drive_changes(list(ROOT_FOLDERS.values()))
+
+def reconcile_all():
+    from . import create_app
+    app = create_app()
+    with app.app_context():
+        reconcile_vector_store()
 
 def setup_scheduler():
     scheduler = BackgroundScheduler()
     scheduler.add_job(sync_all_folders, 'cron', day_of_week='sun', hour=2)
+    scheduler.add_job(reconcile_all, 'cron', day_of_week='sun', hour=4)
     return scheduler
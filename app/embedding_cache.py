@@ -0,0 +1,318 @@
+"""
+Persistent Embedding Cache
+Menyimpan embedding chunk di disk (SQLite) dengan key (model name, SHA-256 chunk text)
+supaya re-index dokumen yang tidak berubah tidak perlu encode ulang.
+Juga menyediakan LRU cache untuk query embeddings di search path.
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+import numpy as np
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'instance', 'embedding_cache.sqlite3')
+DEFAULT_QUERY_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'instance', 'query_cache.sqlite3')
+
+# SQLite membatasi jumlah parameter per statement (default 999)
+_SQL_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 hex digest dari chunk text"""
+    return hashlib.sha256(text.encode('utf-8', errors='ignore')).hexdigest()
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalisasi query untuk cache key (hanya whitespace yang dirapikan)
+
+    Huruf besar/kecil tidak diubah: model cased (mis. BERT multilingual cased)
+    menghasilkan embedding berbeda untuk "STNK" dan "stnk".
+    """
+    return " ".join(query.split())
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache dengan size cap dan LRU eviction
+    Aman dipakai bersama oleh beberapa gunicorn worker (SQLite WAL + file lock)
+    """
+
+    def __init__(self, path: str = None, max_entries: int = 200000):
+        """
+        Initialize embedding cache
+
+        Args:
+            path: Lokasi file SQLite cache
+            max_entries: Jumlah maksimum embedding yang disimpan sebelum eviction
+        """
+        self.path = os.path.abspath(path or DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                created_at REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        # Cache lama belum punya created_at; entry tersebut dianggap kadaluarsa untuk lookup ber-TTL
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if 'created_at' not in columns:
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional['EmbeddingCache']:
+        """Buat cache dari environment variables (None jika di-disable)"""
+        if os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() != 'true':
+            return None
+
+        try:
+            return cls(
+                path=os.getenv('EMBEDDING_CACHE_PATH') or None,
+                max_entries=int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+            )
+        except Exception as e:
+            print(f"⚠️  Embedding cache disabled: {e}")
+            return None
+
+    def get_many(self,
+                 model_name: str,
+                 texts: List[str],
+                 max_age: Optional[float] = None) -> List[Optional[List[float]]]:
+        """
+        Lookup embeddings untuk list of texts
+
+        Args:
+            model_name: Embedding key (model + backend)
+            texts: Texts yang dicari
+            max_age: Umur maksimum entry dalam detik (None = tanpa batas)
+
+        Returns:
+            List dengan panjang sama seperti texts, None untuk cache miss
+        """
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        min_created = time.time() - max_age if max_age is not None else None
+
+        with self._lock:
+            for start in range(0, len(hashes), _SQL_BATCH):
+                batch = hashes[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                sql = f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})"
+                params = [model_name, *batch]
+                if min_created is not None:
+                    sql += " AND created_at >= ?"
+                    params.append(min_created)
+                rows = self._conn.execute(sql, params).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model_name, h) for h in found]
+                )
+                self._conn.commit()
+
+            results = [found.get(h) for h in hashes]
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model_name: str, texts: List[str], embeddings: List[List[float]]):
+        """Simpan embeddings ke cache lalu evict entry paling lama jika melebihi max_entries"""
+        if not texts:
+            return
+
+        now = time.time()
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            vector = np.asarray(embedding, dtype=np.float32)
+            rows.append((model_name, text_hash(text), int(vector.shape[0]), vector.tobytes(), now, now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        """Hapus entry least-recently-used sampai jumlah entry <= max_entries"""
+        total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = total - self.max_entries
+        if excess <= 0:
+            return
+
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,)
+        )
+        self.evictions += excess
+
+    def stats(self) -> Dict:
+        """Hit/miss counters dan ukuran cache"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'path': self.path
+        }
+
+    def clear(self):
+        """Kosongkan cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+        print("✅ Embedding cache cleared")
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU cache dengan TTL untuk query embeddings
+    Opsional: shared backend (EmbeddingCache di disk) supaya semua gunicorn worker
+    bisa memakai embedding yang sudah di-encode worker lain
+    """
+
+    def __init__(self,
+                 max_entries: int = 1024,
+                 ttl_seconds: float = 3600,
+                 shared: Optional[EmbeddingCache] = None):
+        """
+        Initialize query cache
+
+        Args:
+            max_entries: Jumlah maksimum query di memory
+            ttl_seconds: Umur maksimum entry (memory maupun shared backend)
+            shared: Shared backend (opsional) untuk lintas proses
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, embedding)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['QueryEmbeddingCache']:
+        """Buat query cache dari environment variables (None jika di-disable)"""
+        if os.getenv('QUERY_CACHE_ENABLED', 'true').lower() != 'true':
+            return None
+
+        shared = None
+        if os.getenv('QUERY_CACHE_SHARED', 'false').lower() == 'true':
+            try:
+                shared = EmbeddingCache(
+                    path=os.getenv('QUERY_CACHE_SHARED_PATH') or DEFAULT_QUERY_CACHE_PATH,
+                    max_entries=int(os.getenv('QUERY_CACHE_SHARED_MAX_ENTRIES', '20000'))
+                )
+            except Exception as e:
+                print(f"⚠️  Shared query cache disabled: {e}")
+
+        return cls(
+            max_entries=int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '1024')),
+            ttl_seconds=float(os.getenv('QUERY_CACHE_TTL', '3600')),
+            shared=shared
+        )
+
+    def get(self, model_name: str, query: str) -> Optional[List[float]]:
+        """Ambil query embedding dari memory, lalu shared backend"""
+        key = (model_name, normalize_query(query))
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, embedding = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+
+        if self.shared:
+            embedding = self.shared.get_many(model_name, [key[1]], max_age=self.ttl_seconds)[0]
+            if embedding is not None:
+                self._remember(key, embedding)
+                with self._lock:
+                    self.shared_hits += 1
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model_name: str, query: str, embedding: List[float]):
+        """Simpan query embedding ke memory (dan shared backend jika ada)"""
+        key = (model_name, normalize_query(query))
+        self._remember(key, embedding)
+
+        if self.shared:
+            try:
+                self.shared.put_many(model_name, [key[1]], [embedding])
+            except Exception as e:
+                print(f"⚠️  Could not write shared query cache: {e}")
+
+    def _remember(self, key, embedding: List[float]):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Hit-rate metrics untuk query cache"""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'shared': self.shared is not None
+            }
+
+    def clear(self):
+        """Kosongkan in-process cache"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,304 @@
+"""
+Shared Embedding Service
+Satu proses memegang SentenceTransformer model dan melayani encode request
+dari semua gunicorn worker lewat Unix socket, dengan request micro-batching
+
+Jalankan server:
+    python -m app.embedding_service
+
+Aktifkan client mode di worker:
+    EMBEDDING_SERVICE_SOCKET=/tmp/diklat_embedding.sock
+"""
+
+import os
+import json
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import List, Dict, Tuple, Union
+
+import numpy as np
+
+
+DEFAULT_SOCKET_PATH = '/tmp/diklat_embedding.sock'
+DEFAULT_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+# Wire format: [4 byte header length][JSON header][4 byte payload length][payload]
+_LENGTH = struct.Struct('!I')
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        part = sock.recv(size - len(data))
+        if not part:
+            raise ConnectionError("Embedding service connection closed")
+        data.extend(part)
+    return bytes(data)
+
+
+def _send_message(sock: socket.socket, header: Dict, payload: bytes = b''):
+    header_bytes = json.dumps(header).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(header_bytes)) + header_bytes + _LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_message(sock: socket.socket) -> Tuple[Dict, bytes]:
+    header_size = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))[0]
+    header = json.loads(_recv_exact(sock, header_size).decode('utf-8'))
+    payload_size = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))[0]
+    payload = _recv_exact(sock, payload_size) if payload_size else b''
+    return header, payload
+
+
+class _PendingRequest:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Gabungkan encode request yang datang bersamaan menjadi satu model.encode()
+    Request ditahan maksimal max_wait_ms sambil menunggu request lain
+    """
+
+    def __init__(self, model, max_batch_size: int = 64, max_wait_ms: float = 5):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts (blocking sampai batch yang memuat request ini selesai)"""
+        pending = _PendingRequest(texts)
+        self._queue.put(pending)
+        pending.event.wait()
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    def _collect_batch(self) -> List[_PendingRequest]:
+        batch = [self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.time() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            size += len(pending.texts)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            all_texts = [text for pending in batch for text in pending.texts]
+
+            try:
+                embeddings = np.asarray(
+                    self.model.encode(all_texts, batch_size=self.max_batch_size),
+                    dtype=np.float32
+                )
+                offset = 0
+                for pending in batch:
+                    pending.result = embeddings[offset:offset + len(pending.texts)]
+                    offset += len(pending.texts)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += len(all_texts)
+            for pending in batch:
+                pending.event.set()
+
+    def stats(self) -> Dict:
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'texts': self.texts,
+            'avg_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else 0.0
+        }
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Satu koneksi per client thread, banyak request per koneksi"""
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                header, _ = _recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            op = header.get('op')
+            try:
+                if op == 'encode':
+                    embeddings = server.batcher.encode(header.get('texts', []))
+                    _send_message(
+                        self.request,
+                        {'ok': True, 'shape': list(embeddings.shape)},
+                        embeddings.tobytes()
+                    )
+                elif op == 'info':
+                    _send_message(self.request, {
+                        'ok': True,
+                        'model': server.model_name,
+                        'backend': server.backend,
+                        'dim': server.dimension,
+                        'stats': server.batcher.stats()
+                    })
+                else:
+                    _send_message(self.request, {'ok': False, 'error': f'Unknown op: {op}'})
+            except Exception as e:
+                try:
+                    _send_message(self.request, {'ok': False, 'error': str(e)})
+                except OSError:
+                    return
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server yang memegang satu embedding model"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, model, model_name: str,
+                 max_batch_size: int = 64, max_wait_ms: float = 5,
+                 backend: str = 'sentence-transformers'):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        self.model_name = model_name
+        self.backend = backend
+        self.dimension = model.get_sentence_embedding_dimension()
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait_ms)
+        super().__init__(socket_path, _EmbeddingRequestHandler)
+        os.chmod(socket_path, 0o660)
+
+
+class EmbeddingServiceClient:
+    """
+    Client untuk EmbeddingServer dengan interface encode() seperti SentenceTransformer
+    Setiap thread memakai koneksi sendiri yang di-reuse antar request
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = 30):
+        self.socket_path = socket_path or os.getenv('EMBEDDING_SERVICE_SOCKET', DEFAULT_SOCKET_PATH)
+        self.timeout = timeout
+        self.model_name = None
+        self.backend = None
+        self.dimension = None
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+            self._local.sock = None
+
+    def _request(self, header: Dict) -> Tuple[Dict, bytes]:
+        # Satu kali retry jika koneksi lama sudah putus (mis. server restart)
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                _send_message(sock, header)
+                response, payload = _recv_message(sock)
+                break
+            except (ConnectionError, OSError):
+                self._close()
+                if attempt:
+                    raise
+
+        if not response.get('ok'):
+            raise RuntimeError(f"Embedding service error: {response.get('error')}")
+        return response, payload
+
+    def ping(self) -> bool:
+        """Cek server dan ambil info model"""
+        try:
+            info, _ = self._request({'op': 'info'})
+            self.model_name = info.get('model')
+            self.backend = info.get('backend')
+            self.dimension = info.get('dim')
+            return True
+        except Exception:
+            return False
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self.dimension is None:
+            self.ping()
+        return self.dimension
+
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        """Encode lewat embedding service (kwargs diabaikan, untuk kompatibilitas)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+
+        response, payload = self._request({'op': 'encode', 'texts': texts})
+        embeddings = np.frombuffer(payload, dtype=np.float32).reshape(response['shape'])
+        return embeddings[0] if single else embeddings
+
+
+def main():
+    socket_path = os.getenv('EMBEDDING_SERVICE_SOCKET', DEFAULT_SOCKET_PATH)
+    model_name = os.getenv('EMBEDDING_MODEL', DEFAULT_MODEL_NAME)
+    backend = os.getenv('EMBEDDING_BACKEND', 'sentence-transformers').lower()
+    max_batch_size = int(os.getenv('EMBEDDING_SERVICE_MAX_BATCH', '64'))
+    max_wait_ms = float(os.getenv('EMBEDDING_SERVICE_MAX_WAIT_MS', '5'))
+
+    if backend == 'onnx':
+        from .onnx_embeddings import OnnxEmbeddingModel
+        model = OnnxEmbeddingModel()
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+    print(f"✅ Embedding model loaded: {model_name} ({backend})")
+
+    server = EmbeddingServer(socket_path, model, model_name, max_batch_size, max_wait_ms, backend)
+    print(f"✅ Embedding service listening on {socket_path} "
+          f"(max batch {max_batch_size}, max wait {max_wait_ms}ms)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == '__main__':
+    main()
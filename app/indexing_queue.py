@@ -0,0 +1,337 @@
+"""
+Persistent Indexing Job Queue
+Antrian job indexing Chroma di database (tabel indexing_job).
+Drive sync dan admin endpoint hanya enqueue; worker process
+(python -m app.scheduler) mengambil job dan menjalankan embedding,
+sehingga web request tidak pernah menunggu indexing.
+"""
+
+import os
+import time
+import socket
+import signal
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from .models import db, IndexingJob, GoogleDriveFile
+
+
+PRIORITY_SYNC = 0
+PRIORITY_ADMIN = 10
+
+
+def enqueue_many(jobs: Iterable[Dict], priority: int = PRIORITY_SYNC, commit: bool = True) -> int:
+    """
+    Tambahkan job indexing ke antrian
+
+    Job pending untuk drive_id yang sama tidak diduplikasi: job lama di-update
+    (reindex di-OR, priority diambil yang lebih tinggi).
+
+    Args:
+        jobs: Iterable of {'drive_id', 'file_name', 'reindex'}
+        priority: Priority job (lebih besar = lebih dulu)
+        commit: Commit session setelah enqueue
+
+    Returns:
+        Jumlah job baru
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return 0
+
+    pending = {
+        job.drive_id: job
+        for job in IndexingJob.query.filter(
+            IndexingJob.status == 'pending',
+            IndexingJob.drive_id.in_([job['drive_id'] for job in jobs])
+        )
+    }
+
+    max_attempts = int(os.getenv('INDEXING_MAX_ATTEMPTS', '3'))
+    new_rows = []
+    for job in jobs:
+        existing = pending.get(job['drive_id'])
+        if existing is not None:
+            existing.file_name = job['file_name']
+            existing.reindex = existing.reindex or job.get('reindex', False)
+            existing.priority = max(existing.priority or 0, priority)
+            continue
+        new_rows.append({
+            'drive_id': job['drive_id'],
+            'file_name': job['file_name'],
+            'reindex': job.get('reindex', False),
+            'status': 'pending',
+            'priority': priority,
+            'attempts': 0,
+            'max_attempts': max_attempts,
+            'created_at': datetime.utcnow(),
+        })
+
+    if new_rows:
+        db.session.bulk_insert_mappings(IndexingJob, new_rows)
+    if commit:
+        db.session.commit()
+    return len(new_rows)
+
+
+def enqueue(drive_id: str, file_name: str, reindex: bool = False,
+            priority: int = PRIORITY_SYNC, commit: bool = True) -> int:
+    """Tambahkan satu job indexing ke antrian"""
+    return enqueue_many([{'drive_id': drive_id, 'file_name': file_name, 'reindex': reindex}], priority, commit)
+
+
+def cancel_jobs(drive_ids: Iterable[str], commit: bool = True) -> int:
+    """
+    Batalkan job untuk file yang dihapus dari Drive
+
+    Job pending dihapus dari antrian. Job yang sedang running ditandai
+    'cancelled'; worker yang memegangnya membuang hasil indexing setelah selesai
+    (lihat run_job).
+
+    Returns:
+        Jumlah job yang dibatalkan
+    """
+    drive_ids = list(drive_ids)
+    if not drive_ids:
+        return 0
+
+    count = 0
+    for start in range(0, len(drive_ids), 500):
+        batch = drive_ids[start:start + 500]
+        count += IndexingJob.query.filter(
+            IndexingJob.drive_id.in_(batch),
+            IndexingJob.status == 'pending'
+        ).delete(synchronize_session=False)
+        count += IndexingJob.query.filter(
+            IndexingJob.drive_id.in_(batch),
+            IndexingJob.status == 'running'
+        ).update({
+            'status': 'cancelled',
+            'error_message': 'File removed from Drive',
+            'finished_at': datetime.utcnow(),
+        }, synchronize_session=False)
+    if commit:
+        db.session.commit()
+    return count
+
+
+def cancel_pending(drive_id: str, commit: bool = True):
+    """Batalkan job untuk satu file yang dihapus dari Drive"""
+    cancel_jobs([drive_id], commit=commit)
+
+
+def claim_job(worker_id: str) -> Optional[IndexingJob]:
+    """
+    Ambil satu job pending (priority tertinggi, lalu FIFO) secara atomic
+
+    UPDATE ... WHERE status = 'pending' memastikan dua worker tidak pernah
+    mengambil job yang sama.
+    """
+    while True:
+        now = datetime.utcnow()
+        candidate = db.session.query(IndexingJob.id).filter(
+            IndexingJob.status == 'pending',
+            db.or_(IndexingJob.available_at.is_(None), IndexingJob.available_at <= now)
+        ).order_by(
+            IndexingJob.priority.desc(), IndexingJob.id
+        ).first()
+        if candidate is None:
+            return None
+
+        claimed = IndexingJob.query.filter_by(id=candidate.id, status='pending').update({
+            'status': 'running',
+            'worker': worker_id,
+            'started_at': now,
+            'heartbeat_at': now,
+            'attempts': IndexingJob.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+
+        if claimed:
+            return db.session.get(IndexingJob, candidate.id)
+
+
+def requeue_stale_jobs(timeout_seconds: int = None) -> int:
+    """
+    Kembalikan job 'running' dari worker yang mati ke pending
+
+    Worker yang masih hidup memperbarui heartbeat_at setiap
+    INDEXING_HEARTBEAT_INTERVAL detik, jadi job yang memang lama (manual besar)
+    tidak di-requeue; hanya job tanpa heartbeat selama INDEXING_JOB_TIMEOUT.
+    """
+    timeout_seconds = timeout_seconds or int(os.getenv('INDEXING_JOB_TIMEOUT', '1800'))
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+    count = IndexingJob.query.filter(
+        IndexingJob.status == 'running',
+        db.func.coalesce(IndexingJob.heartbeat_at, IndexingJob.started_at) < cutoff
+    ).update({'status': 'pending', 'worker': None, 'heartbeat_at': None}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        print(f"⚠️  Requeued {count} stale indexing jobs")
+    return count
+
+
+def _heartbeat(engine, job_id: int, worker_id: str, stop: threading.Event, interval: float):
+    """Perbarui heartbeat_at selama job masih dipegang worker ini (thread terpisah, koneksi sendiri)"""
+    table = IndexingJob.__table__
+    while not stop.wait(interval):
+        try:
+            with engine.begin() as conn:
+                renewed = conn.execute(
+                    table.update()
+                    .where(table.c.id == job_id, table.c.worker == worker_id, table.c.status == 'running')
+                    .values(heartbeat_at=datetime.utcnow())
+                ).rowcount
+            if not renewed:
+                return
+        except Exception as e:
+            print(f"⚠️  Heartbeat failed for job {job_id}: {e}")
+
+
+def run_job(job: IndexingJob) -> bool:
+    """
+    Jalankan satu job indexing
+
+    Job yang gagal dikembalikan ke pending (dengan backoff eksponensial
+    INDEXING_RETRY_DELAY) sampai max_attempts. Jika tetap gagal,
+    metadata change detection file di-reset supaya sync berikutnya enqueue ulang.
+
+    Status akhir hanya ditulis jika job masih dipegang worker ini (status
+    'running', worker sama): job yang sudah di-requeue atau dibatalkan tidak
+    ditimpa.
+    """
+    from .drive_sync import index_document_to_chroma, remove_documents_from_chroma
+
+    job_id, worker_id = job.id, job.worker
+    drive_id, file_name = job.drive_id, job.file_name
+    attempts, max_attempts = job.attempts, job.max_attempts
+
+    start = time.time()
+    stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat,
+        args=(db.engine, job_id, worker_id, stop, float(os.getenv('INDEXING_HEARTBEAT_INTERVAL', '60'))),
+        name=f'indexing-heartbeat-{job_id}',
+        daemon=True
+    )
+    heartbeat.start()
+    try:
+        success = index_document_to_chroma(drive_id, file_name, reindex=job.reindex)
+        error = None if success else 'Indexing returned no result'
+    except Exception as e:
+        success = False
+        error = str(e)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    db.session.rollback()
+    if success:
+        values = {'status': 'done', 'error_message': None}
+    elif attempts < max_attempts:
+        retry_delay = float(os.getenv('INDEXING_RETRY_DELAY', '30')) * 2 ** (attempts - 1)
+        values = {
+            'status': 'pending',
+            'available_at': datetime.utcnow() + timedelta(seconds=retry_delay),
+            'error_message': error,
+        }
+    else:
+        values = {'status': 'failed', 'error_message': error}
+    values['finished_at'] = datetime.utcnow()
+
+    owned = IndexingJob.query.filter_by(id=job_id, worker=worker_id, status='running').update(
+        values, synchronize_session=False
+    )
+    if owned and values['status'] == 'failed':
+        db_file = GoogleDriveFile.query.filter_by(drive_id=drive_id).first()
+        if db_file:
+            db_file.md5_checksum = None
+            db_file.modified_time = None
+            db_file.size = None
+    db.session.commit()
+
+    if not owned:
+        current = db.session.get(IndexingJob, job_id)
+        # File dihapus dari Drive selagi job berjalan: jangan hidupkan lagi dokumennya
+        if current is not None and current.status == 'cancelled':
+            if success:
+                remove_documents_from_chroma([drive_id])
+            print(f"⚠️  Job {job_id} {file_name}: cancelled (file removed from Drive)")
+        else:
+            print(f"⚠️  Job {job_id} {file_name}: lease lost (requeued to another worker), result not recorded")
+        return False
+
+    icon = '✅' if success else '❌'
+    print(f"{icon} Job {job_id} {file_name}: {values['status']} "
+          f"(attempt {attempts}/{max_attempts}, {time.time() - start:.1f}s)")
+    return success
+
+
+def queue_stats() -> Dict:
+    """Jumlah job per status"""
+    counts = dict(
+        db.session.query(IndexingJob.status, db.func.count(IndexingJob.id))
+        .group_by(IndexingJob.status)
+        .all()
+    )
+    return {status: counts.get(status, 0) for status in ('pending', 'running', 'done', 'failed', 'cancelled')}
+
+
+def run_worker(app, worker_id: str = None, poll_interval: float = None, max_jobs: int = None) -> int:
+    """
+    Loop worker: ambil job dari antrian dan index sampai dihentikan (SIGTERM/SIGINT)
+
+    Args:
+        app: Flask app (untuk app context)
+        worker_id: Identitas worker (default: hostname:pid)
+        poll_interval: Detik menunggu saat antrian kosong
+        max_jobs: Berhenti setelah sejumlah job atau saat antrian kosong (None = jalan terus)
+
+    Returns:
+        Jumlah job yang diproses
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    poll_interval = poll_interval or float(os.getenv('INDEXING_POLL_INTERVAL', '2'))
+    requeue_interval = float(os.getenv('INDEXING_REQUEUE_INTERVAL', '300'))
+    stopping = []
+
+    def _stop(signum, frame):
+        print(f"🛑 Worker {worker_id} stopping after current job...")
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"✅ Indexing worker started: {worker_id}")
+    processed = 0
+    with app.app_context():
+        next_requeue = 0.0
+        while not stopping and (max_jobs is None or processed < max_jobs):
+            # Worker lain bisa mati kapan saja, bukan hanya sebelum worker ini start
+            if time.time() >= next_requeue:
+                try:
+                    requeue_stale_jobs()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Error requeueing stale jobs: {e}")
+                next_requeue = time.time() + requeue_interval
+
+            try:
+                job = claim_job(worker_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Error claiming indexing job: {e}")
+                job = None
+
+            if job is None:
+                if max_jobs is not None:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            run_job(job)
+            processed += 1
+
+    print(f"✅ Indexing worker stopped: {processed} jobs processed")
+    return processed
@@ -0,0 +1,261 @@
+"""
+Persistent BM25 Keyword Index
+Inverted index (SQLite) untuk exact token seperti part number, kode error (P0301)
+dan nama model yang kurang tertangkap oleh embedding MiniLM.
+Dipakai bersama vector search lewat reciprocal-rank fusion (hybrid search).
+"""
+
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Dict, Iterable, Tuple
+
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', 'instance', 'bm25_index.sqlite3')
+
+# Token: huruf/angka, boleh disambung '-', '.', '/' (mis. 15400-PLM-A02, 5W-30, P0301)
+_TOKEN_PATTERN = re.compile(r"[0-9a-z]+(?:[-./][0-9a-z]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenize text untuk BM25; token gabungan juga dipecah ke bagian-bagiannya"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-./]", token) if part)
+    return tokens
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Tuple]], k: int = 60) -> List[Tuple[Tuple, float]]:
+    """
+    Gabungkan beberapa ranked list dengan reciprocal-rank fusion
+
+    Args:
+        ranked_lists: List of ranked key lists (key harus hashable)
+        k: RRF constant
+
+    Returns:
+        List of (key, fused_score) urut dari score tertinggi
+    """
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, key in enumerate(ranked, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """BM25 inverted index yang di-update per dokumen"""
+
+    def __init__(self, path: str = None, k1: float = 1.5, b: float = 0.75):
+        self.path = os.path.abspath(path or DEFAULT_INDEX_PATH)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_key TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                file_name TEXT,
+                chunk_index INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                text TEXT,
+                page_start INTEGER,
+                page_end INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_file_id ON chunks (file_id);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_key TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_chunk_key ON postings (chunk_key);
+            """
+        )
+        # Index lama (sebelum page metadata): tambahkan kolom halaman
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        for column in ('page_start', 'page_end'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE chunks ADD COLUMN {column} INTEGER")
+        self._conn.commit()
+
+    def add_document(self, file_id: str, file_name: str, chunks: Iterable) -> int:
+        """
+        Index (atau re-index) semua chunks dari satu dokumen
+
+        Args:
+            chunks: Iterable of text, atau (text, metadata_chunk) dengan
+                chunk_index/page_start/page_end opsional
+
+        Returns:
+            Jumlah chunks yang di-index
+        """
+        return self._write_chunks(file_id, file_name, chunks, replace_document=True)
+
+    def upsert_chunks(self, file_id: str, file_name: str, chunks: Iterable) -> int:
+        """Tambah/ganti sebagian chunks dokumen (chunk lain tidak disentuh)"""
+        return self._write_chunks(file_id, file_name, chunks, replace_document=False)
+
+    def delete_chunks(self, file_id: str, chunk_indexes: Iterable[int]):
+        """Hapus chunks tertentu dari dokumen"""
+        keys = [(f"{file_id}:{chunk_index}",) for chunk_index in chunk_indexes]
+        with self._lock:
+            self._conn.executemany("DELETE FROM postings WHERE chunk_key = ?", keys)
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_key = ?", keys)
+            self._conn.commit()
+
+    def _write_chunks(self, file_id: str, file_name: str, chunks: Iterable, replace_document: bool) -> int:
+        chunk_rows = []
+        posting_rows = []
+        for position, item in enumerate(chunks):
+            text, metadata = (item, {}) if isinstance(item, str) else item
+            chunk_index = metadata.get('chunk_index', position)
+            chunk_key = f"{file_id}:{chunk_index}"
+            terms = Counter(tokenize(text))
+            chunk_rows.append((chunk_key, file_id, file_name, chunk_index, sum(terms.values()), text,
+                               metadata.get('page_start'), metadata.get('page_end')))
+            posting_rows.extend((term, chunk_key, tf) for term, tf in terms.items())
+
+        with self._lock:
+            try:
+                if replace_document:
+                    self._delete_locked(file_id)
+                else:
+                    keys = [(row[0],) for row in chunk_rows]
+                    self._conn.executemany("DELETE FROM postings WHERE chunk_key = ?", keys)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (chunk_key, file_id, file_name, chunk_index, length, text, page_start, page_end) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    chunk_rows
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk_key, tf) VALUES (?, ?, ?)",
+                    posting_rows
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+        return len(chunk_rows)
+
+    def _delete_locked(self, file_id: str):
+        self._conn.execute(
+            "DELETE FROM postings WHERE chunk_key IN (SELECT chunk_key FROM chunks WHERE file_id = ?)",
+            (file_id,)
+        )
+        self._conn.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+
+    def delete_document(self, file_id: str):
+        """Hapus semua chunks dokumen dari index"""
+        self.delete_documents([file_id])
+
+    def delete_documents(self, file_ids: Iterable[str]):
+        """Hapus chunks beberapa dokumen dalam satu transaksi"""
+        with self._lock:
+            for file_id in file_ids:
+                self._delete_locked(file_id)
+            self._conn.commit()
+
+    def file_ids(self) -> List[str]:
+        """Semua file_id yang ada di index"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT file_id FROM chunks")]
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        BM25 search
+
+        Returns:
+            List of {'file_id', 'file_name', 'chunk_index', 'text', 'score', 'page_start', 'page_end'}
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            total_chunks, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM chunks"
+            ).fetchone()
+            if not total_chunks:
+                return []
+            avg_length = avg_length or 1.0
+
+            placeholders = ",".join("?" * len(terms))
+            doc_freq = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term",
+                terms
+            ).fetchall())
+
+            scores = {}
+            rows = self._conn.execute(
+                f"""
+                SELECT p.term, p.chunk_key, p.tf, c.length
+                FROM postings p JOIN chunks c ON c.chunk_key = p.chunk_key
+                WHERE p.term IN ({placeholders})
+                """,
+                terms
+            ).fetchall()
+
+            for term, chunk_key, tf, length in rows:
+                df = doc_freq.get(term, 0)
+                idf = math.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[chunk_key] = scores.get(chunk_key, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            if not top:
+                return []
+
+            keys = [key for key, _ in top]
+            details = {
+                row[0]: row
+                for row in self._conn.execute(
+                    f"SELECT chunk_key, file_id, file_name, chunk_index, text, page_start, page_end FROM chunks "
+                    f"WHERE chunk_key IN ({','.join('?' * len(keys))})",
+                    keys
+                )
+            }
+
+        results = []
+        for chunk_key, score in top:
+            _, file_id, file_name, chunk_index, text, page_start, page_end = details[chunk_key]
+            results.append({
+                'file_id': file_id,
+                'file_name': file_name,
+                'chunk_index': chunk_index,
+                'text': text,
+                'score': round(score, 4),
+                'page_start': page_start,
+                'page_end': page_end
+            })
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            chunks, documents = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT file_id) FROM chunks"
+            ).fetchone()
+        return {'chunks': chunks, 'documents': documents, 'path': self.path}
+
+
+# Global instance
+_keyword_index = None
+
+
+def get_keyword_index() -> BM25Index:
+    """Get global BM25Index instance"""
+    global _keyword_index
+    if _keyword_index is None:
+        _keyword_index = BM25Index(os.getenv('BM25_INDEX_PATH') or None)
+    return _keyword_index
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
@@ -86,9 +87,17 @@ class DocumentSyncLog(db.Model):
     folder_update = db.Column(db.Integer, default=0)
     file_baru = db.Column(db.Integer, default=0)
     file_update = db.Column(db.Integer, default=0)
+    file_skip = db.Column(db.Integer, default=0)  # File tidak berubah, tidak di-index ulang
     error_message = db.Column(db.Text, nullable=True)
     durasi_detik = db.Column(db.Float, nullable=True)
 
+class DriveSyncState(db.Model):
+    __tablename__ = 'drive_sync_state'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)  # mis. 'changes'
+    page_token = db.Column(db.String(255), nullable=False)  # Drive Changes API startPageToken
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class GoogleDriveFolder(db.Model):
     __tablename__ = 'google_drive_folder'
     id = db.Column(db.Integer, primary_key=True)
@@ -115,6 +124,10 @@ class GoogleDriveFile(db.Model):
     last_synced = db.Column(db.DateTime, default=datetime.utcnow)
     web_view_link = db.Column(db.String(1024))
     download_link = db.Column(db.String(1024))
+    # Metadata Drive untuk change detection (re-index hanya jika berubah)
+    md5_checksum = db.Column(db.String(64), nullable=True)
+    modified_time = db.Column(db.DateTime, nullable=True)
+    size = db.Column(db.BigInteger, nullable=True)
 
 class ChromaDocument(db.Model):
     __tablename__ = 'chroma_document'
@@ -131,6 +144,38 @@ class ChromaDocument(db.Model):
     
     def __repr__(self):
         return f"<ChromaDocument {self.file_name} ({self.chunk_count} chunks)>"
+    
+    @classmethod
+    def totals(cls):
+        """Jumlah dokumen dan chunks (total status 'indexed' dan per status) dalam satu aggregate query"""
+        rows = db.session.query(
+            cls.status, db.func.count(cls.id), db.func.coalesce(db.func.sum(cls.chunk_count), 0)
+        ).group_by(cls.status).all()
+        by_status = {status: {'documents': documents, 'chunks': int(chunks)} for status, documents, chunks in rows}
+        indexed = by_status.get('indexed', {'documents': 0, 'chunks': 0})
+        return {'documents': indexed['documents'], 'chunks': indexed['chunks'], 'by_status': by_status}
+
+class IndexingJob(db.Model):
+    __tablename__ = 'indexing_job'
+    __table_args__ = (db.Index('ix_indexing_job_claim', 'status', 'priority', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    drive_id = db.Column(db.String(255), nullable=False, index=True)
+    file_name = db.Column(db.String(255), nullable=False)
+    reindex = db.Column(db.Boolean, default=False)  # File berubah: update_document (diff per chunk ID)
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'running', 'done', 'failed', 'cancelled'
+    priority = db.Column(db.Integer, default=0)  # Lebih besar = diproses lebih dulu
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    available_at = db.Column(db.DateTime, nullable=True)  # Backoff sebelum retry
+    worker = db.Column(db.String(100), nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # Diperbarui worker selama job running
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<IndexingJob {self.file_name} ({self.status})>"
 
 class ChatSession(db.Model):
     __tablename__ = 'chat_session'
@@ -160,6 +205,8 @@ class ChatMessageSource(db.Model):
     file_id = db.Column(db.Integer, db.ForeignKey('google_drive_file.id'), nullable=True)
     file_name = db.Column(db.String(255), nullable=False)
     relevance_score = db.Column(db.Float, default=0.0)
+    page_start = db.Column(db.Integer, nullable=True)
+    page_end = db.Column(db.Integer, nullable=True)
 
 class ChatFeedback(db.Model):
     __tablename__ = 'chat_feedback'
@@ -170,3 +217,42 @@ class ChatFeedback(db.Model):
     rating = db.Column(db.Integer)  # 1-5 stars
     comment = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Kolom yang ditambahkan setelah tabel dibuat; db.create_all() tidak meng-ALTER tabel lama.
+# Tipe kolom diambil dari model dan di-compile per dialect (mis. DATETIME di SQLite,
+# TIMESTAMP WITHOUT TIME ZONE di PostgreSQL); nilai kedua adalah klausa tambahan.
+ADDED_COLUMNS = {
+    'google_drive_file': [
+        ('md5_checksum', ''),
+        ('modified_time', ''),
+        ('size', ''),
+    ],
+    'document_sync_log': [
+        ('file_skip', 'DEFAULT 0'),
+    ],
+    'indexing_job': [
+        ('heartbeat_at', ''),
+    ],
+    'chat_message_source': [
+        ('page_start', ''),
+        ('page_end', ''),
+    ],
+}
+
+
+def upgrade_schema():
+    """Tambahkan kolom baru ke tabel yang sudah ada (dipanggil setelah db.create_all())"""
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    with db.engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if table not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for name, extra in columns:
+                if name not in existing:
+                    column_type = db.metadata.tables[table].columns[name].type.compile(dialect=db.engine.dialect)
+                    ddl = f"{column_type} {extra}".strip()
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    print(f"✅ Added column {table}.{name}")
@@ -0,0 +1,394 @@
+"""
+Local NumPy Vector Index
+Backend vector store in-process sebagai alternatif Chroma: vectors disimpan di
+file .npy (float16, memory-mapped) dan metadata di tabel SQLite. Query memakai
+brute-force matrix-vector product, cukup cepat untuk beberapa ratus manual.
+
+Interface meniru subset Chroma client/collection yang dipakai ChromaVectorStore
+(add/upsert/update/query/get/delete/count), jadi tinggal dipilih lewat konfigurasi:
+    VECTOR_STORE_BACKEND=numpy
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from typing import List, Dict, Optional
+
+import numpy as np
+
+
+_INITIAL_CAPACITY = 1024
+_QUERY_BLOCK_ROWS = 16384
+
+_COMPARISON_OPS = {
+    '$eq': '=',
+    '$ne': '!=',
+    '$gt': '>',
+    '$gte': '>=',
+    '$lt': '<',
+    '$lte': '<=',
+}
+
+
+def _where_to_sql(where: Dict):
+    """Translate Chroma-style where filter ke SQL (json_extract pada kolom metadata)"""
+    clauses = []
+    params = []
+
+    for key, condition in where.items():
+        if key in ('$and', '$or'):
+            parts = [_where_to_sql(sub) for sub in condition]
+            joiner = ' AND ' if key == '$and' else ' OR '
+            clauses.append('(' + joiner.join(sql for sql, _ in parts) + ')')
+            for _, sub_params in parts:
+                params.extend(sub_params)
+            continue
+
+        column = "json_extract(metadata, ?)"
+        path = f'$."{key}"'
+
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+
+        for op, value in condition.items():
+            if op in ('$in', '$nin'):
+                values = list(value)
+                if not values:
+                    clauses.append('0' if op == '$in' else '1')
+                    continue
+                placeholders = ','.join('?' * len(values))
+                negate = 'NOT ' if op == '$nin' else ''
+                clauses.append(f"{column} {negate}IN ({placeholders})")
+                params.extend([path, *values])
+            elif op in _COMPARISON_OPS:
+                clauses.append(f"{column} {_COMPARISON_OPS[op]} ?")
+                params.extend([path, value])
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+
+    return ' AND '.join(clauses) or '1', params
+
+
+class NumpyCollection:
+    """
+    Satu collection: <name>.vectors.npy (float16, normalized) + <name>.meta.sqlite3
+
+    Aman dipakai beberapa proses: setiap write memakai BEGIN IMMEDIATE (lock SQLite)
+    dan menaikkan 'generation'; reader me-reload index jika generation berubah
+    """
+
+    def __init__(self, directory: str, name: str, metadata: Dict = None):
+        self.name = name
+        self.metadata = metadata or {"hnsw:space": "cosine"}
+        self.vectors_path = os.path.join(directory, f"{name}.vectors.npy")
+        self.meta_path = os.path.join(directory, f"{name}.meta.sqlite3")
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.meta_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                document TEXT,
+                metadata TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        self._generation = None
+        self._vectors = None
+        self._dimension = None
+        self._row_by_id = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._reload()
+
+    # --- Internal state --- #
+
+    def _meta_value(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta_value(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _reload(self):
+        """Load id -> row mapping dan buka ulang mmap jika ada write dari proses lain"""
+        generation = self._meta_value('generation')
+        if generation == self._generation and self._vectors is not None:
+            return
+
+        self._vectors = None
+        if os.path.exists(self.vectors_path):
+            self._vectors = np.load(self.vectors_path, mmap_mode='r+')
+            self._dimension = self._vectors.shape[1]
+
+        capacity = self._vectors.shape[0] if self._vectors is not None else 0
+        self._row_by_id = {}
+        self._live = np.zeros(capacity, dtype=bool)
+        for row, chunk_id in self._conn.execute("SELECT row, id FROM chunks"):
+            self._row_by_id[chunk_id] = row
+            self._live[row] = True
+
+        self._generation = generation
+
+    def _ensure_capacity(self, needed_rows: int, dimension: int):
+        """Alokasikan / perbesar file vectors (capacity dikali dua)"""
+        if self._vectors is not None and self._vectors.shape[0] >= needed_rows:
+            return
+
+        capacity = self._vectors.shape[0] if self._vectors is not None else _INITIAL_CAPACITY
+        while capacity < needed_rows:
+            capacity *= 2
+
+        tmp_path = self.vectors_path + '.tmp.npy'
+        grown = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float16, shape=(capacity, dimension))
+        if self._vectors is not None:
+            grown[:self._vectors.shape[0]] = self._vectors
+        grown.flush()
+        del grown
+
+        self._vectors = None
+        os.replace(tmp_path, self.vectors_path)
+        self._vectors = np.load(self.vectors_path, mmap_mode='r+')
+        self._dimension = dimension
+
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._live.shape[0]] = self._live
+        self._live = live
+
+    def _begin_write(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._reload()
+
+    def _commit_write(self):
+        self._set_meta_value('generation', int(self._generation or 0) + 1)
+        self._conn.execute("COMMIT")
+        self._generation = self._meta_value('generation')
+
+    def _matching_rows(self, where: Dict = None, ids: List[str] = None) -> List[int]:
+        sql = "SELECT row FROM chunks WHERE 1"
+        params = []
+        if where:
+            where_sql, where_params = _where_to_sql(where)
+            sql += f" AND ({where_sql})"
+            params.extend(where_params)
+        if ids is not None:
+            if not ids:
+                return []
+            sql += f" AND id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        return [row for (row,) in self._conn.execute(sql, params)]
+
+    # --- Chroma-compatible API --- #
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.clip(norms, 1e-12, None)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+
+        with self._lock:
+            self._begin_write()
+            try:
+                free_rows = iter(np.flatnonzero(~self._live).tolist())
+                next_row = self._live.shape[0]
+                rows = []
+                for chunk_id in ids:
+                    row = self._row_by_id.get(chunk_id)
+                    if row is None:
+                        row = next(free_rows, None)
+                        if row is None:
+                            row = next_row
+                            next_row += 1
+                        self._row_by_id[chunk_id] = row
+                    rows.append(row)
+
+                self._ensure_capacity(max(rows) + 1, vectors.shape[1])
+                self._vectors[rows] = vectors.astype(np.float16)
+                self._vectors.flush()
+                self._live[rows] = True
+
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (row, chunk_id, document, json.dumps(metadata or {}))
+                        for row, chunk_id, document, metadata in zip(rows, ids, documents, metadatas)
+                    ]
+                )
+                self._commit_write()
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._generation = None
+                raise
+
+    def update(self, ids: List[str], documents=None, metadatas=None):
+        """Update documents/metadatas chunk yang sudah ada (vector tidak berubah)"""
+        with self._lock:
+            self._begin_write()
+            try:
+                if documents is not None:
+                    self._conn.executemany(
+                        "UPDATE chunks SET document = ? WHERE id = ?",
+                        list(zip(documents, ids))
+                    )
+                if metadatas is not None:
+                    self._conn.executemany(
+                        "UPDATE chunks SET metadata = ? WHERE id = ?",
+                        [(json.dumps(metadata or {}), chunk_id) for chunk_id, metadata in zip(ids, metadatas)]
+                    )
+                self._commit_write()
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._generation = None
+                raise
+
+    def delete(self, ids: List[str] = None, where: Dict = None):
+        with self._lock:
+            self._begin_write()
+            try:
+                rows = self._matching_rows(where, ids)
+                if rows:
+                    for start in range(0, len(rows), 500):
+                        batch = rows[start:start + 500]
+                        self._conn.execute(
+                            f"DELETE FROM chunks WHERE row IN ({','.join('?' * len(batch))})",
+                            batch
+                        )
+                    self._live[rows] = False
+                    self._row_by_id = {k: v for k, v in self._row_by_id.items() if self._live[v]}
+                self._commit_write()
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._generation = None
+                raise
+
+    def get(self, ids: List[str] = None, where: Dict = None, limit: int = None,
+            offset: int = None, include: List[str] = None) -> Dict:
+        include = ['documents', 'metadatas'] if include is None else include
+
+        with self._lock:
+            self._reload()
+            sql = "SELECT row, id, document, metadata FROM chunks WHERE 1"
+            params = []
+            if where:
+                where_sql, where_params = _where_to_sql(where)
+                sql += f" AND ({where_sql})"
+                params.extend(where_params)
+            if ids is not None:
+                sql += f" AND id IN ({','.join('?' * len(ids))})" if ids else " AND 0"
+                params.extend(ids)
+            sql += " ORDER BY row"
+            if limit is not None:
+                sql += " LIMIT ? OFFSET ?"
+                params.extend([limit, offset or 0])
+            rows = self._conn.execute(sql, params).fetchall()
+
+            result = {'ids': [r[1] for r in rows]}
+            if 'documents' in include:
+                result['documents'] = [r[2] for r in rows]
+            if 'metadatas' in include:
+                result['metadatas'] = [json.loads(r[3] or '{}') for r in rows]
+            if 'embeddings' in include:
+                result['embeddings'] = [self._vectors[r[0]].astype(np.float32).tolist() for r in rows]
+            return result
+
+    def query(self, query_embeddings, n_results: int = 10, where: Dict = None,
+              include: List[str] = None) -> Dict:
+        include = include or ['documents', 'metadatas', 'distances']
+        result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        if 'embeddings' in include:
+            result['embeddings'] = []
+
+        with self._lock:
+            self._reload()
+            candidates = self._live
+            if where:
+                candidates = np.zeros_like(self._live)
+                candidates[self._matching_rows(where)] = True
+
+            for query_embedding in query_embeddings:
+                ids, documents, metadatas, distances, embeddings = [], [], [], [], []
+                if self._vectors is not None and candidates.any():
+                    q = np.asarray(query_embedding, dtype=np.float32)
+                    q = q / max(float(np.linalg.norm(q)), 1e-12)
+
+                    # Matrix-vector product per block supaya tidak upcast seluruh matrix sekaligus
+                    scores = np.full(self._vectors.shape[0], -np.inf, dtype=np.float32)
+                    for start in range(0, self._vectors.shape[0], _QUERY_BLOCK_ROWS):
+                        block = self._vectors[start:start + _QUERY_BLOCK_ROWS]
+                        scores[start:start + block.shape[0]] = block.astype(np.float32) @ q
+                    scores[~candidates] = -np.inf
+
+                    k = min(n_results, int(candidates.sum()))
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    top = top[np.argsort(-scores[top])].tolist()
+
+                    placeholders = ','.join('?' * len(top))
+                    by_row = {
+                        r[0]: r for r in self._conn.execute(
+                            f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({placeholders})",
+                            top
+                        )
+                    }
+                    for row in top:
+                        if row not in by_row:
+                            continue
+                        _, chunk_id, document, metadata = by_row[row]
+                        ids.append(chunk_id)
+                        documents.append(document)
+                        metadatas.append(json.loads(metadata or '{}'))
+                        # Cosine distance seperti Chroma (hnsw:space = cosine)
+                        distances.append(float(1.0 - scores[row]))
+                        if 'embeddings' in include:
+                            embeddings.append(self._vectors[row].astype(np.float32).tolist())
+
+                result['ids'].append(ids)
+                result['documents'].append(documents)
+                result['metadatas'].append(metadatas)
+                result['distances'].append(distances)
+                if 'embeddings' in include:
+                    result['embeddings'].append(embeddings)
+
+        return result
+
+
+class NumpyVectorClient:
+    """Client dengan API get_collection/create_collection seperti chromadb"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        os.makedirs(self.path, exist_ok=True)
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.path, f"{name}.meta.sqlite3"))
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            if name not in self._collections:
+                if not self._exists(name):
+                    raise ValueError(f"Collection {name} does not exist")
+                self._collections[name] = NumpyCollection(self.path, name)
+            return self._collections[name]
+
+    def create_collection(self, name: str, metadata: Dict = None) -> NumpyCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = NumpyCollection(self.path, name, metadata)
+            return self._collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: Dict = None) -> NumpyCollection:
+        return self.create_collection(name, metadata)
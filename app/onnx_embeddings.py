@@ -0,0 +1,191 @@
+"""
+ONNX Runtime Embedding Backend (int8, CPU)
+Versi ter-quantize dari paraphrase-multilingual-MiniLM-L12-v2 yang dijalankan
+dengan ONNX Runtime, sebagai pengganti SentenceTransformer di server tanpa GPU
+
+Export model (sekali saja):
+    python -m app.onnx_embeddings [output_dir]
+
+Aktifkan:
+    EMBEDDING_BACKEND=onnx
+    ONNX_MODEL_DIR=./instance/onnx/paraphrase-multilingual-MiniLM-L12-v2
+"""
+
+import os
+import sys
+from typing import List, Dict, Union
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+try:
+    from transformers import AutoTokenizer
+    TOKENIZER_AVAILABLE = True
+except ImportError:
+    TOKENIZER_AVAILABLE = False
+
+
+DEFAULT_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+FP32_FILENAME = 'model.onnx'
+INT8_FILENAME = 'model_int8.onnx'
+
+# Suffix untuk cache key embeddings dari backend ini
+ONNX_EMBEDDING_KEY_SUFFIX = '@onnx-int8'
+
+
+def default_model_dir(model_name: str = DEFAULT_MODEL_NAME) -> str:
+    """Lokasi default hasil export ONNX untuk model"""
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance', 'onnx', model_name))
+
+
+class OnnxEmbeddingModel:
+    """
+    Embedding model berbasis ONNX Runtime dengan interface encode() seperti SentenceTransformer
+    Pooling: mean pooling dengan attention mask (sama dengan model aslinya)
+    """
+
+    def __init__(self, model_dir: str = None, max_seq_length: int = 128, num_threads: int = None):
+        """
+        Initialize ONNX embedding model
+
+        Args:
+            model_dir: Directory hasil export (model_int8.onnx + tokenizer files)
+            max_seq_length: Panjang token maksimum (sama dengan SentenceTransformer)
+            num_threads: Jumlah intra-op threads ONNX Runtime (default: semua core)
+        """
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime not available")
+        if not TOKENIZER_AVAILABLE:
+            raise ImportError("transformers not available")
+
+        self.model_dir = model_dir or os.getenv('ONNX_MODEL_DIR') or default_model_dir()
+        self.max_seq_length = max_seq_length
+
+        model_path = os.path.join(self.model_dir, INT8_FILENAME)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found, run: python -m app.onnx_embeddings")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._dimension = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Encode sentences menjadi float32 embeddings (kwargs lain diabaikan)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self._dimension), dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feed = {
+                name: encoded[name].astype(np.int64)
+                for name in ('input_ids', 'attention_mask', 'token_type_ids')
+                if name in self._input_names and name in encoded
+            }
+            token_embeddings = self.session.run(None, feed)[0]
+
+            # Mean pooling
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            counts = np.clip(mask.sum(axis=1), 1e-9, None)
+            outputs.append((summed / counts).astype(np.float32))
+
+        embeddings = np.concatenate(outputs, axis=0)
+        return embeddings[0] if single else embeddings
+
+
+def export_quantized_model(model_name: str = DEFAULT_MODEL_NAME, output_dir: str = None) -> str:
+    """
+    Export transformer model ke ONNX lalu quantize ke int8 (dynamic quantization)
+
+    Returns:
+        Path ke model_int8.onnx
+    """
+    import torch
+    from transformers import AutoModel
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    output_dir = output_dir or default_model_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+    hub_name = model_name if '/' in model_name else f'sentence-transformers/{model_name}'
+
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    model = AutoModel.from_pretrained(hub_name)
+    model.eval()
+
+    dummy = tokenizer(["contoh kalimat untuk export"], return_tensors='pt')
+    # Tokenizer XLM-R (model multilingual) tidak menghasilkan token_type_ids
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    fp32_path = os.path.join(output_dir, FP32_FILENAME)
+    int8_path = os.path.join(output_dir, INT8_FILENAME)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(output_dir)
+
+    print(f"✅ Exported int8 ONNX model: {int8_path}")
+    return int8_path
+
+
+def parity_check(reference_model, candidate_model, texts: List[str]) -> Dict:
+    """
+    Bandingkan embeddings dua backend dengan cosine similarity per kalimat
+
+    Returns:
+        {'mean_cosine', 'min_cosine', 'texts'}
+    """
+    reference = np.asarray(reference_model.encode(texts), dtype=np.float32)
+    candidate = np.asarray(candidate_model.encode(texts), dtype=np.float32)
+
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate /= np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = (reference * candidate).sum(axis=1)
+
+    return {
+        'mean_cosine': round(float(cosines.mean()), 4),
+        'min_cosine': round(float(cosines.min()), 4),
+        'texts': len(texts)
+    }
+
+
+if __name__ == '__main__':
+    export_quantized_model(
+        os.getenv('EMBEDDING_MODEL', DEFAULT_MODEL_NAME),
+        sys.argv[1] if len(sys.argv) > 1 else None
+    )
@@ -0,0 +1,169 @@
+"""
+Cross-Encoder Reranker
+Rerank kandidat hasil retrieval dengan multilingual cross-encoder kecil di CPU.
+Setiap request punya hard time budget: jika terlewati (atau cross-encoder
+error / semua worker masih sibuk), urutan vector/hybrid dipakai apa adanya
+supaya latency chat tetap terjaga.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Tuple, Optional
+
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except ImportError:
+    CROSS_ENCODER_AVAILABLE = False
+
+
+DEFAULT_RERANK_MODEL = 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'
+
+
+class CrossEncoderReranker:
+    """Rerank (query, chunk) pairs dengan cross-encoder dan per-request time budget"""
+
+    def __init__(self,
+                 model_name: str = DEFAULT_RERANK_MODEL,
+                 budget_ms: float = 300,
+                 batch_size: int = 8,
+                 max_workers: int = 2):
+        """
+        Initialize reranker
+
+        Args:
+            model_name: Cross-encoder model (multilingual)
+            budget_ms: Hard time budget per request
+            batch_size: Pairs per forward pass (deadline dicek antar batch)
+            max_workers: Jumlah request rerank yang bisa jalan bersamaan; scoring
+                yang melewati budget tetap memegang slot sampai batch-nya selesai
+        """
+        if not CROSS_ENCODER_AVAILABLE:
+            raise ImportError("sentence-transformers not available")
+
+        self.model_name = model_name
+        self.budget = budget_ms / 1000.0
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, max_length=256)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='rerank')
+        # Slot in-flight: request tidak pernah antre di belakang scoring yang sudah timeout
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.busy = 0
+        self.total_ms = 0.0
+
+    def _score(self, query: str, texts: List[str], deadline: float) -> Optional[List[float]]:
+        scores = []
+        for start in range(0, len(texts), self.batch_size):
+            if time.time() > deadline:
+                return None
+            pairs = [(query, text) for text in texts[start:start + self.batch_size]]
+            scores.extend(float(score) for score in self.model.predict(pairs))
+        return scores
+
+    def rerank(self, query: str, candidates: List[Dict], top_k: int) -> Tuple[List[Dict], bool]:
+        """
+        Rerank candidates (dict dengan key 'text') dan ambil top_k
+
+        Returns:
+            (candidates, reranked) - reranked False jika budget terlewati,
+            cross-encoder error, atau semua worker masih sibuk
+        """
+        if not candidates:
+            return [], False
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.calls += 1
+                self.busy += 1
+            print("⚠️  Rerank workers busy, using retrieval order")
+            return candidates[:top_k], False
+
+        start = time.time()
+        deadline = start + self.budget
+        error = None
+        try:
+            future = self._executor.submit(self._score, query, [c['text'] for c in candidates], deadline)
+        except Exception as e:
+            self._slots.release()
+            future, error = None, e
+        else:
+            future.add_done_callback(lambda _: self._slots.release())
+
+        scores = None
+        timed_out = False
+        if future is not None:
+            try:
+                scores = future.result(timeout=self.budget)
+                timed_out = scores is None
+            except FutureTimeoutError:
+                timed_out = True
+            except Exception as e:
+                error = e
+
+        elapsed_ms = (time.time() - start) * 1000
+        with self._lock:
+            self.calls += 1
+            self.total_ms += elapsed_ms
+            if timed_out:
+                self.timeouts += 1
+            if error is not None:
+                self.errors += 1
+
+        if scores is None:
+            if error is not None:
+                print(f"❌ Rerank failed ({error}), using retrieval order")
+            else:
+                print(f"⚠️  Rerank budget exceeded ({elapsed_ms:.0f}ms), using retrieval order")
+            return candidates[:top_k], False
+
+        for candidate, score in zip(candidates, scores):
+            candidate['rerank_score'] = round(score, 4)
+
+        ranked = sorted(candidates, key=lambda c: c['rerank_score'], reverse=True)
+        return ranked[:top_k], True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'model': self.model_name,
+                'budget_ms': round(self.budget * 1000),
+                'calls': self.calls,
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+                'busy': self.busy,
+                'avg_ms': round(self.total_ms / self.calls, 1) if self.calls else 0.0
+            }
+
+
+# Global instance
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """Get global reranker (None jika RERANK_ENABLED bukan 'true' atau model gagal load)"""
+    global _reranker
+    if os.getenv('RERANK_ENABLED', 'false').lower() != 'true':
+        return None
+
+    with _reranker_lock:
+        if _reranker is None:
+            # False = sudah dicoba dan gagal, jangan load ulang di setiap request
+            _reranker = False
+            try:
+                _reranker = CrossEncoderReranker(
+                    model_name=os.getenv('RERANK_MODEL', DEFAULT_RERANK_MODEL),
+                    budget_ms=float(os.getenv('RERANK_BUDGET_MS', '300')),
+                    batch_size=int(os.getenv('RERANK_BATCH_SIZE', '8')),
+                    max_workers=int(os.getenv('RERANK_MAX_WORKERS', '2'))
+                )
+                print(f"✅ Cross-encoder reranker loaded: {_reranker.model_name}")
+            except Exception as e:
+                print(f"⚠️  Reranker not available: {e}")
+    return _reranker or None
@@ -980,6 +980,8 @@ def admin_sync_status():
             'status': log.status,
             'folder_baru': log.folder_baru,
             'file_baru': log.file_baru,
+            'file_update': log.file_update,
+            'file_skip': log.file_skip,
             'durasi': log.durasi_detik,
             'error': log.error_message
         } for log in logs]
@@ -4,9 +4,10 @@ Admin routes untuk manage Chroma Vector Database indexing
 
 from flask import Blueprint, request, jsonify
 from functools import wraps
-from datetime import datetime
-from .models import db, GoogleDriveFile, ChromaDocument
+from .models import db, GoogleDriveFile, ChromaDocument, IndexingJob
 from .smart_search import ChromaDocumentSearch
+from .drive_sync import INDEXABLE_MIME_TYPES
+from .indexing_queue import enqueue, enqueue_many, queue_stats, PRIORITY_ADMIN
 import os
 
 admin_chroma = Blueprint('admin_chroma', __name__, url_prefix='/api/admin/chroma')
@@ -35,19 +36,18 @@ def get_chroma_stats():
         search = ChromaDocumentSearch(credentials_path)
         stats = search.get_stats()
         
-        # Get database tracking
-        indexed_count = ChromaDocument.query.filter_by(status='indexed').count()
-        pending_count = ChromaDocument.query.filter_by(status='pending').count()
-        failed_count = ChromaDocument.query.filter_by(status='failed').count()
+        # Get database tracking (satu aggregate query per status)
+        by_status = ChromaDocument.totals()['by_status']
         
         return jsonify({
             'success': True,
             'vector_store_stats': stats,
             'database_tracking': {
-                'total_indexed': indexed_count,
-                'total_pending': pending_count,
-                'total_failed': failed_count
-            }
+                'total_indexed': by_status.get('indexed', {}).get('documents', 0),
+                'total_pending': by_status.get('pending', {}).get('documents', 0),
+                'total_failed': by_status.get('failed', {}).get('documents', 0)
+            },
+            'indexing_queue': queue_stats()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -56,57 +56,31 @@ def get_chroma_stats():
 @admin_chroma.route('/index-all', methods=['POST'])
 @require_admin
 def index_all_documents():
-    """Index all Google Drive documents to Chroma (heavy operation)"""
+    """Enqueue semua Google Drive documents untuk di-index oleh worker"""
     try:
-        credentials_path = os.path.join(os.path.dirname(__file__), '..', 'credentials.json')
-        search = ChromaDocumentSearch(credentials_path)
-        
-        # Get all supported file types
-        supported_types = [
-            'application/pdf',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'text/plain'
-        ]
-        
         files = GoogleDriveFile.query.filter(
-            GoogleDriveFile.mime_type.in_(supported_types)
+            GoogleDriveFile.mime_type.in_(INDEXABLE_MIME_TYPES)
         ).all()
         
-        indexed = 0
-        failed = 0
-        
-        for file_obj in files:
-            try:
-                # Index to Chroma
-                success = search.index_document_from_drive(file_obj.drive_id, file_obj.name)
-                
-                # Track in database
-                if success:
-                    chroma_doc = ChromaDocument.query.filter_by(drive_id=file_obj.drive_id).first()
-                    if not chroma_doc:
-                        chroma_doc = ChromaDocument(
-                            file_id=file_obj.id,
-                            drive_id=file_obj.drive_id,
-                            file_name=file_obj.name,
-                            status='indexed'
-                        )
-                        db.session.add(chroma_doc)
-                    else:
-                        chroma_doc.status = 'indexed'
-                        chroma_doc.updated_at = datetime.utcnow()
-                    
-                    db.session.commit()
-                    indexed += 1
-                else:
-                    failed += 1
-            except Exception as e:
-                print(f"Error indexing {file_obj.name}: {e}")
-                failed += 1
+        # Dokumen yang sudah ada di Chroma di-index ulang (update_document: diff per chunk ID)
+        indexed_ids = {
+            drive_id for (drive_id,) in db.session.query(ChromaDocument.drive_id)
+        }
+        
+        queued = enqueue_many([
+            {
+                'drive_id': file_obj.drive_id,
+                'file_name': file_obj.name,
+                'reindex': file_obj.drive_id in indexed_ids
+            }
+            for file_obj in files
+        ])
         
         return jsonify({
             'success': True,
-            'message': f'Indexed {indexed} documents, {failed} failed'
-        })
+            'message': f'Queued {queued} documents for indexing ({len(files) - queued} already pending)',
+            'queue': queue_stats()
+        }), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -115,43 +89,49 @@ def index_all_documents():
 @admin_chroma.route('/index-file/<file_id>', methods=['POST'])
 @require_admin
 def index_single_file(file_id):
-    """Index single file to Chroma"""
+    """Enqueue single file untuk di-index (priority lebih tinggi dari sync)"""
     try:
         file_obj = GoogleDriveFile.query.get(file_id)
         
         if not file_obj:
             return jsonify({'error': 'File not found'}), 404
         
-        credentials_path = os.path.join(os.path.dirname(__file__), '..', 'credentials.json')
-        search = ChromaDocumentSearch(credentials_path)
+        is_indexed = ChromaDocument.query.filter_by(drive_id=file_obj.drive_id).first() is not None
+        enqueue(file_obj.drive_id, file_obj.name, reindex=is_indexed, priority=PRIORITY_ADMIN)
         
-        success = search.index_document_from_drive(file_obj.drive_id, file_obj.name)
+        return jsonify({
+            'success': True,
+            'message': f'Queued {file_obj.name} for indexing'
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_chroma.route('/queue', methods=['GET'])
+@require_admin
+def get_indexing_queue():
+    """Status antrian indexing dan job yang gagal"""
+    try:
+        failed_jobs = IndexingJob.query.filter_by(status='failed').order_by(
+            IndexingJob.finished_at.desc()
+        ).limit(20).all()
         
-        if success:
-            chroma_doc = ChromaDocument.query.filter_by(drive_id=file_obj.drive_id).first()
-            if not chroma_doc:
-                chroma_doc = ChromaDocument(
-                    file_id=file_obj.id,
-                    drive_id=file_obj.drive_id,
-                    file_name=file_obj.name,
-                    status='indexed'
-                )
-                db.session.add(chroma_doc)
-            else:
-                chroma_doc.status = 'indexed'
-                chroma_doc.updated_at = datetime.utcnow()
-            
-            db.session.commit()
-            
-            return jsonify({
-                'success': True,
-                'message': f'Successfully indexed {file_obj.name}'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': f'Failed to index {file_obj.name}'
-            }), 400
+        return jsonify({
+            'success': True,
+            'queue': queue_stats(),
+            'failed_jobs': [
+                {
+                    'id': job.id,
+                    'drive_id': job.drive_id,
+                    'file_name': job.file_name,
+                    'attempts': job.attempts,
+                    'error': job.error_message,
+                    'finished_at': job.finished_at.isoformat() if job.finished_at else None
+                }
+                for job in failed_jobs
+            ]
+        })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
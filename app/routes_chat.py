@@ -5,7 +5,7 @@ Chat Routes untuk RAG-based Question Answering dengan Chroma Vector Database
 from flask import Blueprint, request, jsonify, render_template, session
 from functools import wraps
 from datetime import datetime
-from .smart_search import ChromaDocumentSearch
+from .smart_search import ChromaDocumentSearch, format_page_range
 from .groq_integration import GroqChatManager  # Primary AI provider (Gemini free tier API not available)
 from .models import db, ChatSession, ChatMessage, ChatMessageSource, ChatFeedback
 import os
@@ -150,7 +150,10 @@ def ask_question():
                         sources.append({
                             'file_id': result['file_id'],
                             'file_name': result['file_name'],
-                            'relevance': chunk['similarity']
+                            'relevance': chunk['similarity'],
+                            'page_start': chunk.get('page_start'),
+                            'page_end': chunk.get('page_end'),
+                            'page_label': format_page_range(chunk.get('page_start'), chunk.get('page_end'))
                         })
             except Exception as e:
                 print(f"⚠️  Error searching documents in Chroma: {e}")
@@ -208,7 +211,9 @@ def ask_question():
                 source_record = ChatMessageSource(
                     message_id=assistant_msg.id,
                     file_name=source['file_name'],
-                    relevance_score=source['relevance']
+                    relevance_score=source['relevance'],
+                    page_start=source['page_start'],
+                    page_end=source['page_end']
                 )
                 db.session.add(source_record)
             
@@ -275,7 +280,10 @@ def get_history():
                 msg_data['sources'] = [
                     {
                         'file_name': s.file_name,
-                        'relevance': s.relevance_score
+                        'relevance': s.relevance_score,
+                        'page_start': s.page_start,
+                        'page_end': s.page_end,
+                        'page_label': format_page_range(s.page_start, s.page_end)
                     }
                     for s in msg.sources
                 ]
@@ -0,0 +1,21 @@
+"""
+Worker Process
+Entry point `python -m app.scheduler` (Procfile: worker).
+Menjalankan scheduled jobs (Google Drive sync) dan loop indexing worker yang
+mengambil job dari tabel indexing_job. Tambah process worker untuk scale indexing.
+"""
+
+import os
+
+from . import create_app
+from .indexing_queue import run_worker
+
+
+def main():
+    # create_app() juga menjalankan scheduler Drive sync (lihat setup_scheduler)
+    app = create_app()
+    run_worker(app, worker_id=os.getenv('INDEXING_WORKER_ID') or None)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,10 +6,17 @@ Mengambil dokumen dari Google Drive, parse, store di Chroma, dan search dengan s
 import os
 import json
 import re
-from typing import List, Dict, Tuple
+import codecs
+import hashlib
+import itertools
+import multiprocessing
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Iterable, Iterator, Optional
 from datetime import datetime
 import numpy as np
-from io import BytesIO
 
 try:
     from PyPDF2 import PdfReader
@@ -24,6 +31,7 @@ except ImportError:
 from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 from googleapiclient import discovery, errors
+from googleapiclient.http import MediaIoBaseDownload
 
 # Import Chroma integration
 try:
@@ -33,57 +41,256 @@ except ImportError:
     CHROMA_AVAILABLE = False
     print("⚠️  Chroma not available, will use fallback search")
 
+from .keyword_index import get_keyword_index, reciprocal_rank_fusion
+from .models import ChromaDocument
+from .reranker import get_reranker
+from .text_cache import get_text_cache, revision_key
+from .chunking import get_sentence_chunker, chunk_strategy
+
+
+def download_to_file(drive_service, file_id: str, file_obj, chunk_size: int = None):
+    """
+    Download file Google Drive ke file object secara bertahap (chunked)
+    
+    Memory yang dipakai per download dibatasi chunk size (DRIVE_DOWNLOAD_CHUNK_MB),
+    bukan ukuran file. file_obj di-seek ke awal setelah selesai.
+    """
+    chunk_size = chunk_size or int(float(os.getenv('DRIVE_DOWNLOAD_CHUNK_MB', '4')) * 1024 * 1024)
+    request = drive_service.files().get_media(fileId=file_id)
+    downloader = MediaIoBaseDownload(file_obj, request, chunksize=chunk_size)
+    done = False
+    while not done:
+        _, done = downloader.next_chunk(num_retries=3)
+    file_obj.seek(0)
+    return file_obj
+
+
+def spooled_download_file() -> tempfile.SpooledTemporaryFile:
+    """Temp file yang tetap di memory sampai DRIVE_DOWNLOAD_SPOOL_MB, lalu pindah ke disk"""
+    max_size = int(float(os.getenv('DRIVE_DOWNLOAD_SPOOL_MB', '16')) * 1024 * 1024)
+    return tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b')
+
+
+def format_page_range(page_start: Optional[int], page_end: Optional[int]) -> str:
+    """Label halaman untuk sitasi, mis. 'hal. 12' atau 'hal. 12-13' ("" jika tanpa halaman)"""
+    if not page_start:
+        return ""
+    if page_end and page_end != page_start:
+        return f"hal. {page_start}-{page_end}"
+    return f"hal. {page_start}"
+
+
+def extract_pdf_page_range(path: str, start: int, end: int) -> List[str]:
+    """Extract text halaman [start, end) dari PDF (dijalankan di process pool)"""
+    pdf_reader = PdfReader(path)
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def get_pdf_extract_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Process pool bersama untuk extract PDF per page range (PDF_EXTRACT_WORKERS)
+    
+    Dibuat sekali per process saat PDF besar pertama di-extract.
+    Returns None jika PDF_EXTRACT_WORKERS <= 1 (extract selalu in-process).
+    
+    Worker dibuat lewat forkserver (bukan fork): saat pool dibuat, thread
+    APScheduler/indexing sudah jalan dan fork bisa mewarisi lock yang sedang
+    dipegang. Entry point script harus memakai guard __name__ == '__main__'.
+    """
+    global _pdf_pool
+    workers = int(os.getenv('PDF_EXTRACT_WORKERS', str(os.cpu_count() or 1)))
+    if workers <= 1:
+        return None
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(start_method)
+            if start_method == 'forkserver':
+                context.set_forkserver_preload([__name__])
+            _pdf_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            print(f"✅ PDF extract pool started ({workers} workers)")
+        return _pdf_pool
+
 
 class DocumentProcessor:
-    """Process berbagai tipe dokumen (PDF, Word, Text)"""
+    """
+    Process berbagai tipe dokumen (PDF, Word, Text)
+    
+    Extractor iter_* adalah generator yang yield (page_number, text) per halaman
+    atau per blok, sehingga dokumen besar tidak perlu dirakit menjadi satu string.
+    page_number None untuk format tanpa halaman (DOCX, TXT). Error di tengah
+    dokumen di-raise (bukan dianggap akhir dokumen) supaya hasil parsial tidak
+    di-cache atau dianggap halaman yang hilang; extract_text_* mengembalikan "".
+    """
+    
+    TEXT_BLOCK_SIZE = 64 * 1024
     
     @staticmethod
-    def extract_text_from_pdf(file_obj) -> str:
-        """Extract text dari PDF"""
+    def pdf_page_count(file_obj) -> int:
+        """Jumlah halaman PDF (0 jika tidak bisa dibaca)"""
         if not PdfReader:
-            return ""
+            return 0
+        try:
+            count = len(PdfReader(file_obj).pages)
+        except Exception:
+            count = 0
+        file_obj.seek(0)
+        return count
+    
+    @staticmethod
+    def use_parallel_pdf(page_count: int) -> bool:
+        """PDF kecil di-extract in-process, overhead process pool tidak sepadan"""
+        return page_count >= int(os.getenv('PDF_PARALLEL_MIN_PAGES', '40'))
+    
+    @staticmethod
+    def iter_pdf_pages(file_obj, executor: ProcessPoolExecutor = None,
+                       parallel: bool = True) -> Iterator[Tuple[Optional[int], str]]:
+        """
+        Yield (page_number, text) per halaman PDF (page_number mulai dari 1)
+        
+        PDF besar dipotong menjadi page range (PDF_PAGES_PER_TASK) yang di-extract
+        paralel di process pool, lalu di-yield kembali sesuai urutan halaman.
+        
+        Args:
+            file_obj: File object PDF (seekable)
+            executor: Process pool yang dipakai (default: get_pdf_extract_pool())
+            parallel: False untuk selalu extract in-process (mis. sudah di dalam worker pool)
+        """
+        if not PdfReader:
+            return
         
         try:
             pdf_reader = PdfReader(file_obj)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() or ""
-            return text
+            page_count = len(pdf_reader.pages)
+            
+            if parallel and DocumentProcessor.use_parallel_pdf(page_count):
+                executor = executor or get_pdf_extract_pool()
+            else:
+                executor = None
+            
+            if executor is None:
+                for page_number, page in enumerate(pdf_reader.pages, 1):
+                    yield page_number, (page.extract_text() or "") + "\n"
+                return
+            
+            yield from DocumentProcessor._iter_pdf_pages_parallel(file_obj, pdf_reader, page_count, executor)
         except Exception as e:
             print(f"❌ Error extracting PDF: {e}")
-            return ""
+            raise
     
     @staticmethod
-    def extract_text_from_docx(file_obj) -> str:
-        """Extract text dari Word document"""
+    def _iter_pdf_pages_parallel(file_obj, pdf_reader, page_count: int,
+                                 executor: ProcessPoolExecutor) -> Iterator[Tuple[Optional[int], str]]:
+        """Extract page range di process pool; range yang gagal di-extract ulang in-process"""
+        pages_per_task = int(os.getenv('PDF_PAGES_PER_TASK', '20'))
+        
+        # Worker process membaca PDF dari path; file di memory ditulis ke temp file dulu
+        path = getattr(file_obj, 'name', None)
+        temp_path = None
+        if not isinstance(path, str) or not os.path.isfile(path):
+            with tempfile.NamedTemporaryFile(prefix='diklat_pdf_', suffix='.pdf', delete=False) as temp_file:
+                file_obj.seek(0)
+                shutil.copyfileobj(file_obj, temp_file)
+                temp_path = path = temp_file.name
+        
+        ranges = [(start, min(start + pages_per_task, page_count))
+                  for start in range(0, page_count, pages_per_task)]
+        futures = [executor.submit(extract_pdf_page_range, path, start, end) for start, end in ranges]
+        try:
+            for (start, end), future in zip(ranges, futures):
+                try:
+                    texts = future.result()
+                except Exception as e:
+                    print(f"⚠️  PDF pages {start + 1}-{end} failed in process pool ({e}), extracting in-process")
+                    texts = [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+                for page_number, text in enumerate(texts, start + 1):
+                    yield page_number, text + "\n"
+        finally:
+            for future in futures:
+                future.cancel()
+            if temp_path:
+                os.unlink(temp_path)
+    
+    @staticmethod
+    def iter_docx_blocks(file_obj) -> Iterator[Tuple[Optional[int], str]]:
+        """Yield (None, text) per paragraf dan per baris tabel Word document"""
         if not Document:
-            return ""
+            return
         
         try:
             doc = Document(file_obj)
-            text = ""
             for para in doc.paragraphs:
-                text += para.text + "\n"
+                yield None, para.text + "\n"
             for table in doc.tables:
                 for row in table.rows:
-                    for cell in row.cells:
-                        text += cell.text + " "
-                    text += "\n"
-            return text
+                    yield None, " ".join(cell.text for cell in row.cells) + " \n"
         except Exception as e:
             print(f"❌ Error extracting DOCX: {e}")
+            raise
+    
+    @staticmethod
+    def iter_txt_blocks(file_obj) -> Iterator[Tuple[Optional[int], str]]:
+        """Yield (None, text) per blok 64 KB dari text file"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        try:
+            while True:
+                block = file_obj.read(DocumentProcessor.TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                yield None, decoder.decode(block) if isinstance(block, bytes) else block
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield None, tail
+        except Exception as e:
+            print(f"❌ Error reading TXT: {e}")
+            raise
+    
+    @staticmethod
+    def iter_text(file_obj, mime_type: str, executor: ProcessPoolExecutor = None,
+                  parallel: bool = True) -> Iterator[Tuple[Optional[int], str]]:
+        """Yield (page_number, text) sesuai MIME type (PDF, Word, Text)"""
+        if 'pdf' in mime_type:
+            return DocumentProcessor.iter_pdf_pages(file_obj, executor, parallel)
+        elif 'wordprocessingml' in mime_type or 'document' in mime_type:
+            return DocumentProcessor.iter_docx_blocks(file_obj)
+        elif 'text' in mime_type:
+            return DocumentProcessor.iter_txt_blocks(file_obj)
+        return iter(())
+    
+    @staticmethod
+    def extract_text_from_pdf(file_obj) -> str:
+        """Extract text dari PDF"""
+        try:
+            return "".join(text for _, text in DocumentProcessor.iter_pdf_pages(file_obj))
+        except Exception:
+            return ""
+    
+    @staticmethod
+    def extract_text_from_docx(file_obj) -> str:
+        """Extract text dari Word document"""
+        try:
+            return "".join(text for _, text in DocumentProcessor.iter_docx_blocks(file_obj))
+        except Exception:
             return ""
     
     @staticmethod
     def extract_text_from_txt(file_obj) -> str:
         """Extract text dari text file"""
         try:
-            content = file_obj.read()
-            if isinstance(content, bytes):
-                return content.decode('utf-8', errors='ignore')
-            return content
-        except Exception as e:
-            print(f"❌ Error reading TXT: {e}")
+            return "".join(text for _, text in DocumentProcessor.iter_txt_blocks(file_obj))
+        except Exception:
+            return ""
+    
+    @staticmethod
+    def extract_text(file_obj, mime_type: str) -> str:
+        """Extract text sesuai MIME type (PDF, Word, Text)"""
+        try:
+            return "".join(text for _, text in DocumentProcessor.iter_text(file_obj, mime_type))
+        except Exception:
             return ""
 
 
@@ -147,9 +354,46 @@ class GoogleDriveDocumentManager:
             print(f"❌ Google Drive API error: {e}")
             return []
     
+    def iter_file_segments(self, file_id: str) -> Tuple[str, Iterator[Tuple[Optional[int], str]]]:
+        """
+        Stream isi file dari Google Drive per halaman/blok
+        
+        Jika revision file (md5Checksum/modifiedTime) sudah ada di extracted text
+        cache, text dibaca dari cache tanpa download dan parsing. Jika tidak,
+        file baru di-download saat generator mulai diiterasi, hasil extract
+        disimpan ke cache, dan temp file ditutup setelah iterasi selesai.
+        
+        Returns:
+            (mime_type, generator of (page_number, text))
+        """
+        if not self.drive_service:
+            return "", iter(())
+        
+        file_metadata = self.drive_service.files().get(
+            fileId=file_id,
+            fields='mimeType, name, md5Checksum, modifiedTime'
+        ).execute()
+        mime_type = file_metadata.get('mimeType', '')
+        revision = revision_key(file_metadata)
+        
+        text_cache = get_text_cache()
+        if text_cache:
+            cached = text_cache.get(file_id, revision)
+            if cached:
+                return mime_type, cached[1]
+        
+        def segments():
+            with spooled_download_file() as file_obj:
+                download_to_file(self.drive_service, file_id, file_obj)
+                yield from DocumentProcessor.iter_text(file_obj, mime_type)
+        
+        if text_cache:
+            return mime_type, text_cache.caching(file_id, revision, mime_type, segments())
+        return mime_type, segments()
+    
     def get_file_content(self, file_id: str) -> Tuple[str, str]:
         """
-        Get file content dari Google Drive
+        Get file content dari Google Drive (atau extracted text cache)
         
         Returns:
             (content, mime_type)
@@ -158,30 +402,8 @@ class GoogleDriveDocumentManager:
             return "", ""
         
         try:
-            # Get file metadata
-            file_metadata = self.drive_service.files().get(
-                fileId=file_id,
-                fields='mimeType, name'
-            ).execute()
-            
-            mime_type = file_metadata.get('mimeType', '')
-            name = file_metadata.get('name', '')
-            
-            # Download file
-            request = self.drive_service.files().get_media(fileId=file_id)
-            file_obj = BytesIO(request.execute())
-            
-            # Extract text based on MIME type
-            if 'pdf' in mime_type:
-                text = DocumentProcessor.extract_text_from_pdf(file_obj)
-            elif 'wordprocessingml' in mime_type or 'document' in mime_type:
-                text = DocumentProcessor.extract_text_from_docx(file_obj)
-            elif 'text' in mime_type:
-                text = DocumentProcessor.extract_text_from_txt(file_obj)
-            else:
-                text = ""
-            
-            return text, mime_type
+            mime_type, segments = self.iter_file_segments(file_id)
+            return "".join(text for _, text in segments), mime_type
         except Exception as e:
             print(f"❌ Error getting file content: {e}")
             return "", ""
@@ -190,6 +412,55 @@ class GoogleDriveDocumentManager:
 class TextChunker:
     """Split text menjadi chunks untuk processing"""
     
+    @staticmethod
+    def chunk_stream(segments: Iterable[Tuple[Optional[int], str]],
+                     chunk_size: int = 1000,
+                     overlap: int = 100) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Split stream (page_number, text) menjadi chunks dengan overlap
+        
+        Hasilnya identik dengan chunk_text pada text gabungan, tapi hanya satu
+        window (chunk_size + satu segment) yang ditahan di memory.
+        
+        Yields:
+            (chunk, page_start, page_end) - page None jika format tanpa halaman
+        """
+        step = chunk_size - overlap
+        buffer = ""
+        pages = []  # (offset di buffer, page_number) tempat tiap segment mulai
+        
+        def page_at(offset):
+            page = None
+            for start, page_number in pages:
+                if start > offset:
+                    break
+                page = page_number
+            return page
+        
+        for page_number, text in segments:
+            if not text:
+                continue
+            pages.append((len(buffer), page_number))
+            buffer += text
+            
+            # Window yang belum mencapai akhir stream aman untuk di-emit
+            position = 0
+            while len(buffer) - position > chunk_size:
+                chunk = buffer[position:position + chunk_size]
+                if chunk.strip():
+                    yield chunk, page_at(position), page_at(position + chunk_size - 1)
+                position += step
+            
+            if position:
+                buffer = buffer[position:]
+                current = [(start - position, page) for start, page in pages if start <= position]
+                pages = [(0, current[-1][1])] + [
+                    (start - position, page) for start, page in pages if start > position
+                ]
+        
+        if buffer.strip():
+            yield buffer, page_at(0), page_at(len(buffer) - 1)
+    
     @staticmethod
     def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
         """
@@ -206,18 +477,77 @@ class TextChunker:
         if not text:
             return []
         
-        chunks = []
-        step = chunk_size - overlap
+        return [chunk for chunk, _, _ in TextChunker.chunk_stream([(None, text)], chunk_size, overlap)]
+    
+    @staticmethod
+    def chunk_document(segments: Iterable[Tuple[Optional[int], str]],
+                       strategy: str = None) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Chunk stream (page_number, text) sesuai CHUNK_STRATEGY
         
-        for i in range(0, len(text), step):
-            chunk = text[i:i + chunk_size]
-            if chunk.strip():
-                chunks.append(chunk)
-            
-            if i + chunk_size >= len(text):
-                break
+        'sentences' (default): token-aware di batas kalimat (lihat app.chunking)
+        'characters': window 1000 karakter dengan overlap 100 (perilaku lama)
+        """
+        if (strategy or chunk_strategy()) == 'characters':
+            return TextChunker.chunk_stream(segments, chunk_size=1000, overlap=100)
+        return get_sentence_chunker().chunk_stream(segments)
+    
+    @staticmethod
+    def page_hash(text: str) -> str:
+        """Hash isi halaman untuk mendeteksi halaman yang berubah"""
+        return hashlib.sha256(text.encode('utf-8', errors='ignore')).hexdigest()[:16]
+    
+    @staticmethod
+    def iter_pages(segments: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[Optional[int], str]]:
+        """
+        Gabungkan segment berurutan dengan page_number yang sama menjadi satu halaman
+        
+        Format tanpa halaman (page_number None) di-yield per segment apa adanya.
+        """
+        current_page, parts = None, []
+        for page_number, text in segments:
+            if page_number is None:
+                yield None, text
+                continue
+            if parts and page_number != current_page:
+                yield current_page, "".join(parts)
+                parts = []
+            current_page = page_number
+            parts.append(text)
+        if parts:
+            yield current_page, "".join(parts)
+    
+    @staticmethod
+    def chunk_pages(pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[str, Dict]]:
+        """
+        Chunk per halaman: chunk tidak melewati batas halaman dan membawa
+        page_start, page_end dan page_hash (untuk partial re-index per halaman)
+        
+        Format tanpa halaman di-chunk sebagai satu stream tanpa page metadata.
+        
+        Yields:
+            (chunk, metadata_chunk)
+        """
+        pages = iter(pages)
+        first = next(pages, None)
+        if first is None:
+            return
+        
+        if first[0] is None:
+            unpaged = itertools.chain([first], pages)
+            for chunk, _, _ in TextChunker.chunk_document(unpaged):
+                yield chunk, {}
+            return
         
-        return chunks
+        for page_number, text in itertools.chain([first], pages):
+            metadata = {
+                'page_start': page_number,
+                'page_end': page_number,
+                'page_hash': TextChunker.page_hash(text)
+            }
+            for chunk, _, _ in TextChunker.chunk_document([(page_number, text)]):
+                yield chunk, dict(metadata)
+
 
 
 class SimpleSemanticSearch:
@@ -386,6 +716,14 @@ class ChromaDocumentSearch:
         """
         self.drive_manager = GoogleDriveDocumentManager(credentials_path)
         self.vector_store = get_vector_store() if CHROMA_AVAILABLE else None
+        self.hybrid_search = os.getenv('HYBRID_SEARCH', 'true').lower() == 'true'
+        self.rerank_candidates = int(os.getenv('RERANK_CANDIDATES', '30'))
+        
+        try:
+            self.keyword_index = get_keyword_index()
+        except Exception as e:
+            print(f"⚠️  BM25 keyword index not available: {e}")
+            self.keyword_index = None
         
         if not self.vector_store:
             print("❌ Chroma Vector Store not available")
@@ -394,6 +732,10 @@ class ChromaDocumentSearch:
         """
         Download dokumen dari Google Drive dan index ke Chroma
         
+        Dokumen yang sudah punya chunks di vector store (mis. ter-index sebelum
+        ada tracking ChromaDocument) di-update lewat update_document, supaya chunk
+        lama tidak tertinggal dengan chunk_index yang bentrok dengan chunk baru.
+        
         Args:
             drive_file_id: Google Drive file ID
             drive_file_name: File name
@@ -406,44 +748,64 @@ class ChromaDocumentSearch:
             return False
         
         try:
-            # Download content
-            content, mime_type = self.drive_manager.get_file_content(drive_file_id)
+            if self.vector_store.count_document_chunks(drive_file_id):
+                return self.update_document(drive_file_id, drive_file_name)
             
-            if not content:
-                print(f"⚠️  Could not extract content from {drive_file_name}")
-                return False
-            
-            # Chunk text
-            chunks = TextChunker.chunk_text(content, chunk_size=1000, overlap=100)
+            # Stream halaman/blok -> chunks, dokumen tidak pernah dirakit jadi satu string
+            mime_type, segments = self.drive_manager.iter_file_segments(drive_file_id)
+            keyword_index = self.keyword_index
             
-            if not chunks:
-                print(f"⚠️  No chunks generated for {drive_file_name}")
-                return False
+            def update_keyword_index(batch):
+                # BM25 di-update per micro-batch, bersama upsert vector store
+                nonlocal keyword_index
+                if keyword_index is None:
+                    return
+                try:
+                    keyword_index.upsert_chunks(drive_file_id, drive_file_name, batch)
+                except Exception as e:
+                    print(f"⚠️  Could not update keyword index for {drive_file_name}: {e}")
+                    keyword_index = None
             
-            # Add to Chroma
-            metadata = {
-                "mime_type": mime_type,
-                "indexed_date": datetime.utcnow().isoformat(),
-                "source": "google_drive"
-            }
+            # Hapus chunks BM25 lama sekali, sebelum batch pertama (re-index)
+            if keyword_index:
+                try:
+                    keyword_index.delete_document(drive_file_id)
+                except Exception as e:
+                    print(f"⚠️  Could not update keyword index for {drive_file_name}: {e}")
+                    keyword_index = None
             
             success = self.vector_store.add_document_chunks(
                 file_id=drive_file_id,
                 file_name=drive_file_name,
-                chunks=chunks,
-                metadata=metadata
+                chunks=TextChunker.chunk_pages(TextChunker.iter_pages(segments)),
+                metadata=self._document_metadata(mime_type),
+                on_batch=update_keyword_index
             )
             
+            # Index gagal di tengah jalan: jangan tinggalkan sebagian chunks di BM25
+            if not success and keyword_index:
+                keyword_index.delete_document(drive_file_id)
+            
             return success
         
         except Exception as e:
             print(f"❌ Error indexing document {drive_file_name}: {e}")
             return False
     
+    @staticmethod
+    def _document_metadata(mime_type: str) -> Dict:
+        return {
+            "mime_type": mime_type,
+            "indexed_date": datetime.utcnow().isoformat(),
+            "source": "google_drive"
+        }
+    
     def search(self, 
                query: str,
                search_limit: int = 5,
-               results_limit: int = 10) -> Dict:
+               results_limit: int = 10,
+               hybrid: bool = None,
+               rerank: bool = None) -> Dict:
         """
         Semantic search menggunakan Chroma vector database
         
@@ -451,6 +813,8 @@ class ChromaDocumentSearch:
             query: User question/search query
             search_limit: Max documents to return
             results_limit: Max chunks per document
+            hybrid: Gabungkan dengan BM25 keyword search (default: env HYBRID_SEARCH)
+            rerank: Rerank kandidat dengan cross-encoder (default: aktif jika RERANK_ENABLED)
         
         Returns:
             {
@@ -463,7 +827,9 @@ class ChromaDocumentSearch:
                             {
                                 'text': str,
                                 'similarity': float,
-                                'chunk_index': int
+                                'chunk_index': int,
+                                'page_start': int atau None,
+                                'page_end': int atau None
                             }
                         ]
                     }
@@ -474,16 +840,122 @@ class ChromaDocumentSearch:
         if not self.vector_store:
             return {'query': query, 'results': [], 'total_results': 0}
         
+        if hybrid is None:
+            hybrid = self.hybrid_search
+        reranker = get_reranker() if rerank is not False else None
+        
         try:
-            return self.vector_store.search_documents(query, search_limit, results_limit)
+            if not (hybrid and self.keyword_index) and not reranker:
+                return self.vector_store.search_documents(query, search_limit, results_limit)
+            
+            # Over-fetch kandidat jika rerank/diversifikasi aktif, lalu pilih results_limit
+            n_candidates = self.vector_store.fetch_size(results_limit)
+            if reranker:
+                n_candidates = max(self.rerank_candidates, n_candidates)
+            candidates = self._retrieve_candidates(query, n_candidates, hybrid and self.keyword_index)
+            
+            relevance_key = 'rrf_score' if hybrid and self.keyword_index else 'similarity'
+            if reranker:
+                candidates, reranked = reranker.rerank(query, candidates, len(candidates))
+                if reranked:
+                    relevance_key = 'rerank_score'
+            candidates = self.vector_store.diversify(candidates, results_limit, relevance_key=relevance_key)
+            
+            processed_results = self._group_candidates(candidates)[:search_limit]
+            return {
+                'query': query,
+                'results': processed_results,
+                'total_results': len(processed_results)
+            }
         except Exception as e:
             print(f"❌ Error searching documents: {e}")
             return {'query': query, 'results': [], 'total_results': 0}
     
+    def _retrieve_candidates(self, query: str, n_candidates: int, hybrid: bool) -> List[Dict]:
+        """
+        Ambil kandidat chunk (flat, sudah terurut) dari vector search,
+        atau vector + BM25 yang digabung dengan reciprocal-rank fusion
+        """
+        chunks_by_key = {}
+        
+        vector_ranking = []
+        include_embeddings = self.vector_store.mmr_lambda is not None
+        for hit in self.vector_store.query_chunks(query, n_candidates, include_embeddings=include_embeddings):
+            metadata = hit['metadata']
+            key = (metadata.get('file_id', 'unknown'), metadata.get('chunk_index', 0))
+            vector_ranking.append(key)
+            chunks_by_key[key] = {
+                'file_id': key[0],
+                'file_name': metadata.get('file_name', 'Unknown Document'),
+                'chunk_index': key[1],
+                'text': hit['text'],
+                'similarity': round(hit['similarity'], 3),
+                'page_start': metadata.get('page_start'),
+                'page_end': metadata.get('page_end'),
+                'match': 'vector'
+            }
+            if 'embedding' in hit:
+                chunks_by_key[key]['embedding'] = hit['embedding']
+        
+        if not hybrid:
+            return [chunks_by_key[key] for key in vector_ranking]
+        
+        keyword_ranking = []
+        keyword_hits = self.keyword_index.search(query, n_candidates)
+        top_score = keyword_hits[0]['score'] if keyword_hits else 1.0
+        for hit in keyword_hits:
+            key = (hit['file_id'], hit['chunk_index'])
+            keyword_ranking.append(key)
+            if key in chunks_by_key:
+                chunks_by_key[key]['match'] = 'hybrid'
+            else:
+                # Chunk hanya ditemukan BM25: relevansi = BM25 score relatif
+                chunks_by_key[key] = {
+                    'file_id': key[0],
+                    'file_name': hit['file_name'],
+                    'chunk_index': key[1],
+                    'text': hit['text'],
+                    'similarity': round(hit['score'] / top_score, 3) if top_score else 0.0,
+                    'page_start': hit.get('page_start'),
+                    'page_end': hit.get('page_end'),
+                    'match': 'keyword'
+                }
+        
+        candidates = []
+        for key, score in reciprocal_rank_fusion([vector_ranking, keyword_ranking])[:n_candidates]:
+            chunk = chunks_by_key[key]
+            chunk['rrf_score'] = round(score, 4)
+            candidates.append(chunk)
+        return candidates
+    
+    @staticmethod
+    def _group_candidates(candidates: List[Dict]) -> List[Dict]:
+        """Group chunks per file; urutan file mengikuti chunk dengan rank tertinggi"""
+        grouped = {}
+        for candidate in candidates:
+            file_id = candidate['file_id']
+            file_result = grouped.get(file_id)
+            if file_result is None:
+                file_result = grouped[file_id] = {
+                    'file_id': file_id,
+                    'file_name': candidate['file_name'],
+                    'chunks': []
+                }
+            file_result['chunks'].append({
+                key: value for key, value in candidate.items()
+                if key not in ('file_id', 'file_name', 'embedding')
+            })
+        return list(grouped.values())
+    
     def update_document(self, drive_file_id: str, drive_file_name: str) -> bool:
         """
         Update dokumen yang sudah ada di Chroma
         
+        Untuk dokumen berhalaman (PDF) yang sudah punya page_hash, hanya halaman
+        yang hash-nya berubah yang di-chunk, di-embed dan di-upsert; chunk halaman
+        yang berubah atau hilang dihapus. Dokumen lain di-chunk ulang lalu di-diff
+        per chunk ID (content-addressed), jadi hanya chunk baru yang di-embed.
+        
         Args:
             drive_file_id: Google Drive file ID
             drive_file_name: File name
@@ -495,29 +967,139 @@ class ChromaDocumentSearch:
             return False
         
         try:
-            # Delete old version
-            self.vector_store.delete_document(drive_file_id)
+            stored = self.vector_store.get_document_pages(drive_file_id)
+            if not stored['page_aware']:
+                return self._update_changed_chunks(drive_file_id, drive_file_name)
             
-            # Index new version
-            return self.index_document_from_drive(drive_file_id, drive_file_name)
+            return self._update_changed_pages(drive_file_id, drive_file_name, stored)
         
         except Exception as e:
             print(f"❌ Error updating document: {e}")
             return False
     
+    def _update_changed_chunks(self, drive_file_id: str, drive_file_name: str) -> bool:
+        """Chunk ulang dokumen, upsert chunk ID baru dan hapus chunk ID yang hilang"""
+        mime_type, segments = self.drive_manager.iter_file_segments(drive_file_id)
+        chunks = list(TextChunker.chunk_pages(TextChunker.iter_pages(segments)))
+        
+        success = self.vector_store.update_document(
+            file_id=drive_file_id,
+            file_name=drive_file_name,
+            chunks=chunks,
+            metadata=self._document_metadata(mime_type)
+        )
+        
+        # chunk_index final sudah ditulis ke metadata chunk oleh update_document
+        if success and self.keyword_index:
+            try:
+                self.keyword_index.add_document(drive_file_id, drive_file_name, chunks)
+            except Exception as e:
+                print(f"⚠️  Could not update keyword index for {drive_file_name}: {e}")
+        
+        return success
+    
+    def _update_changed_pages(self, drive_file_id: str, drive_file_name: str, stored: Dict) -> bool:
+        """Re-embed hanya chunk dari halaman yang berubah (diff page_hash)"""
+        mime_type, segments = self.drive_manager.iter_file_segments(drive_file_id)
+        stored_pages = stored['pages']
+        seen_pages = set()
+        changed_pages = []
+        
+        def changed_page_stream():
+            for page_number, text in TextChunker.iter_pages(segments):
+                if page_number is None:
+                    raise ValueError("Document has no pages, cannot diff by page")
+                seen_pages.add(page_number)
+                stored_page = stored_pages.get(page_number)
+                if stored_page and stored_page['page_hash'] == TextChunker.page_hash(text):
+                    continue
+                changed_pages.append(page_number)
+                yield page_number, text
+        
+        # chunk_index baru dimulai setelah index tertinggi supaya tidak bentrok dengan chunk lama
+        new_chunks = []
+        next_chunk_index = stored['next_chunk_index']
+        for chunk, chunk_metadata in TextChunker.chunk_pages(changed_page_stream()):
+            chunk_metadata['chunk_index'] = next_chunk_index
+            next_chunk_index += 1
+            new_chunks.append((chunk, chunk_metadata))
+        
+        if not seen_pages:
+            print(f"⚠️  No pages extracted from {drive_file_name}, keeping indexed version")
+            return False
+        
+        removed_pages = [page for page in stored_pages if page not in seen_pages]
+        obsolete_pages = [page for page in changed_pages if page in stored_pages] + removed_pages
+        print(f"📄 {drive_file_name}: {len(changed_pages)} changed, {len(removed_pages)} removed, "
+              f"{len(seen_pages) - len(changed_pages)} unchanged pages")
+        
+        # Tambah chunk baru dulu; chunk lama baru dihapus jika upsert berhasil
+        if new_chunks:
+            success = self.vector_store.add_document_chunks(
+                file_id=drive_file_id,
+                file_name=drive_file_name,
+                chunks=new_chunks,
+                metadata=self._document_metadata(mime_type)
+            )
+            if not success:
+                return False
+        
+        obsolete_ids = [chunk_id for page in obsolete_pages for chunk_id in stored_pages[page]['ids']]
+        obsolete_indexes = [index for page in obsolete_pages for index in stored_pages[page]['chunk_indexes']]
+        if not self.vector_store.delete_chunks(obsolete_ids):
+            return False
+        
+        if self.keyword_index:
+            try:
+                self.keyword_index.delete_chunks(drive_file_id, obsolete_indexes)
+                self.keyword_index.upsert_chunks(drive_file_id, drive_file_name, new_chunks)
+            except Exception as e:
+                print(f"⚠️  Could not update keyword index for {drive_file_name}: {e}")
+        
+        return True
+    
     def delete_document(self, drive_file_id: str) -> bool:
-        """Delete dokumen dari Chroma"""
+        """Delete dokumen dari Chroma (dan dari BM25 keyword index); False jika tidak ada chunks"""
         if not self.vector_store:
             return False
         
+        self._prune_keyword_index([drive_file_id])
         return self.vector_store.delete_document(drive_file_id)
     
+    def delete_documents(self, drive_file_ids: List[str]) -> bool:
+        """Delete beberapa dokumen sekaligus dari Chroma dan BM25 keyword index"""
+        if not self.vector_store:
+            return False
+        
+        self._prune_keyword_index(drive_file_ids)
+        return self.vector_store.delete_many(drive_file_ids)
+    
+    def _prune_keyword_index(self, drive_file_ids: List[str]):
+        if self.keyword_index:
+            try:
+                self.keyword_index.delete_documents(drive_file_ids)
+            except Exception as e:
+                print(f"⚠️  Could not prune keyword index for {len(drive_file_ids)} document(s): {e}")
+    
     def get_stats(self) -> Dict:
         """Get Chroma collection statistics"""
         if not self.vector_store:
             return {}
         
-        return self.vector_store.get_collection_stats()
+        try:
+            totals = ChromaDocument.totals()
+        except Exception as e:
+            print(f"⚠️  Could not read document totals: {e}")
+            totals = None
+        
+        stats = self.vector_store.get_collection_stats(totals)
+        reranker = get_reranker()
+        if stats and reranker:
+            stats['reranker'] = reranker.stats()
+        text_cache = get_text_cache()
+        if stats and text_cache:
+            stats['text_cache'] = text_cache.stats()
+        return stats
     
     def format_context_for_ai(self, search_results: Dict) -> str:
         """
@@ -537,7 +1119,9 @@ class ChromaDocumentSearch:
             
             for j, chunk in enumerate(result['chunks'], 1):
                 relevance_pct = int(chunk['similarity'] * 100)
-                context += f"**Bagian {j}** (Relevansi: {relevance_pct}%):\n"
+                page = format_page_range(chunk.get('page_start'), chunk.get('page_end'))
+                page_label = f", {page}" if page else ""
+                context += f"**Bagian {j}** (Relevansi: {relevance_pct}%{page_label}):\n"
                 
                 # Truncate long chunks
                 text = chunk['text']
@@ -0,0 +1,255 @@
+"""
+Persistent Extracted-Text Cache
+Menyimpan hasil extract dokumen (per halaman/blok, zlib-compressed di SQLite)
+dengan key (drive_id, revision) - revision = md5Checksum, atau modifiedTime
+untuk file tanpa checksum. Re-chunk dan re-embed (ganti chunking/model) cukup
+membaca cache ini tanpa download dari Drive maupun parsing PDF ulang.
+Ukuran dibatasi TEXT_CACHE_MAX_MB dengan LRU eviction.
+"""
+
+import os
+import json
+import zlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'instance', 'text_cache.sqlite3')
+
+# Ukuran potongan blob yang di-decompress per iterasi
+_READ_BLOCK = 64 * 1024
+
+
+def revision_key(file_metadata: Dict) -> Optional[str]:
+    """Revision file Drive untuk cache key (md5Checksum, fallback modifiedTime)"""
+    return file_metadata.get('md5Checksum') or file_metadata.get('modifiedTime') or None
+
+
+class ExtractedTextCache:
+    """
+    On-disk cache text hasil extract dengan disk budget dan LRU eviction
+    Aman dipakai bersama oleh beberapa process (SQLite WAL)
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = 512 * 1024 * 1024, compress_level: int = 6):
+        """
+        Initialize text cache
+
+        Args:
+            path: Lokasi file SQLite cache
+            max_bytes: Total ukuran text terkompresi sebelum eviction
+            compress_level: zlib compression level
+        """
+        self.path = os.path.abspath(path or DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extracted_text (
+                drive_id TEXT NOT NULL,
+                revision TEXT NOT NULL,
+                mime_type TEXT,
+                segments INTEGER NOT NULL,
+                text_size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (drive_id, revision)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extracted_text_last_used ON extracted_text (last_used)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional['ExtractedTextCache']:
+        """Buat cache dari environment variables (None jika di-disable)"""
+        if os.getenv('TEXT_CACHE_ENABLED', 'true').lower() != 'true':
+            return None
+
+        try:
+            return cls(
+                path=os.getenv('TEXT_CACHE_PATH') or None,
+                max_bytes=int(float(os.getenv('TEXT_CACHE_MAX_MB', '512')) * 1024 * 1024)
+            )
+        except Exception as e:
+            print(f"⚠️  Extracted text cache disabled: {e}")
+            return None
+
+    def contains(self, drive_id: str, revision: Optional[str]) -> bool:
+        """Cek apakah revision file ada di cache (tanpa update LRU/counter)"""
+        if not revision:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM extracted_text WHERE drive_id = ? AND revision = ?",
+                (drive_id, revision)
+            ).fetchone()
+        return row is not None
+
+    def get(self, drive_id: str, revision: Optional[str]) -> Optional[Tuple[str, Iterator[Tuple[Optional[int], str]]]]:
+        """
+        Ambil text hasil extract untuk revision file
+
+        Returns:
+            (mime_type, generator of (page_number, text)) atau None jika cache miss
+        """
+        row = None
+        if revision:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT mime_type, data FROM extracted_text WHERE drive_id = ? AND revision = ?",
+                    (drive_id, revision)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE extracted_text SET last_used = ? WHERE drive_id = ? AND revision = ?",
+                        (time.time(), drive_id, revision)
+                    )
+                    self._conn.commit()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        mime_type, data = row
+        return mime_type, self._iter_blob(data)
+
+    @staticmethod
+    def _iter_blob(data: bytes) -> Iterator[Tuple[Optional[int], str]]:
+        """Decompress blob bertahap dan yield (page_number, text) per baris JSON"""
+        decompressor = zlib.decompressobj()
+        pending = b""
+        for start in range(0, len(data), _READ_BLOCK):
+            pending += decompressor.decompress(data[start:start + _READ_BLOCK])
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                page_number, text = json.loads(line)
+                yield page_number, text
+        pending += decompressor.flush()
+        for line in pending.split(b"\n"):
+            if line:
+                page_number, text = json.loads(line)
+                yield page_number, text
+
+    def caching(self, drive_id: str, revision: Optional[str], mime_type: str,
+                segments: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[Optional[int], str]]:
+        """
+        Teruskan stream (page_number, text) sambil meng-compress-nya ke cache
+
+        Entry hanya disimpan jika stream selesai diiterasi tanpa error dan
+        berisi text; yang ditahan di memory hanya hasil kompresi.
+        """
+        if not revision:
+            yield from segments
+            return
+
+        compressor = zlib.compressobj(self.compress_level)
+        parts = []
+        count = 0
+        text_size = 0
+        has_text = False
+        for page_number, text in segments:
+            parts.append(compressor.compress(json.dumps([page_number, text]).encode('utf-8') + b"\n"))
+            count += 1
+            text_size += len(text)
+            has_text = has_text or bool(text.strip())
+            yield page_number, text
+
+        if has_text:
+            parts.append(compressor.flush())
+            try:
+                self.put(drive_id, revision, mime_type, b"".join(parts), count, text_size)
+            except Exception as e:
+                print(f"⚠️  Could not write extracted text cache: {e}")
+
+    def put(self, drive_id: str, revision: str, mime_type: str, data: bytes, segments: int, text_size: int):
+        """Simpan blob terkompresi; revision lama file yang sama dihapus, lalu evict LRU"""
+        with self._lock:
+            self._conn.execute("DELETE FROM extracted_text WHERE drive_id = ?", (drive_id,))
+            self._conn.execute(
+                "INSERT INTO extracted_text (drive_id, revision, mime_type, segments, text_size, stored_size, data, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (drive_id, revision, mime_type, segments, text_size, len(data), data, time.time())
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        """Hapus entry least-recently-used sampai total stored_size <= max_bytes"""
+        total = self._conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM extracted_text").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute(
+            "SELECT rowid, stored_size FROM extracted_text ORDER BY last_used ASC"
+        ).fetchall()
+        evicted = []
+        for rowid, stored_size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((rowid,))
+            total -= stored_size
+
+        self._conn.executemany("DELETE FROM extracted_text WHERE rowid = ?", evicted)
+        self.evictions += len(evicted)
+
+    def delete(self, drive_id: str):
+        """Hapus semua revision file (file dihapus dari Drive)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM extracted_text WHERE drive_id = ?", (drive_id,))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters dan ukuran cache"""
+        with self._lock:
+            entries, stored_size, text_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(stored_size), 0), COALESCE(SUM(text_size), 0) FROM extracted_text"
+            ).fetchone()
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'stored_mb': round(stored_size / (1024 * 1024), 2),
+            'text_mb': round(text_size / (1024 * 1024), 2),
+            'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+            'path': self.path
+        }
+
+    def clear(self):
+        """Kosongkan cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM extracted_text")
+            self._conn.commit()
+        print("✅ Extracted text cache cleared")
+
+
+_text_cache = None
+_text_cache_pid = None
+
+
+def get_text_cache() -> Optional[ExtractedTextCache]:
+    """Get global ExtractedTextCache instance (None jika di-disable)"""
+    global _text_cache, _text_cache_pid
+    # Koneksi SQLite tidak boleh dipakai lintas fork (process pool indexer)
+    if _text_cache_pid != os.getpid():
+        _text_cache = ExtractedTextCache.from_env()
+        _text_cache_pid = os.getpid()
+    return _text_cache
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark Google Drive sync terhadap fake Drive (latency per HTTP round trip simulasi)
+Membandingkan pola lama (walk rekursif sekuensial, query + commit per item) dengan
+sync baru (BFS paralel + Drive batch request, bulk insert/update per folder)
+
+Sync hanya enqueue job indexing, jadi yang terukur adalah traversal dan database.
+
+Usage:
+    python benchmark_drive_sync.py [jumlah_file] [file_per_folder] [latency_ms]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import event
+
+from app import drive_sync
+from app.models import db, GoogleDriveFolder, GoogleDriveFile
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+class _FakeRequest:
+    def __init__(self, drive, result):
+        self.drive = drive
+        self.result = result
+
+    def execute(self, num_retries=0):
+        self.drive.round_trip()
+        return self.result
+
+
+class _FakeBatch:
+    def __init__(self, drive, callback):
+        self.drive = drive
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.drive.round_trip()
+        for request_id, request in self.requests:
+            self.callback(request_id, request.result, None)
+
+
+class FakeDrive:
+    """
+    Fake Drive v3 service dengan latency per HTTP round trip
+    Folder membentuk tree (fanout subfolder per folder), masing-masing berisi file PDF
+    """
+
+    def __init__(self, total_files, files_per_folder, fanout=5, latency_ms=50):
+        self.latency = latency_ms / 1000.0
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        self.items = {'root': {'id': 'root', 'name': 'Root', 'mimeType': FOLDER_MIME_TYPE, 'parents': []}}
+        folder_total = -(-total_files // files_per_folder)
+        for n in range(folder_total):
+            parent = 'root' if n < fanout else f"folder-{n // fanout - 1}"
+            self.items[f"folder-{n}"] = {'id': f"folder-{n}", 'name': f"folder-{n}", 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent]}
+        for n in range(total_files):
+            self.items[f"file-{n}"] = {
+                'id': f"file-{n}",
+                'name': f"manual-{n}.pdf",
+                'mimeType': 'application/pdf',
+                'parents': [f"folder-{n // files_per_folder}"],
+                'webViewLink': f"https://drive.google.com/file/d/file-{n}/view",
+                'md5Checksum': f"{n:032x}",
+                'modifiedTime': '2024-01-01T00:00:00.000Z',
+                'size': str(1000 + n),
+            }
+        self.children = {}
+        for item in self.items.values():
+            for parent in item['parents']:
+                self.children.setdefault(parent, []).append(item)
+
+    def round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        time.sleep(self.latency)
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields=None, **kwargs):
+        return _FakeRequest(self, self.items[fileId])
+
+    def list(self, q=None, fields=None, pageToken=None, pageSize=100, **kwargs):
+        children = self.children.get(q.split("'")[1], [])
+        start = int(pageToken or 0)
+        result = {'files': children[start:start + pageSize]}
+        if start + pageSize < len(children):
+            result['nextPageToken'] = str(start + pageSize)
+        return _FakeRequest(self, result)
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(self, callback)
+
+
+def legacy_sync_folder(drive_service, folder_id, parent_id=None, path='/'):
+    """Pola sync lama: satu query filter_by + satu commit per folder/file"""
+    folder = drive_service.files().get(fileId=folder_id, fields='id, name').execute()
+    current_path = os.path.join(path, folder['name'])
+
+    db_folder = GoogleDriveFolder.query.filter_by(drive_id=folder_id).first()
+    if not db_folder:
+        db_folder = GoogleDriveFolder(drive_id=folder_id, name=folder['name'], parent_id=parent_id, path=current_path)
+        db.session.add(db_folder)
+    else:
+        db_folder.name = folder['name']
+        db_folder.path = current_path
+        db_folder.last_synced = datetime.utcnow()
+    db.session.commit()
+
+    items = drive_service.files().list(q=f"'{folder_id}' in parents").execute().get('files', [])
+    for item in items:
+        if item['mimeType'] == FOLDER_MIME_TYPE:
+            legacy_sync_folder(drive_service, item['id'], db_folder.id, current_path)
+            continue
+        db_file = GoogleDriveFile.query.filter_by(drive_id=item['id']).first()
+        if not db_file:
+            db_file = GoogleDriveFile(
+                drive_id=item['id'],
+                name=item['name'],
+                mime_type=item['mimeType'],
+                folder_id=db_folder.id,
+                web_view_link=item.get('webViewLink')
+            )
+            db.session.add(db_file)
+        else:
+            db_file.name = item['name']
+            db_file.last_synced = datetime.utcnow()
+        db.session.commit()
+
+
+def run(label, app, drive, sync):
+    """Jalankan sync pertama (insert) dan kedua (semua file tidak berubah)"""
+    timings = []
+    drive.round_trips = 0
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        commits = [0]
+        event.listen(db.engine, 'commit', lambda conn: commits.__setitem__(0, commits[0] + 1))
+        for _ in range(2):
+            commits[0] = 0
+            start = time.time()
+            sync()
+            timings.append((time.time() - start, commits[0]))
+        total = GoogleDriveFile.query.count()
+
+    print(f"  {label:<28} initial {timings[0][0]:7.2f}s ({timings[0][1]:5d} commits)   "
+          f"resync {timings[1][0]:7.2f}s ({timings[1][1]:5d} commits)   "
+          f"API round trips={drive.round_trips // 2}   files={total}")
+    return timings
+
+
+def main():
+    total_files = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    files_per_folder = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    drive = FakeDrive(total_files, files_per_folder, latency_ms=latency_ms)
+
+    # Worker thread memakai fake Drive yang sama
+    drive_sync.get_drive_service = lambda: drive
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'benchmark_sync.db')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    db.init_app(app)
+
+    print("\n" + "=" * 70)
+    print("  GOOGLE DRIVE SYNC BENCHMARK (fake Drive)")
+    print("=" * 70)
+    print(f"Files:       {total_files} ({files_per_folder} per folder)")
+    print(f"Latency:     {latency_ms:.0f} ms per API round trip")
+    print(f"Database:    {db_path}\n")
+
+    legacy = run("Sequential, per-item commit", app, drive, lambda: legacy_sync_folder(drive, 'root'))
+    bulk = run("Parallel BFS, bulk upsert", app, drive, lambda: drive_sync._sync_folder(drive, 'root'))
+
+    print("\n" + "-" * 70)
+    print(f"  Speedup initial sync: {legacy[0][0] / max(bulk[0][0], 1e-6):6.1f}x")
+    print(f"  Speedup resync:       {legacy[1][0] / max(bulk[1][0], 1e-6):6.1f}x")
+    print("=" * 70 + "\n")
+
+
+if __name__ == '__main__':
+    main()
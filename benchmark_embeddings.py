@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark embedding backends: SentenceTransformer (PyTorch) vs ONNX int8
+Mengukur cosine agreement (parity check) dan encode throughput kedua backend
+
+Usage:
+    python -m app.onnx_embeddings          # export model int8 (sekali saja)
+    python benchmark_embeddings.py [jumlah_kalimat]
+"""
+
+import os
+import sys
+import time
+
+from app.onnx_embeddings import OnnxEmbeddingModel, parity_check, DEFAULT_MODEL_NAME
+
+SAMPLE_TEXTS = [
+    "Berapa interval penggantian oli mesin standar?",
+    "Bagaimana cara setting timing ignition pada mesin bensin?",
+    "Kode error P0301 menunjukkan misfire pada silinder 1.",
+    "Periksa celah katup (valve clearance) saat mesin dalam kondisi dingin.",
+    "Ganti filter udara setiap 20.000 km atau lebih cepat di daerah berdebu.",
+    "Tekanan ban depan yang direkomendasikan adalah 32 psi.",
+    "Torsi pengencangan baut kepala silinder mengikuti urutan dari tengah ke luar.",
+    "Sistem direct injection menyemprotkan bahan bakar langsung ke ruang bakar.",
+    "Kampas kopling yang aus menyebabkan selip saat akselerasi.",
+    "Lakukan pengukuran kompresi mesin menggunakan compression tester.",
+]
+
+
+def benchmark(model, texts, batch_size=32, rounds=3):
+    """Return throughput (kalimat per detik) terbaik dari beberapa ronde"""
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    best = 0.0
+    for _ in range(rounds):
+        start = time.time()
+        model.encode(texts, batch_size=batch_size)
+        elapsed = max(time.time() - start, 1e-6)
+        best = max(best, len(texts) / elapsed)
+    return best
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    texts = (SAMPLE_TEXTS * (total // len(SAMPLE_TEXTS) + 1))[:total]
+    model_name = os.getenv('EMBEDDING_MODEL', DEFAULT_MODEL_NAME)
+
+    from sentence_transformers import SentenceTransformer
+    torch_model = SentenceTransformer(model_name)
+    onnx_model = OnnxEmbeddingModel()
+
+    print("\n" + "=" * 70)
+    print("  EMBEDDING BACKEND BENCHMARK")
+    print("=" * 70)
+    print(f"Model:       {model_name}")
+    print(f"ONNX dir:    {onnx_model.model_dir}")
+    print(f"Sentences:   {len(texts)}")
+
+    parity = parity_check(torch_model, onnx_model, SAMPLE_TEXTS)
+    print("\n" + "-" * 70)
+    print("Parity check (cosine PyTorch vs ONNX int8):")
+    print(f"  Mean cosine:  {parity['mean_cosine']}")
+    print(f"  Min cosine:   {parity['min_cosine']}")
+
+    torch_rate = benchmark(torch_model, texts)
+    onnx_rate = benchmark(onnx_model, texts)
+    print("\n" + "-" * 70)
+    print("Encode throughput:")
+    print(f"  PyTorch (sentence-transformers): {torch_rate:8.1f} sentences/s")
+    print(f"  ONNX int8:                       {onnx_rate:8.1f} sentences/s")
+    print(f"  Speedup:                         {onnx_rate / torch_rate:8.2f}x")
+    print("=" * 70 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,146 +2,372 @@
 """
 Index all files from Google Drive folders into Chroma Vector Database
 Extracts text from PDFs, DOCX, and TXT files, chunks them, and indexes via embeddings
+
+Pipeline (setiap stage dihubungkan bounded queue supaya CPU dan network terpakai bersamaan):
+    list (BFS rekursif) -> download (thread pool, I/O) -> extract + chunk (process pool)
+    -> embed (batch lintas dokumen) -> write (Chroma + BM25 + tracking)
+
+PDF besar (>= PDF_PARALLEL_MIN_PAGES halaman) dipotong per page range di process pool
+yang sama, supaya satu manual ratusan halaman tidak menahan satu core sendirian.
+Dokumen yang revision-nya sudah ada di extracted text cache langsung di-chunk
+tanpa download dan parsing.
+
+Tuning lewat env: INDEX_DOWNLOAD_WORKERS, INDEX_EXTRACT_WORKERS, INDEX_EMBED_BATCH_SIZE,
+INDEX_QUEUE_SIZE, INDEX_REPORT_INTERVAL
+
+Usage:
+    python index_all_files.py             # index dokumen yang belum ter-index
+    python index_all_files.py --reindex   # index ulang semua (text dari extracted text cache)
 """
 
 import os
+import sys
 os.environ['CHROMA_CLOUD'] = 'false'
 
 from app import create_app
 import time
+import queue
+import threading
+import tempfile
 from datetime import datetime
+from concurrent.futures import Future, ProcessPoolExecutor
+
+SUPPORTED_TYPES = {
+    'application/pdf': '.pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
+    'application/msword': '.doc',
+    'text/plain': '.txt',
+}
+
+_DONE = object()
+
+
+def chunk_segments(segments):
+    """
+    Chunk stream (page_number, text)
+
+    Returns:
+        (list of (chunk, metadata_chunk) dengan page_start/page_end/page_hash untuk PDF, jumlah halaman)
+    """
+    from app.smart_search import TextChunker
+    page_count = 0
 
-app = create_app()
+    def counted():
+        nonlocal page_count
+        for page_number, text in segments:
+            if page_number:
+                page_count = page_number
+            yield page_number, text
+
+    chunks = list(TextChunker.chunk_pages(TextChunker.iter_pages(counted())))
+    return chunks, page_count
+
+
+def extract_chunks(path: str, mime_type: str, executor: ProcessPoolExecutor = None, cache_key=None):
+    """
+    Extract text per halaman dan chunk dari file hasil download
+
+    Tanpa executor dijalankan di dalam process pool (extract in-process);
+    dengan executor, page range PDF di-extract paralel di pool tersebut.
+    Jika cache_key (drive_id, revision) diberikan, hasil extract disimpan
+    ke extracted text cache.
+
+    Returns:
+        (list of (chunk, metadata_chunk), jumlah halaman)
+    """
+    from app.smart_search import DocumentProcessor
+    from app.text_cache import get_text_cache
+    try:
+        with open(path, 'rb') as file_obj:
+            segments = DocumentProcessor.iter_text(file_obj, mime_type, executor, parallel=executor is not None)
+            text_cache = get_text_cache()
+            if text_cache and cache_key:
+                segments = text_cache.caching(cache_key[0], cache_key[1], mime_type, segments)
+            return chunk_segments(segments)
+    finally:
+        os.unlink(path)
+
+
+def run_in_thread(func, *args):
+    """Jalankan func di thread ini, hasilnya dibungkus Future seperti hasil process pool"""
+    future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def is_large_pdf(path: str, mime_type: str) -> bool:
+    """PDF yang cukup besar untuk di-extract per page range"""
+    from app.smart_search import DocumentProcessor
+    if mime_type != 'application/pdf':
+        return False
+    with open(path, 'rb') as file_obj:
+        return DocumentProcessor.use_parallel_pdf(DocumentProcessor.pdf_page_count(file_obj))
+
+
+class StageStats:
+    """Counter per stage untuk laporan throughput"""
+
+    def __init__(self, names):
+        self.names = names
+        self.counts = {name: 0 for name in names}
+        self.busy = {name: 0.0 for name in names}
+        self._lock = threading.Lock()
+        self.start = time.time()
+
+    def add(self, name, count=1, seconds=0.0):
+        with self._lock:
+            self.counts[name] += count
+            self.busy[name] += seconds
+
+    def line(self):
+        elapsed = max(time.time() - self.start, 1e-6)
+        with self._lock:
+            return "  ".join(
+                f"{name}={self.counts[name]} ({self.counts[name] / elapsed:.1f}/s)"
+                for name in self.names
+            )
+
+
+def index_all_google_drive_files(app, extract_pool: ProcessPoolExecutor, reindex: bool = False):
+    """
+    Extract and index all files from configured Google Drive folders
+
+    Args:
+        app: Flask app (dari create_app(), dibuat setelah start_extract_pool())
+        extract_pool: Process pool extract dari start_extract_pool()
+        reindex: Index ulang dokumen yang sudah ter-index (mis. setelah ganti
+            chunking atau embedding model); text diambil dari extracted text cache
+    """
 
-def index_all_google_drive_files():
-    """Extract and index all files from configured Google Drive folders"""
-    
     with app.app_context():
         from app.chroma_integration import get_vector_store
-        from app.smart_search import ChromaDocumentSearch
+        from app.keyword_index import get_keyword_index
         from app.documents_handler import ROOT_FOLDERS
-        from app.models import db, ChromaDocument
-        from google.oauth2.service_account import Credentials  
-        from googleapiclient.discovery import build
-        
+        from app.drive_sync import iter_folder_files, track_indexed_document, get_thread_drive_service
+        from app.smart_search import download_to_file
+        from app.text_cache import get_text_cache, revision_key
+        from app.models import ChromaDocument
+
+        download_workers = int(os.getenv('INDEX_DOWNLOAD_WORKERS', '8'))
+        extract_workers = int(os.getenv('INDEX_EXTRACT_WORKERS', str(os.cpu_count() or 2)))
+        embed_batch_size = int(os.getenv('INDEX_EMBED_BATCH_SIZE', '256'))
+        queue_size = int(os.getenv('INDEX_QUEUE_SIZE', '32'))
+        report_interval = float(os.getenv('INDEX_REPORT_INTERVAL', '10'))
+
         # Initialize
         store = get_vector_store()
-        search = ChromaDocumentSearch()
-        
-        creds = Credentials.from_service_account_file('credentials.json')
-        drive_service = build('drive', 'v3', credentials=creds)
-        
+        keyword_index = get_keyword_index()
+        text_cache = get_text_cache()
+        already_indexed = set() if reindex else {
+            drive_id for (drive_id,) in
+            ChromaDocument.query.filter_by(status='indexed').with_entities(ChromaDocument.drive_id)
+        }
+
         print("\n" + "="*70)
-        print("  GOOGLE DRIVE FILE INDEXING TO CHROMA DATABASE")
+        print("  GOOGLE DRIVE FILE INDEXING TO CHROMA DATABASE (pipelined)")
         print("="*70)
-        print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        
-        total_files = 0
-        indexed_files = 0
-        skipped_files = 0
-        errors = 0
-        
-        # Process each folder
-        for folder_name, folder_id in ROOT_FOLDERS.items():
-            print(f"\n📁 Processing folder: {folder_name}")
-            print(f"   Folder ID: {folder_id}")
-            print("   " + "-"*66)
-            
+        print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Workers: download={download_workers} extract={extract_workers} "
+              f"embed_batch={embed_batch_size} queue={queue_size}\n")
+
+        download_queue = queue.Queue(maxsize=queue_size)
+        extract_queue = queue.Queue(maxsize=queue_size)
+        write_queue = queue.Queue(maxsize=queue_size)
+        stats = StageStats(['listed', 'cached', 'downloaded', 'extracted', 'pages', 'embedded_chunks', 'written'])
+        counters = {'total': 0, 'skipped': 0, 'errors': 0}
+        counters_lock = threading.Lock()
+        finished = threading.Event()
+
+        def _count(key):
+            with counters_lock:
+                counters[key] += 1
+
+        # --- Stage 1: list (rekursif, semua subfolder) --- #
+        def lister():
             try:
-                # List all files in folder
-                query = f"'{folder_id}' in parents and trashed=false"
-                request = drive_service.files().list(
-                    q=query,
-                    pageSize=100,
-                    fields="nextPageToken, files(id, name, mimeType, modifiedTime, size)",
-                    corpora='user'
-                )
-                
-                files_in_folder = []
-                while request:
-                    results = request.execute()
-                    files_in_folder.extend(results.get('files', []))
-                    request = drive_service.files().list_next(request, results)
-                
-                print(f"   Total files in folder: {len(files_in_folder)}")
-                
-                # Supported file types
-                supported_types = {
-                    'application/pdf': '.pdf',
-                    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
-                    'application/msword': '.doc',
-                    'text/plain': '.txt',
-                }
-                
-                # Process each file
-                for file_info in files_in_folder:
-                    total_files += 1
-                    file_id = file_info['id']
-                    file_name = file_info['name']
-                    mime_type = file_info.get('mimeType', '')
-                    
-                    # Check if file is already indexed
-                    existing = ChromaDocument.query.filter_by(drive_id=file_id).first()
-                    if existing and existing.status == 'indexed':
-                        print(f"   ⏭️  SKIP: {file_name} (already indexed)")
-                        skipped_files += 1
+                for file_info in iter_folder_files(list(ROOT_FOLDERS.values())):
+                    stats.add('listed')
+                    _count('total')
+                    if file_info['id'] in already_indexed:
+                        _count('skipped')
                         continue
-                    
-                    # Check if file type is supported
-                    if mime_type not in supported_types:
-                        print(f"   ⊘  UNSUPPORTED: {file_name} ({mime_type})")
-                        skipped_files += 1
+                    if file_info.get('mimeType', '') not in SUPPORTED_TYPES:
+                        print(f"   ⊘  UNSUPPORTED: {file_info['name']} ({file_info.get('mimeType')})")
+                        _count('skipped')
                         continue
-                    
+                    download_queue.put(file_info)
+            except Exception as e:
+                print(f"   ❌ Error listing folders: {e}")
+                _count('errors')
+            finally:
+                for _ in range(download_workers):
+                    download_queue.put(_DONE)
+
+        # --- Stage 2: download (I/O thread pool, chunked ke temp file) lalu submit ke process pool --- #
+        def downloader(extract_pool):
+            while True:
+                file_info = download_queue.get()
+                if file_info is _DONE:
+                    extract_queue.put(_DONE)
+                    return
+                path = None
+                try:
+                    revision = revision_key(file_info)
+                    cached = text_cache.get(file_info['id'], revision) if text_cache else None
+                    if cached:
+                        # Text sudah di-extract sebelumnya: re-chunk tanpa download/parsing
+                        stats.add('cached')
+                        extract_queue.put((file_info, run_in_thread(chunk_segments, cached[1])))
+                        continue
+
+                    start = time.time()
+                    with tempfile.NamedTemporaryFile(prefix='diklat_', delete=False) as file_obj:
+                        path = file_obj.name
+                        download_to_file(get_thread_drive_service(), file_info['id'], file_obj)
+                    stats.add('downloaded', seconds=time.time() - start)
+                    cache_key = (file_info['id'], revision)
+                    if is_large_pdf(path, file_info['mimeType']):
+                        # Page range di-extract paralel di pool, chunking di thread ini
+                        future = run_in_thread(extract_chunks, path, file_info['mimeType'], extract_pool, cache_key)
+                    else:
+                        # Process pool membaca dari path dan menghapus file setelah extract
+                        future = extract_pool.submit(extract_chunks, path, file_info['mimeType'], None, cache_key)
+                    path = None
+                    extract_queue.put((file_info, future))
+                except Exception as e:
+                    print(f"   ❌ DOWNLOAD ERROR: {file_info['name']}: {str(e)[:50]}")
+                    _count('errors')
+                    if path:
+                        os.unlink(path)
+
+        # --- Stage 5: write (Chroma upsert + BM25 + tracking) --- #
+        def writer():
+            with app.app_context():
+                while True:
+                    item = write_queue.get()
+                    if item is _DONE:
+                        return
+                    file_info, chunks, embeddings = item
+                    start = time.time()
+                    metadata = {
+                        "mime_type": file_info['mimeType'],
+                        "indexed_date": datetime.utcnow().isoformat(),
+                        "source": "google_drive"
+                    }
                     try:
-                        # Index the file - the method downloads it internally
-                        print(f"   📥 Downloading & indexing: {file_name}...", end=" ", flush=True)
-                        result = search.index_document_from_drive(
-                            drive_file_id=file_id,
-                            drive_file_name=file_name
+                        # Diff per chunk ID, juga tanpa --reindex: dokumen bisa sudah ada di
+                        # vector store tanpa baris ChromaDocument, dan chunk lamanya harus ikut diganti
+                        success = store.update_document(
+                            file_id=file_info['id'],
+                            file_name=file_info['name'],
+                            chunks=chunks,
+                            metadata=metadata,
+                            embeddings=embeddings
                         )
-                        
-                        if result:
-                            indexed_files += 1
-                            print("✅ DONE")
-                            
-                            # Update database
-                            if existing:
-                                existing.status = 'indexed'
-                                existing.last_indexed = datetime.utcnow()
-                            else:
-                                doc = ChromaDocument(
-                                    drive_id=file_id,
-                                    file_name=file_name,
-                                    mime_type=mime_type,
-                                    status='indexed'
-                                )
-                                db.session.add(doc)
-                            db.session.commit()
+                        if success:
+                            keyword_index.add_document(file_info['id'], file_info['name'], chunks)
+                            track_indexed_document(file_info['id'], file_info['name'], len(chunks))
+                            stats.add('written', seconds=time.time() - start)
                         else:
-                            print("❌ FAILED")
-                            errors += 1
-                    
+                            _count('errors')
                     except Exception as e:
-                        print(f"❌ ERROR: {str(e)[:50]}")
-                        errors += 1
-                
+                        print(f"   ❌ WRITE ERROR: {file_info['name']}: {str(e)[:50]}")
+                        _count('errors')
+
+        # --- Monitor: throughput per stage dan kedalaman queue --- #
+        def monitor():
+            while not finished.wait(report_interval):
+                print(f"   📊 {stats.line()}")
+                print(f"      queue depth: download={download_queue.qsize()} "
+                      f"extract={extract_queue.qsize()} write={write_queue.qsize()}")
+
+        threads = [threading.Thread(target=lister, name='index-list', daemon=True)]
+        threads += [
+            threading.Thread(target=downloader, args=(extract_pool,), name=f'index-download-{i}', daemon=True)
+            for i in range(download_workers)
+        ]
+        write_thread = threading.Thread(target=writer, name='index-write', daemon=True)
+        for thread in threads + [write_thread, threading.Thread(target=monitor, daemon=True)]:
+            thread.start()
+
+        # --- Stage 3 + 4: terima hasil extract, embed per batch lintas dokumen --- #
+        pending = []
+        pending_chunks = 0
+
+        def flush():
+            nonlocal pending, pending_chunks
+            if not pending:
+                return
+            start = time.time()
+            all_chunks = [text for _, chunks in pending for text, _ in chunks]
+            embeddings = store.encode_chunks(all_chunks)
+            stats.add('embedded_chunks', len(all_chunks), time.time() - start)
+            offset = 0
+            for file_info, chunks in pending:
+                write_queue.put((file_info, chunks, embeddings[offset:offset + len(chunks)]))
+                offset += len(chunks)
+            pending, pending_chunks = [], 0
+
+        remaining_downloaders = download_workers
+        while remaining_downloaders:
+            try:
+                item = extract_queue.get(timeout=1.0)
+            except queue.Empty:
+                flush()  # Jangan tahan batch parsial saat upstream lambat
+                continue
+            if item is _DONE:
+                remaining_downloaders -= 1
+                continue
+
+            file_info, future = item
+            try:
+                chunks, page_count = future.result()
             except Exception as e:
-                print(f"   ❌ Error processing folder: {e}")
-                errors += 1
-        
+                print(f"   ❌ EXTRACT ERROR: {file_info['name']}: {str(e)[:50]}")
+                _count('errors')
+                continue
+            stats.add('extracted')
+            stats.add('pages', page_count)
+
+            if not chunks:
+                print(f"   ⚠️  No text extracted: {file_info['name']}")
+                _count('errors')
+                continue
+
+            pending.append((file_info, chunks))
+            pending_chunks += len(chunks)
+            if pending_chunks >= embed_batch_size:
+                flush()
+
+        flush()
+        write_queue.put(_DONE)
+        write_thread.join()
+        finished.set()
+
+        elapsed = max(time.time() - stats.start, 1e-6)
+        indexed_files = stats.counts['written']
+
         # Summary
         print("\n" + "="*70)
         print("  INDEXING SUMMARY")
         print("="*70)
-        print(f"Total files found:     {total_files}")
+        print(f"Total files found:     {counters['total']}")
         print(f"Files indexed:         {indexed_files} ✅")
-        print(f"Files skipped:         {skipped_files} ⏭️")
-        print(f"Errors:                {errors} ❌")
+        print(f"Files skipped:         {counters['skipped']} ⏭️")
+        print(f"Errors:                {counters['errors']} ❌")
         print(f"Completed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
+
+        print("\n" + "-"*70)
+        print("Stage throughput:")
+        for name in stats.names:
+            busy = f"  busy {stats.busy[name]:.1f}s" if stats.busy[name] else ""
+            print(f"  {name:<16} {stats.counts[name]:>8}  ({stats.counts[name] / elapsed:.1f}/s){busy}")
+
         # Show Chroma stats
-        stats = store.get_collection_stats()
+        stats = store.get_collection_stats(ChromaDocument.totals())
         print("\n" + "-"*70)
         print(f"Chroma Vector Database Stats:")
         print(f"  Total documents:     {stats['total_documents']}")
@@ -149,21 +375,44 @@ def index_all_google_drive_files():
         print(f"  Embedding model:     {stats['model']}")
         print(f"  Collection:          {stats['collection_name']}")
         print("="*70 + "\n")
-        
+
         return {
-            'total': total_files,
+            'total': counters['total'],
             'indexed': indexed_files,
-            'skipped': skipped_files,
-            'errors': errors
+            'skipped': counters['skipped'],
+            'errors': counters['errors']
         }
 
-if __name__ == '__main__':
+def start_extract_pool() -> ProcessPoolExecutor:
+    """
+    Start process pool extract (INDEX_EXTRACT_WORKERS) dan fork semua worker sekarang
+
+    Harus dipanggil sebelum create_app(): create_app() menjalankan thread
+    APScheduler, dan fork dari process multi-thread bisa mewarisi lock yang
+    sedang dipegang thread lain (deadlock di worker process).
+    """
+    pool = ProcessPoolExecutor(max_workers=int(os.getenv('INDEX_EXTRACT_WORKERS', str(os.cpu_count() or 2))))
+    pool.submit(int).result()
+    return pool
+
+
+def main():
+    # Urutan penting: worker extract di-fork selagi process masih single-thread
+    extract_pool = start_extract_pool()
+    app = create_app()
+
     start_time = time.time()
     try:
-        result = index_all_google_drive_files()
+        result = index_all_google_drive_files(app, extract_pool, reindex='--reindex' in sys.argv[1:])
         elapsed = time.time() - start_time
         print(f"⏱️  Total execution time: {elapsed/60:.2f} minutes")
     except Exception as e:
         print(f"\n❌ Fatal error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        extract_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,7 @@ from app import create_app
 from app.models import db, Admin
 from apscheduler.schedulers.background import BackgroundScheduler
 from app.cron_jobs import revoke_expired_access
-from app.drive_sync import sync_drive_files, get_folder_id
+from app.drive_sync import sync_drive_changes, get_folder_id
 
 app = create_app()
 
@@ -16,10 +16,10 @@ def run_revoke_job():
 def run_drive_sync_job():
     """Wrapper for the Google Drive sync job."""
     with app.app_context():
-        print("Running scheduled job: sync_drive_files")
+        print("Running scheduled job: sync_drive_changes")
         folder_id = get_folder_id('Dokumen Bengkel')
         if folder_id:
-            sync_drive_files(folder_id)
+            sync_drive_changes([folder_id])
         else:
             print("Google Drive folder 'Dokumen Bengkel' not found.")
 
@@ -0,0 +1,99 @@
+import random
+
+from app.chunking import SentenceChunker, TokenCounter
+from app.smart_search import TextChunker
+
+
+def make_chunker(max_tokens=48, overlap_tokens=20):
+    # TokenCounter() tanpa tokenizer: estimasi token, tanpa download model
+    return SentenceChunker(TokenCounter(), max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+
+def manual_text(sentences=60):
+    return " ".join(
+        f"Langkah {i}: periksa {'tekanan ban' if i % 3 else 'oli mesin dan filter udara'} sebelum berkendara."
+        for i in range(sentences)
+    )
+
+
+def random_segments(text, seed, pieces=12):
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(text)), pieces))
+    return [(None, text[start:end]) for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def legacy_chunk_text(text, chunk_size=1000, overlap=100):
+    """chunk_text sebelum streaming (referensi perilaku lama)"""
+    chunks = []
+    for i in range(0, len(text), chunk_size - overlap):
+        chunk = text[i:i + chunk_size]
+        if chunk.strip():
+            chunks.append(chunk)
+        if i + chunk_size >= len(text):
+            break
+    return chunks
+
+
+def test_sentence_chunks_respect_token_cap():
+    chunker = make_chunker()
+    long_sentence = " ".join(["komponen"] * 200) + "."
+
+    chunks = [chunk for chunk, _, _ in chunker.chunk_stream([(None, manual_text() + " " + long_sentence)])]
+
+    assert len(chunks) > 1
+    lengths = chunker.counter.lengths(chunks) + chunker.counter.special_tokens
+    assert lengths.max() <= chunker.max_tokens
+
+
+def test_sentence_chunks_overlap_with_previous_chunk():
+    chunker = make_chunker()
+
+    chunks = [chunk for chunk, _, _ in chunker.chunk_stream([(None, manual_text())])]
+
+    assert len(chunks) > 2
+    for previous, current in zip(chunks, chunks[1:]):
+        first_sentence = current.split(". ")[0]
+        assert first_sentence in previous
+
+
+def test_sentence_chunks_do_not_depend_on_segment_boundaries():
+    chunker = make_chunker()
+    text = manual_text()
+    expected = list(chunker.chunk_stream([(None, text)]))
+
+    for seed in range(5):
+        assert list(chunker.chunk_stream(random_segments(text, seed))) == expected
+
+
+def test_sentence_split_across_segments_stays_whole():
+    chunker = make_chunker(max_tokens=128)
+    segments = [(None, "Torsi baut kepala silin"), (None, "der 30 Nm. Cek tekanan ban.")]
+
+    chunks = [chunk for chunk, _, _ in chunker.chunk_stream(segments)]
+
+    assert chunks == ["Torsi baut kepala silinder 30 Nm. Cek tekanan ban."]
+
+
+def test_sentence_across_page_break_keeps_page_range():
+    chunker = make_chunker(max_tokens=128)
+    segments = [(1, "Kalimat ini berlanjut ke"), (2, "halaman berikutnya.\n")]
+
+    assert list(chunker.chunk_stream(segments)) == [("Kalimat ini berlanjut ke halaman berikutnya.", 1, 2)]
+
+
+def test_character_chunk_stream_matches_legacy_chunk_text():
+    text = manual_text(120)
+    expected = legacy_chunk_text(text)
+
+    assert TextChunker.chunk_text(text) == expected
+    for seed in range(5):
+        streamed = [chunk for chunk, _, _ in TextChunker.chunk_stream(random_segments(text, seed))]
+        assert streamed == expected
+
+
+def test_chunk_document_characters_strategy_uses_character_windows():
+    text = manual_text(120)
+
+    chunks = [chunk for chunk, _, _ in TextChunker.chunk_document([(None, text)], strategy='characters')]
+
+    assert chunks == legacy_chunk_text(text)